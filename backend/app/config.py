@@ -10,6 +10,24 @@ class Settings(BaseSettings):
     github_private_key_path: str
     github_webhook_secret: str
 
+    # Max concurrent commit fetches per GitHub App installation
+    github_fetch_concurrency: int = 8
+
+    # Shared GitHub API connection pool
+    github_http2: bool = True
+    github_max_connections: int = 50
+    github_max_keepalive_connections: int = 20
+    github_keepalive_expiry: float = 30.0  # seconds
+    github_timeout: float = 15.0  # seconds (read/write/pool)
+    github_connect_timeout: float = 5.0  # seconds
+
+    # "json": one request per commit, diff rebuilt from files[].patch (raw diff only as fallback)
+    # "json+diff": always fetch the raw diff as a second request
+    github_commit_fetch_mode: Literal["json", "json+diff"] = "json"
+    # Stored diff size caps (raw diffs are parsed as a stream)
+    diff_max_file_bytes: int = 256 * 1024  # Per file; later lines are counted in diff_stats but not stored
+    diff_max_commit_bytes: int = 1024 * 1024  # Per commit; the diff stream is closed at this point
+
     # MongoDB Configuration
     mongodb_url: str
     mongodb_db_name: str = "starcpay"
@@ -36,9 +54,55 @@ class Settings(BaseSettings):
     openai_model: str = "gpt-4-turbo-preview"
     gemini_model: str = "gemini-1.5-flash"
 
+    # LLM rate limits per provider (requests / tokens per minute)
+    openai_rpm_limit: int = 500
+    openai_tpm_limit: int = 200000
+    claude_rpm_limit: int = 50
+    claude_tpm_limit: int = 40000
+    gemini_rpm_limit: int = 15
+    gemini_tpm_limit: int = 1000000
+    llm_expected_output_tokens: int = 512  # reserved per call until real usage is known
+    llm_max_rate_limit_retries: int = 3
+    llm_default_backoff_seconds: float = 5.0  # used when a 429 has no retry-after header
+
+    # Diff token budgets per LLM call (diffs are condensed to the highest-signal hunks)
+    gaming_diff_token_budget: int = 400
+    analysis_diff_token_budget: int = 1500
+
+    # Rule-based gaming checks run before any LLM call
+    gaming_prefilter_enabled: bool = True
+
+    # LLM response cache (memory LRU in front of the llm_cache collection)
+    llm_cache_enabled: bool = True
+    llm_cache_memory_size: int = 1000  # entries
+    llm_cache_ttl_seconds: int = 7 * 24 * 3600
+    llm_cache_max_documents: int = 50000  # llm_cache collection cap, oldest pruned first (0 = TTL only)
+
+    # Webhook handling: "ingest_first" persists the raw payload and returns 202,
+    # "inline" fetches commit diffs before responding (legacy)
+    webhook_ingest_mode: Literal["ingest_first", "inline"] = "ingest_first"
+    webhook_delivery_cache_size: int = 10000  # Recent X-GitHub-Delivery IDs kept in memory
+
+    # Background job queue (analysis_jobs collection)
+    job_queue_concurrency: int = 4  # Worker tasks per process (global cap)
+    job_queue_per_project: int = 1  # Max concurrently running jobs per project
+    job_max_attempts: int = 5
+    job_lease_seconds: int = 300
+    job_retry_base_seconds: float = 10.0
+    job_retry_max_seconds: float = 600.0
+    job_poll_interval_seconds: float = 2.0
+    job_shutdown_grace_seconds: float = 20.0
+
     # Blockchain Configuration
     rpc_url: str = ""  # EVM RPC endpoint
     private_key: str = ""  # Private key for signing transactions
+    rpc_timeout: float = 30.0  # seconds per RPC request
+    tx_receipt_timeout: float = 120.0  # seconds to wait for a transaction receipt
+    tx_receipt_poll_interval: float = 2.0  # seconds between receipt polls
+    gas_price_ttl_seconds: float = 5.0  # reuse fetched gas price for pipelined transactions
+    rpc_batch_size: int = 100  # eth_calls per JSON-RPC batch
+    stream_cache_ttl_seconds: float = 2.0  # block number / stream info cache lifetime
+    rate_coalesce_window_seconds: float = 60.0  # merge changeRate requests per stream within this window
 
     class Config:
         env_file = ".env"
@@ -1,8 +1,47 @@
+from typing import Dict, List
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from app.config import get_settings
+from app.models.project import PROJECT_INDEXES, PROJECT_QUERIES
+from app.models.commit import (
+    PUSH_EVENT_INDEXES,
+    PUSH_EVENT_QUERIES,
+    COMMIT_ANALYSIS_INDEXES,
+    COMMIT_ANALYSIS_QUERIES
+)
+from app.models.job import JOB_INDEXES, JOB_QUERIES, JOB_SLOT_INDEXES, JOB_SLOT_QUERIES
+from app.models.rate_update import RATE_UPDATE_INDEXES, RATE_UPDATE_QUERIES
+from app.models.llm_cache import LLM_CACHE_INDEXES, LLM_CACHE_QUERIES
+from app.models.diff_blob import DIFF_BLOB_INDEXES, DIFF_BLOB_QUERIES
+from app.models.milestone_ledger import MILESTONE_LEDGER_INDEXES, MILESTONE_LEDGER_QUERIES
 
 settings = get_settings()
 
+# Collection -> indexes required by the hot queries (declared next to the models)
+REQUIRED_INDEXES = {
+    "projects": PROJECT_INDEXES,
+    "push_events": PUSH_EVENT_INDEXES,
+    "commit_analyses": COMMIT_ANALYSIS_INDEXES,
+    "analysis_jobs": JOB_INDEXES,
+    "job_slots": JOB_SLOT_INDEXES,
+    "rate_updates": RATE_UPDATE_INDEXES,
+    "llm_cache": LLM_CACHE_INDEXES,
+    "diff_blobs": DIFF_BLOB_INDEXES,
+    "milestone_ledger": MILESTONE_LEDGER_INDEXES,
+}
+
+# Collection -> known query shapes audited by scripts/audit_indexes.py
+KNOWN_QUERIES = {
+    "projects": PROJECT_QUERIES,
+    "push_events": PUSH_EVENT_QUERIES,
+    "commit_analyses": COMMIT_ANALYSIS_QUERIES,
+    "analysis_jobs": JOB_QUERIES,
+    "job_slots": JOB_SLOT_QUERIES,
+    "rate_updates": RATE_UPDATE_QUERIES,
+    "llm_cache": LLM_CACHE_QUERIES,
+    "diff_blobs": DIFF_BLOB_QUERIES,
+    "milestone_ledger": MILESTONE_LEDGER_QUERIES,
+}
+
 
 class Database:
     client: AsyncIOMotorClient = None
@@ -14,9 +53,12 @@ db = Database()
 
 async def connect_to_mongo():
     """Connect to MongoDB on startup"""
-    db.client = AsyncIOMotorClient(settings.mongodb_url)
+    from app.services.metrics import MongoCommandListener  # app.services imports this module
+
+    db.client = AsyncIOMotorClient(settings.mongodb_url, event_listeners=[MongoCommandListener()])
     db.db = db.client[settings.mongodb_db_name]
     print(f"[OK] Connected to MongoDB: {settings.mongodb_db_name}")
+    await ensure_indexes()
 
 
 async def close_mongo_connection():
@@ -28,3 +70,48 @@ async def close_mongo_connection():
 def get_database() -> AsyncIOMotorDatabase:
     """Get database instance"""
     return db.db
+
+
+async def ensure_indexes():
+    """Create every index in REQUIRED_INDEXES (no-op for indexes that already exist)"""
+    for collection, indexes in REQUIRED_INDEXES.items():
+        names = await db.db[collection].create_indexes(indexes)
+        print(f"[OK] Indexes ensured on {collection}: {len(names)}")
+
+
+def _plan_stages(plan) -> List[str]:
+    """Flatten every stage name in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+async def explain_known_queries() -> List[Dict]:
+    """
+    Run explain() on every query in KNOWN_QUERIES.
+
+    Returns one {"collection", "name", "stages", "collscan"} entry per query.
+    """
+    results = []
+    for collection, queries in KNOWN_QUERIES.items():
+        for query in queries:
+            cursor = db.db[collection].find(query["filter"])
+            if query.get("sort"):
+                cursor = cursor.sort(query["sort"])
+            plan = await cursor.limit(1).explain()
+
+            stages = _plan_stages(plan.get("queryPlanner", {}).get("winningPlan", {}))
+            results.append({
+                "collection": collection,
+                "name": query["name"],
+                "stages": stages,
+                "collscan": "COLLSCAN" in stages
+            })
+    return results
@@ -1,9 +1,18 @@
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from app.database import connect_to_mongo, close_mongo_connection
 from app.routes import projects, webhooks, github_app, webhook_manager, blockchain
+from app.services.github_service import github_service
+from app.services.job_queue import job_queue
+from app.services.ai_workflow import ai_workflow_service
+from app.services.push_ingest import push_ingest_service
+from app.services.blockchain_service import blockchain_service
+from app.services.rate_coalescer import rate_coalescer
+from app.services.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_FLIGHT
 from app.config import get_settings
 
 settings = get_settings()
@@ -14,9 +23,18 @@ async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
     await connect_to_mongo()
+    await github_service.start()
+    job_queue.register("enrich", push_ingest_service.run_enrichment_job)
+    job_queue.register("analysis", ai_workflow_service.run_analysis_job)
+    await job_queue.start()
+    await rate_coalescer.recover()
     print(f"[STARTED] StarCPay Backend on {settings.api_host}:{settings.api_port}")
     yield
     # Shutdown
+    await job_queue.stop()
+    await rate_coalescer.flush_all()
+    await blockchain_service.close()
+    await github_service.close()
     await close_mongo_connection()
 
 
@@ -36,6 +54,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Request latency per route template and in-flight gauge (scrapes of /metrics are not recorded)"""
+    if request.url.path == "/metrics":
+        return await call_next(request)
+
+    method = request.method
+    HTTP_REQUESTS_IN_FLIGHT.labels(method).inc()
+    started = time.perf_counter()
+    status = 500  # Unhandled exceptions surface as 500s
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_REQUESTS_IN_FLIGHT.labels(method).dec()
+        # Template (e.g. /api/projects/{project_id}), not the raw path, to keep label cardinality bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_SECONDS.labels(method, route, str(status)).observe(time.perf_counter() - started)
+
+
 # Include routers
 app.include_router(projects.router)
 app.include_router(webhooks.router)
@@ -61,6 +101,16 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics (job queue depth is refreshed on each scrape)"""
+    try:
+        await job_queue.refresh_depth_metrics()
+    except Exception as e:
+        print(f"[WARN] Could not refresh job queue depth: {e}")
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+from pymongo import IndexModel, ASCENDING, DESCENDING
 
 
 class CommitAnalysis(BaseModel):
@@ -64,3 +65,75 @@ class CommitDetail(BaseModel):
                 "files_changed": []
             }
         }
+
+
+# Indexes and hot query shapes for the push_events / commit_analyses collections
+PUSH_EVENT_INDEXES = [
+    IndexModel([("push_id", ASCENDING)], unique=True),
+    # One push event per GitHub delivery (redeliveries are rejected by this index)
+    IndexModel(
+        [("delivery_id", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"delivery_id": {"$type": "string"}}
+    ),
+    IndexModel([("project_id", ASCENDING), ("created_at", DESCENDING)]),
+    IndexModel([("project_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)]),
+    IndexModel([("status", ASCENDING)]),
+    IndexModel([("created_at", DESCENDING)]),
+]
+
+PUSH_EVENT_QUERIES = [
+    {"name": "push_event_by_id", "filter": {"push_id": "push_x"}},
+    {"name": "push_event_by_delivery", "filter": {"delivery_id": "delivery_x"}},
+    {"name": "project_push_events", "filter": {"project_id": "proj_x"}, "sort": [("created_at", -1)]},
+    {
+        "name": "historic_push_events",
+        "filter": {"project_id": "proj_x", "status": {"$in": ["approved", "completed"]}},
+        "sort": [("created_at", -1)]
+    },
+    {
+        "name": "unfinished_push_events",
+        "filter": {"status": {"$in": ["received", "enrichment_failed", "pending_analysis"]}}
+    },
+    {"name": "recent_push_events", "filter": {}, "sort": [("created_at", -1)]},
+]
+
+# Field projections per push_events read path (list views never transfer diffs, file lists or raw payloads)
+PUSH_EVENT_LIST_PROJECTION = {
+    "_id": 0,
+    "raw_payload": 0,
+    "commits_details.diff": 0,  # Only present on events stored before diffs moved to diff_blobs
+    "commits_details.files_changed": 0,
+}
+PUSH_EVENT_DETAIL_PROJECTION = {"_id": 0, "raw_payload": 0}
+PUSH_EVENT_HISTORY_PROJECTION = {
+    "_id": 0,
+    "commits_details.sha": 1,
+    "commits_details.message": 1,
+    "commits_details.additions": 1,
+    "commits_details.deletions": 1,
+}
+PUSH_EVENT_ACTIVITY_PROJECTION = {
+    "_id": 0,
+    "push_id": 1,
+    "project_id": 1,
+    "tracked_developer": 1,
+    "commit_shas": 1,
+    "created_at": 1,
+}
+
+COMMIT_ANALYSIS_INDEXES = [
+    IndexModel([("project_id", ASCENDING), ("created_at", DESCENDING)]),
+    IndexModel([("project_id", ASCENDING), ("analysis_status", ASCENDING)]),
+    # One analysis per push - the workflow upserts on it so retries never store a second one
+    IndexModel([("push_id", ASCENDING)], unique=True),
+]
+
+COMMIT_ANALYSIS_QUERIES = [
+    {"name": "project_analyses", "filter": {"project_id": "proj_x"}, "sort": [("created_at", -1)]},
+    {
+        "name": "paid_analyses",
+        "filter": {"project_id": "proj_x", "analysis_status": {"$in": ["approved", "completed"]}}
+    },
+    {"name": "analysis_by_push", "filter": {"push_id": "push_x"}},
+]
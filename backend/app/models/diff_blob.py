@@ -0,0 +1,13 @@
+from pymongo import IndexModel, ASCENDING
+
+
+# Indexes and hot query shapes for the diff_blobs collection
+# (compressed commit diffs referenced from push_events.commits_details[].diff_ref)
+DIFF_BLOB_INDEXES = [
+    IndexModel([("sha", ASCENDING)], unique=True),
+]
+
+DIFF_BLOB_QUERIES = [
+    {"name": "diff_by_sha", "filter": {"sha": "abc123"}},
+    {"name": "diffs_by_shas", "filter": {"sha": {"$in": ["abc123", "def456"]}}},
+]
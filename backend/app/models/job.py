@@ -0,0 +1,75 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+from pymongo import IndexModel, ASCENDING
+
+
+class Job(BaseModel):
+    """Background job stored in the analysis_jobs collection"""
+    job_id: str  # Deterministic: "{kind}_{push_id}" so enqueueing is idempotent
+    kind: str  # e.g., "analysis"
+    push_id: str
+    project_id: Optional[str] = None
+
+    # Scheduling
+    status: str = "queued"  # queued, running, completed, failed
+    attempts: int = 0
+    max_attempts: int = 5
+    run_after: datetime = Field(default_factory=datetime.utcnow)
+
+    # Lease held by the worker currently running the job
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    completed_at: Optional[datetime] = None
+
+
+# Indexes and hot query shapes for the analysis_jobs collection
+JOB_INDEXES = [
+    IndexModel([("job_id", ASCENDING)], unique=True),
+    IndexModel([("status", ASCENDING), ("run_after", ASCENDING)]),
+    IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)]),
+    IndexModel([("status", ASCENDING), ("project_id", ASCENDING)]),
+]
+
+JOB_QUERIES = [
+    {"name": "job_by_id", "filter": {"job_id": "analysis_push_x"}},
+    {
+        "name": "claimable_jobs",
+        "filter": {
+            "$or": [
+                {"status": "queued", "run_after": {"$lte": datetime(2000, 1, 1)}},
+                {
+                    "status": "running",
+                    "lease_expires_at": {"$lt": datetime(2000, 1, 1)},
+                    "$expr": {"$lt": ["$attempts", "$max_attempts"]}
+                }
+            ]
+        },
+        "sort": [("run_after", 1)]
+    },
+    {
+        "name": "exhausted_jobs",
+        "filter": {
+            "status": "running",
+            "lease_expires_at": {"$lt": datetime(2000, 1, 1)},
+            "$expr": {"$gte": ["$attempts", "$max_attempts"]}
+        }
+    },
+    {"name": "running_jobs", "filter": {"status": "running", "project_id": {"$ne": None}}},
+    {"name": "queue_depth", "filter": {"status": {"$in": ["queued", "running", "failed"]}}},
+]
+
+# job_slots: one document per (project, slot) - see JobQueue._acquire_slot
+JOB_SLOT_INDEXES = [
+    IndexModel([("slot_id", ASCENDING)], unique=True),
+    IndexModel([("project_id", ASCENDING), ("job_id", ASCENDING)]),
+]
+
+JOB_SLOT_QUERIES = [
+    {"name": "job_slot_by_id", "filter": {"slot_id": "proj_x:0"}},
+    {"name": "job_slot_holder", "filter": {"project_id": "proj_x", "job_id": "analysis_push_x"}},
+]
@@ -0,0 +1,14 @@
+from pymongo import IndexModel, ASCENDING
+
+
+# Indexes and hot query shapes for the llm_cache collection
+LLM_CACHE_INDEXES = [
+    IndexModel([("key", ASCENDING)], unique=True),
+    # TTL index - MongoDB deletes entries once expires_at has passed
+    IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+]
+
+LLM_CACHE_QUERIES = [
+    {"name": "llm_cache_by_key", "filter": {"key": "sha256_x"}},
+    {"name": "llm_cache_oldest", "filter": {}, "sort": [("expires_at", 1)]},
+]
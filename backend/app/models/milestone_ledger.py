@@ -0,0 +1,13 @@
+from pymongo import IndexModel, ASCENDING
+
+
+# Indexes and hot query shapes for the milestone_ledger collection
+# (running spend per project milestone, updated as analyses are stored)
+MILESTONE_LEDGER_INDEXES = [
+    IndexModel([("project_id", ASCENDING), ("milestone_id", ASCENDING)], unique=True),
+]
+
+MILESTONE_LEDGER_QUERIES = [
+    {"name": "ledger_by_project", "filter": {"project_id": "proj_x"}},
+    {"name": "ledger_entry", "filter": {"project_id": "proj_x", "milestone_id": "1"}},
+]
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
+from pymongo import IndexModel, ASCENDING
 
 
 class ProjectCreate(BaseModel):
@@ -22,6 +23,7 @@ class ProjectCreate(BaseModel):
 
     # Evaluation
     evaluation_mode: str  # "agentic" or "manual"
+    analysis_mode: str = "two_pass"  # "two_pass" (gaming check + holistic) or "single_pass" (one combined call)
 
     # Timeline
     start_date: datetime
@@ -62,6 +64,7 @@ class Project(BaseModel):
 
     # Evaluation
     evaluation_mode: str  # "agentic" or "manual"
+    analysis_mode: str = "two_pass"  # "two_pass" (gaming check + holistic) or "single_pass" (one combined call)
 
     # Timeline
     start_date: datetime
@@ -102,6 +105,7 @@ class Project(BaseModel):
                 },
                 "total_budget": 1000.0,
                 "evaluation_mode": "agentic",
+                "analysis_mode": "two_pass",
                 "start_date": "2026-02-01T00:00:00Z",
                 "end_date": "2026-03-01T00:00:00Z",
                 "total_tenure_days": 30,
@@ -110,3 +114,27 @@ class Project(BaseModel):
                 "total_paid": 200.00
             }
         }
+
+
+# Indexes and hot query shapes for the projects collection
+PROJECT_INDEXES = [
+    IndexModel([("project_id", ASCENDING)], unique=True),
+    IndexModel([("repo_owner", ASCENDING), ("repo_name", ASCENDING), ("status", ASCENDING)]),
+    IndexModel([("employee_wallet_address", ASCENDING)]),
+    IndexModel([("employer_wallet_address", ASCENDING)]),
+    IndexModel([("github_username", ASCENDING)]),
+    IndexModel([("status", ASCENDING)]),
+]
+
+PROJECT_QUERIES = [
+    {"name": "project_by_id", "filter": {"project_id": "proj_x"}},
+    {"name": "active_project_by_repo", "filter": {"repo_owner": "owner", "repo_name": "repo", "status": "active"}},
+    {"name": "projects_by_status", "filter": {"status": "active"}},
+    {"name": "projects_by_freelancer", "filter": {"github_username": "dev"}},
+    {"name": "projects_by_employee_wallet", "filter": {"employee_wallet_address": "0x0"}},
+    {"name": "projects_by_employer_wallet", "filter": {"employer_wallet_address": "0x0"}},
+    {
+        "name": "projects_by_any_wallet",
+        "filter": {"$or": [{"employee_wallet_address": "0x0"}, {"employer_wallet_address": "0x0"}]}
+    },
+]
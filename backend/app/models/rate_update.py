@@ -0,0 +1,41 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
+
+class RateUpdate(BaseModel):
+    """One (coalesced) changeRate transaction stored in the rate_updates collection"""
+    treasury_address: str  # Lowercased
+    stream_id: int
+    new_rate: int  # Latest requested rate - earlier ones in the window are superseded
+    push_ids: List[str] = []  # Analyses covered by this transaction
+    status: str = "pending"  # pending, sending, sent, submitted, failed, superseded
+    flush_after: datetime
+    tx_hash: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    sent_at: Optional[datetime] = None
+
+
+# Indexes and hot query shapes for the rate_updates collection
+RATE_UPDATE_INDEXES = [
+    # At most one open (pending) update per stream - submissions merge into it
+    IndexModel(
+        [("treasury_address", ASCENDING), ("stream_id", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"status": "pending"},
+        name="one_pending_per_stream"
+    ),
+    IndexModel([("treasury_address", ASCENDING), ("stream_id", ASCENDING), ("created_at", DESCENDING)]),
+    IndexModel([("status", ASCENDING), ("sent_at", ASCENDING)]),
+    IndexModel([("push_ids", ASCENDING)]),
+]
+
+RATE_UPDATE_QUERIES = [
+    {"name": "pending_rate_update", "filter": {"treasury_address": "0x0", "stream_id": 1, "status": "pending"}},
+    {"name": "pending_rate_updates", "filter": {"status": "pending"}},
+    {"name": "stuck_rate_updates", "filter": {"status": "sending", "sent_at": {"$lt": datetime(2000, 1, 1)}}},
+    {"name": "rate_update_for_push", "filter": {"push_ids": "push_x"}},
+]
@@ -4,6 +4,7 @@ Blockchain test endpoints for testing smart contract interactions
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from typing import List
 from app.services.blockchain_service import blockchain_service
 
 router = APIRouter(prefix="/api/blockchain", tags=["blockchain"])
@@ -20,6 +21,15 @@ class CalculateRateRequest(BaseModel):
     remaining_days: float
 
 
+class StreamRef(BaseModel):
+    treasury_address: str
+    stream_id: int
+
+
+class StreamInfoBatchRequest(BaseModel):
+    streams: List[StreamRef]
+
+
 @router.post("/test-change-rate")
 async def test_change_rate(request: ChangeRateRequest):
     """Test the changeRate contract call directly"""
@@ -64,3 +74,32 @@ async def get_stream_info(treasury_address: str, stream_id: int):
         raise HTTPException(status_code=500, detail=result["error"])
 
     return result
+
+
+@router.post("/stream-info/batch")
+async def get_stream_info_batch(request: StreamInfoBatchRequest):
+    """
+    Get stream info for many streams (across treasuries) in one call.
+
+    Reads are batched into JSON-RPC batch requests and cached per block.
+    Per-stream failures are returned inline with an "error" key.
+    """
+    if len(request.streams) > 500:
+        raise HTTPException(status_code=400, detail="At most 500 streams per request")
+
+    try:
+        return await blockchain_service.get_streams_batch(
+            [(s.treasury_address, s.stream_id) for s in request.streams]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/pending-transactions")
+async def get_pending_transactions():
+    """Transactions sent by the backend account that are still awaiting a receipt"""
+    pending = blockchain_service.pending_transactions()
+    return {
+        "total_pending": len(pending),
+        "pending": [{"nonce": nonce, **tx} for nonce, tx in sorted(pending.items())],
+    }
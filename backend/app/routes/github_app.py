@@ -9,7 +9,13 @@ from typing import Optional
 from datetime import datetime
 
 from app.database import get_database
+from app.models.commit import (
+    PUSH_EVENT_LIST_PROJECTION,
+    PUSH_EVENT_DETAIL_PROJECTION,
+    PUSH_EVENT_ACTIVITY_PROJECTION
+)
 from app.services.github_service import github_service
+from app.services.diff_store import diff_store
 
 router = APIRouter(prefix="/api/github", tags=["github-app"])
 
@@ -130,15 +136,14 @@ async def get_webhook_deliveries(project_id: Optional[str] = None, limit: int =
     if project_id:
         query["project_id"] = project_id
 
-    events = await db["push_events"].find(query).sort("created_at", -1).limit(limit).to_list(length=limit)
+    events = await db["push_events"].find(
+        query, PUSH_EVENT_LIST_PROJECTION
+    ).sort("created_at", -1).limit(limit).to_list(length=limit)
 
-    # Clean up for response
+    # Diffs are only loaded on the detail endpoint; the list shows the length recorded at ingest
     for event in events:
-        event.pop("_id", None)
-        # Remove large diff data for list view
-        if "commits_details" in event:
-            for commit in event["commits_details"]:
-                commit["diff"] = f"[{len(commit.get('diff', ''))} chars]"
+        for commit in event.get("commits_details", []):
+            commit["diff"] = f"[{commit.get('diff_length', '?')} chars]"
 
     return {
         "success": True,
@@ -152,16 +157,17 @@ async def get_webhook_delivery_detail(push_id: str):
     """
     Get detailed information about a specific webhook delivery.
 
-    Includes full commit diffs.
+    Includes full commit diffs (loaded from diff_blobs).
     """
     db = get_database()
 
-    event = await db["push_events"].find_one({"push_id": push_id})
+    event = await db["push_events"].find_one({"push_id": push_id}, PUSH_EVENT_DETAIL_PROJECTION)
 
     if not event:
         raise HTTPException(status_code=404, detail="Push event not found")
 
-    event.pop("_id", None)
+    if "commits_details" in event:
+        event["commits_details"] = await diff_store.hydrate(event["commits_details"])
 
     return {
         "success": True,
@@ -240,7 +246,9 @@ async def get_github_stats():
     total_analyses = await db["commit_analyses"].count_documents({})
 
     # Get recent activity
-    recent_pushes = await db["push_events"].find().sort("created_at", -1).limit(5).to_list(length=5)
+    recent_pushes = await db["push_events"].find(
+        {}, PUSH_EVENT_ACTIVITY_PROJECTION
+    ).sort("created_at", -1).limit(5).to_list(length=5)
 
     return {
         "success": True,
@@ -253,9 +261,9 @@ async def get_github_stats():
         "recent_activity": [
             {
                 "push_id": p["push_id"],
-                "project_id": p["project_id"],
-                "commits_count": p.get("total_commits", 0),
-                "developer": p["tracked_developer"],
+                "project_id": p.get("project_id"),
+                "commits_count": len(p.get("commit_shas") or []),
+                "developer": p.get("tracked_developer"),
                 "created_at": p["created_at"]
             }
             for p in recent_pushes
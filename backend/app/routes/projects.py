@@ -5,8 +5,10 @@ import secrets
 from urllib.parse import urlparse
 
 from app.models.project import ProjectCreate, Project
+from app.models.commit import PUSH_EVENT_LIST_PROJECTION
 from app.database import get_database
 from app.services.github_service import github_service
+from app.services.llm_service import ANALYSIS_MODES
 from app.config import get_settings
 
 router = APIRouter(prefix="/api/projects", tags=["projects"])
@@ -33,6 +35,9 @@ async def create_project(project_data: ProjectCreate):
     2. Creates project in database
     3. Sets up webhook for push events
     """
+    if project_data.analysis_mode not in ANALYSIS_MODES:
+        raise HTTPException(status_code=400, detail="Invalid analysis mode")
+
     db = get_database()
     projects_collection = db["projects"]
 
@@ -68,6 +73,7 @@ async def create_project(project_data: ProjectCreate):
             total_budget=project_data.total_budget,
             payout_threshold=project_data.payout_threshold,
             evaluation_mode=project_data.evaluation_mode,
+            analysis_mode=project_data.analysis_mode,
             start_date=project_data.start_date,
             end_date=project_data.end_date,
             total_tenure_days=project_data.total_tenure_days,
@@ -189,6 +195,24 @@ async def update_project_status(project_id: str, status: str):
     return {"success": True, "message": f"Project status updated to {status}"}
 
 
+@router.patch("/{project_id}/analysis-mode")
+async def update_project_analysis_mode(project_id: str, analysis_mode: str):
+    """Switch between the two-call (two_pass) and combined (single_pass) analysis pipelines"""
+    if analysis_mode not in ANALYSIS_MODES:
+        raise HTTPException(status_code=400, detail="Invalid analysis mode")
+
+    db = get_database()
+    result = await db["projects"].update_one(
+        {"project_id": project_id},
+        {"$set": {"analysis_mode": analysis_mode, "updated_at": datetime.utcnow()}}
+    )
+
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    return {"success": True, "message": f"Project analysis mode updated to {analysis_mode}"}
+
+
 @router.get("/{project_id}/analyses")
 async def get_project_analyses(project_id: str, limit: int = 50):
     """
@@ -236,13 +260,10 @@ async def get_project_push_events(project_id: str, limit: int = 50):
 
     # Fetch push events sorted by creation date (newest first)
     push_events = await db["push_events"].find(
-        {"project_id": project_id}
+        {"project_id": project_id},
+        PUSH_EVENT_LIST_PROJECTION
     ).sort("created_at", -1).limit(limit).to_list(length=limit)
 
-    # Remove MongoDB _id field
-    for event in push_events:
-        event.pop("_id", None)
-
     return {
         "success": True,
         "project_id": project_id,
@@ -4,6 +4,7 @@ Webhook Management Routes
 Programmatically manage GitHub webhooks without manual GitHub UI access.
 """
 
+import httpx
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
@@ -62,67 +63,58 @@ async def update_webhook_url(request: UpdateWebhookRequest):
         token = await github_service.get_installation_token(installation_id)
 
         # List existing webhooks
-        import httpx
-        async with httpx.AsyncClient() as client:
-            # Get all webhooks
-            hooks_response = await client.get(
-                f"https://api.github.com/repos/{owner}/{repo}/hooks",
-                headers={
-                    "Authorization": f"token {token}",
-                    "Accept": "application/vnd.github+json",
-                    "X-GitHub-Api-Version": "2022-11-28"
-                }
+        client = github_service.client
+        # Get all webhooks
+        hooks_response = await client.get(
+            f"https://api.github.com/repos/{owner}/{repo}/hooks",
+            headers=github_service.api_headers(token)
+        )
+        hooks_response.raise_for_status()
+        hooks = hooks_response.json()
+
+        # Find our webhook (contains /api/webhooks/github)
+        our_hook = None
+        for hook in hooks:
+            if "/api/webhooks/github" in hook["config"].get("url", ""):
+                our_hook = hook
+                break
+
+        if not our_hook:
+            raise HTTPException(
+                status_code=404,
+                detail="Webhook not found. Create one first using POST /api/projects/"
             )
-            hooks_response.raise_for_status()
-            hooks = hooks_response.json()
-
-            # Find our webhook (contains /api/webhooks/github)
-            our_hook = None
-            for hook in hooks:
-                if "/api/webhooks/github" in hook["config"].get("url", ""):
-                    our_hook = hook
-                    break
 
-            if not our_hook:
-                raise HTTPException(
-                    status_code=404,
-                    detail="Webhook not found. Create one first using POST /api/projects/"
-                )
-
-            # Update webhook URL
-            hook_id = our_hook["id"]
-            update_response = await client.patch(
-                f"https://api.github.com/repos/{owner}/{repo}/hooks/{hook_id}",
-                headers={
-                    "Authorization": f"token {token}",
-                    "Accept": "application/vnd.github+json",
-                    "X-GitHub-Api-Version": "2022-11-28"
-                },
-                json={
-                    "config": {
-                        "url": request.new_webhook_url,
-                        "content_type": "json",
-                        "secret": settings.github_webhook_secret,
-                        "insecure_ssl": "0"
-                    }
-                }
-            )
-            update_response.raise_for_status()
-            updated_hook = update_response.json()
-
-            return {
-                "success": True,
-                "message": "Webhook URL updated successfully",
-                "webhook_id": hook_id,
-                "old_url": our_hook["config"]["url"],
-                "new_url": request.new_webhook_url,
-                "webhook_details": {
-                    "id": updated_hook["id"],
-                    "url": updated_hook["config"]["url"],
-                    "events": updated_hook["events"],
-                    "active": updated_hook["active"]
+        # Update webhook URL
+        hook_id = our_hook["id"]
+        update_response = await client.patch(
+            f"https://api.github.com/repos/{owner}/{repo}/hooks/{hook_id}",
+            headers=github_service.api_headers(token),
+            json={
+                "config": {
+                    "url": request.new_webhook_url,
+                    "content_type": "json",
+                    "secret": settings.github_webhook_secret,
+                    "insecure_ssl": "0"
                 }
             }
+        )
+        update_response.raise_for_status()
+        updated_hook = update_response.json()
+
+        return {
+            "success": True,
+            "message": "Webhook URL updated successfully",
+            "webhook_id": hook_id,
+            "old_url": our_hook["config"]["url"],
+            "new_url": request.new_webhook_url,
+            "webhook_details": {
+                "id": updated_hook["id"],
+                "url": updated_hook["config"]["url"],
+                "events": updated_hook["events"],
+                "active": updated_hook["active"]
+            }
+        }
 
     except httpx.HTTPStatusError as e:
         raise HTTPException(
@@ -194,36 +186,31 @@ async def list_project_webhooks(project_id: str):
     try:
         token = await github_service.get_installation_token(installation_id)
 
-        import httpx
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.github.com/repos/{owner}/{repo}/hooks",
-                headers={
-                    "Authorization": f"token {token}",
-                    "Accept": "application/vnd.github+json",
-                    "X-GitHub-Api-Version": "2022-11-28"
+        client = github_service.client
+        response = await client.get(
+            f"https://api.github.com/repos/{owner}/{repo}/hooks",
+            headers=github_service.api_headers(token)
+        )
+        response.raise_for_status()
+        hooks = response.json()
+
+        return {
+            "success": True,
+            "project_id": project_id,
+            "repo": f"{owner}/{repo}",
+            "total_webhooks": len(hooks),
+            "webhooks": [
+                {
+                    "id": hook["id"],
+                    "url": hook["config"]["url"],
+                    "events": hook["events"],
+                    "active": hook["active"],
+                    "created_at": hook["created_at"],
+                    "updated_at": hook["updated_at"]
                 }
-            )
-            response.raise_for_status()
-            hooks = response.json()
-
-            return {
-                "success": True,
-                "project_id": project_id,
-                "repo": f"{owner}/{repo}",
-                "total_webhooks": len(hooks),
-                "webhooks": [
-                    {
-                        "id": hook["id"],
-                        "url": hook["config"]["url"],
-                        "events": hook["events"],
-                        "active": hook["active"],
-                        "created_at": hook["created_at"],
-                        "updated_at": hook["updated_at"]
-                    }
-                    for hook in hooks
-                ]
-            }
+                for hook in hooks
+            ]
+        }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing webhooks: {str(e)}")
@@ -250,46 +237,37 @@ async def delete_webhook(project_id: str, webhook_id: Optional[int] = None):
     try:
         token = await github_service.get_installation_token(installation_id)
 
-        import httpx
-        async with httpx.AsyncClient() as client:
-            # If webhook_id not provided, find it
-            if not webhook_id:
-                hooks_response = await client.get(
-                    f"https://api.github.com/repos/{owner}/{repo}/hooks",
-                    headers={
-                        "Authorization": f"token {token}",
-                        "Accept": "application/vnd.github+json",
-                        "X-GitHub-Api-Version": "2022-11-28"
-                    }
-                )
-                hooks_response.raise_for_status()
-                hooks = hooks_response.json()
-
-                # Find our webhook
-                for hook in hooks:
-                    if "/api/webhooks/github" in hook["config"].get("url", ""):
-                        webhook_id = hook["id"]
-                        break
-
-                if not webhook_id:
-                    raise HTTPException(status_code=404, detail="Webhook not found")
-
-            # Delete webhook
-            delete_response = await client.delete(
-                f"https://api.github.com/repos/{owner}/{repo}/hooks/{webhook_id}",
-                headers={
-                    "Authorization": f"token {token}",
-                    "Accept": "application/vnd.github+json",
-                    "X-GitHub-Api-Version": "2022-11-28"
-                }
+        client = github_service.client
+        # If webhook_id not provided, find it
+        if not webhook_id:
+            hooks_response = await client.get(
+                f"https://api.github.com/repos/{owner}/{repo}/hooks",
+                headers=github_service.api_headers(token)
             )
-            delete_response.raise_for_status()
+            hooks_response.raise_for_status()
+            hooks = hooks_response.json()
 
-            return {
-                "success": True,
-                "message": "Webhook deleted successfully",
-                "webhook_id": webhook_id
-            }
+            # Find our webhook
+            for hook in hooks:
+                if "/api/webhooks/github" in hook["config"].get("url", ""):
+                    webhook_id = hook["id"]
+                    break
+
+            if not webhook_id:
+                raise HTTPException(status_code=404, detail="Webhook not found")
+
+        # Delete webhook
+        delete_response = await client.delete(
+            f"https://api.github.com/repos/{owner}/{repo}/hooks/{webhook_id}",
+            headers=github_service.api_headers(token)
+        )
+        delete_response.raise_for_status()
+
+        return {
+            "success": True,
+            "message": "Webhook deleted successfully",
+            "webhook_id": webhook_id
+        }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting webhook: {str(e)}")
@@ -316,47 +294,38 @@ async def test_webhook(project_id: str):
     try:
         token = await github_service.get_installation_token(installation_id)
 
-        import httpx
-        async with httpx.AsyncClient() as client:
-            # Get webhook
-            hooks_response = await client.get(
-                f"https://api.github.com/repos/{owner}/{repo}/hooks",
-                headers={
-                    "Authorization": f"token {token}",
-                    "Accept": "application/vnd.github+json",
-                    "X-GitHub-Api-Version": "2022-11-28"
-                }
-            )
-            hooks_response.raise_for_status()
-            hooks = hooks_response.json()
-
-            # Find our webhook
-            webhook_id = None
-            for hook in hooks:
-                if "/api/webhooks/github" in hook["config"].get("url", ""):
-                    webhook_id = hook["id"]
-                    break
-
-            if not webhook_id:
-                raise HTTPException(status_code=404, detail="Webhook not found")
-
-            # Test webhook
-            test_response = await client.post(
-                f"https://api.github.com/repos/{owner}/{repo}/hooks/{webhook_id}/tests",
-                headers={
-                    "Authorization": f"token {token}",
-                    "Accept": "application/vnd.github+json",
-                    "X-GitHub-Api-Version": "2022-11-28"
-                }
-            )
-            test_response.raise_for_status()
+        client = github_service.client
+        # Get webhook
+        hooks_response = await client.get(
+            f"https://api.github.com/repos/{owner}/{repo}/hooks",
+            headers=github_service.api_headers(token)
+        )
+        hooks_response.raise_for_status()
+        hooks = hooks_response.json()
+
+        # Find our webhook
+        webhook_id = None
+        for hook in hooks:
+            if "/api/webhooks/github" in hook["config"].get("url", ""):
+                webhook_id = hook["id"]
+                break
+
+        if not webhook_id:
+            raise HTTPException(status_code=404, detail="Webhook not found")
+
+        # Test webhook
+        test_response = await client.post(
+            f"https://api.github.com/repos/{owner}/{repo}/hooks/{webhook_id}/tests",
+            headers=github_service.api_headers(token)
+        )
+        test_response.raise_for_status()
 
-            return {
-                "success": True,
-                "message": "Test ping sent to webhook",
-                "webhook_id": webhook_id,
-                "note": "Check your backend logs for the ping event"
-            }
+        return {
+            "success": True,
+            "message": "Test ping sent to webhook",
+            "webhook_id": webhook_id,
+            "note": "Check your backend logs for the ping event"
+        }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error testing webhook: {str(e)}")
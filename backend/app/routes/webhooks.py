@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Request, HTTPException, Header
+from fastapi.responses import JSONResponse
 from typing import Optional
 import hmac
 import hashlib
@@ -7,6 +8,10 @@ from datetime import datetime
 from app.database import get_database
 from app.services.github_service import github_service
 from app.services.commit_analyzer import commit_analyzer_service
+from app.services.diff_store import diff_store
+from app.services.job_queue import job_queue
+from app.services.metrics import WEBHOOK_EVENTS
+from app.services.push_ingest import push_ingest_service
 # from app.services.ai_workflow import ai_workflow_service  # Temporarily disabled for testing
 from app.config import get_settings
 
@@ -38,8 +43,14 @@ async def handle_github_webhook(
     """
     Handle GitHub webhook events (push events)
 
-    Flow:
+    Flow (ingest_first mode, default):
     1. Verify webhook signature
+    2. Dedupe on delivery ID and persist the raw payload
+    3. Return 202 - the "enrich" job matches the project, filters commits
+       and fetches diffs in the background
+
+    Flow (inline mode):
+    1. Verify webhook signature and dedupe on delivery ID
     2. Extract push data and commits
     3. Find matching project in database
     4. Filter commits by tracked developer
@@ -47,6 +58,9 @@ async def handle_github_webhook(
     6. Store in MongoDB
     """
 
+    def count(outcome: str) -> None:
+        WEBHOOK_EVENTS.labels(x_github_event or "unknown", outcome).inc()
+
     # Log all headers for debugging
     print("=" * 80)
     print("[WEBHOOK] WEBHOOK RECEIVED")
@@ -61,15 +75,30 @@ async def handle_github_webhook(
     print(f"Body preview: {body[:300]}")
     print("=" * 80)
 
+    # Before the delivery-ID check, so unsigned requests can't probe or fill the delivery cache
+    if not verify_github_signature(body, x_hub_signature_256, settings.github_webhook_secret):
+        print("[REJECTED] Invalid webhook signature")
+        count("invalid_signature")
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+
+    # Reject GitHub redeliveries we have just processed without touching MongoDB
+    seen_push_id = push_ingest_service.seen_delivery(x_github_delivery)
+    if seen_push_id:
+        print(f"[DUPLICATE] Delivery {x_github_delivery} already ingested as {seen_push_id}")
+        count("duplicate")
+        return {"success": True, "duplicate": True, "push_id": seen_push_id, "status": "duplicate"}
+
     try:
         # Handle ping event (GitHub sends this to test webhook)
         if x_github_event == "ping":
             print("[PING] Ping event - responding with pong")
+            count("ping")
             return {"message": "pong", "status": "ok"}
 
         # Handle empty body
         if not body or len(body) == 0:
             print("[WARN]  Empty body received - likely Cloudflare/proxy issue")
+            count("empty_body")
             return {
                 "message": "Empty body received",
                 "status": "error",
@@ -93,6 +122,7 @@ async def handle_github_webhook(
                 print("[OK] Parsed URL-encoded payload")
             except Exception as e:
                 print(f"[ERROR] Failed to parse URL-encoded payload: {e}")
+                count("parse_error")
                 return {"message": "Failed to parse URL-encoded JSON", "status": "error", "error": str(e)}
         else:
             # Try different decoding methods for raw JSON
@@ -110,6 +140,7 @@ async def handle_github_webhook(
                     except Exception as final_error:
                         print(f"[ERROR] All JSON parsing methods failed")
                         print(f"Body content: {body[:500]}")
+                        count("parse_error")
                         return {
                             "message": "Failed to parse JSON",
                             "status": "error",
@@ -119,6 +150,7 @@ async def handle_github_webhook(
 
         if not payload:
             print("[ERROR] Payload is None after parsing")
+            count("parse_error")
             return {"message": "Payload is empty", "status": "error"}
 
         print(f"[OK] JSON parsed successfully")
@@ -127,12 +159,14 @@ async def handle_github_webhook(
         # Only handle push events
         if x_github_event != "push":
             print(f"[INFO]  Ignoring non-push event: {x_github_event}")
+            count("ignored_event")
             return {"message": f"Event ignored (type: {x_github_event})"}
 
     except Exception as e:
         print(f"[ERROR] Error in webhook preprocessing: {e}")
         import traceback
         traceback.print_exc()
+        count("error")
         return {
             "message": "Webhook preprocessing error",
             "status": "error",
@@ -140,6 +174,11 @@ async def handle_github_webhook(
             "body_size": len(body) if body else 0
         }
 
+    if settings.webhook_ingest_mode == "ingest_first":
+        result = await push_ingest_service.ingest(payload, x_github_delivery)
+        count("duplicate" if result["duplicate"] else "received")
+        return JSONResponse(status_code=200 if result["duplicate"] else 202, content=result)
+
     # Extract push data
     repo_full_name = payload["repository"]["full_name"]
     repo_owner, repo_name = repo_full_name.split("/")
@@ -149,8 +188,17 @@ async def handle_github_webhook(
 
     print(f"[RECEIVED] Received push event: {repo_full_name} | Pusher: {pusher} | Commits: {len(commits)}")
 
-    # Find matching project in database
     db = get_database()
+
+    # Skip redeliveries before spending GitHub API calls on them
+    if x_github_delivery:
+        existing = await db["push_events"].find_one({"delivery_id": x_github_delivery}, {"push_id": 1})
+        if existing:
+            push_ingest_service.recent_deliveries.set(x_github_delivery, existing["push_id"])
+            count("duplicate")
+            return {"success": True, "duplicate": True, "push_id": existing["push_id"], "status": "duplicate"}
+
+    # Find matching project in database
     project = await db["projects"].find_one({
         "repo_owner": repo_owner,
         "repo_name": repo_name,
@@ -159,26 +207,19 @@ async def handle_github_webhook(
 
     if not project:
         print(f"[WARN]  No active project found for {repo_full_name}")
+        count("no_project")
         return {"message": "No active project found for this repository"}
 
     tracked_developer = project["github_username"]
 
     # Filter commits by tracked developer
     # Note: GitHub webhook gives commit author username in commit["author"]["username"]
-    tracked_commits = []
-    for commit in commits:
-        commit_author = commit.get("author", {}).get("username", "")
-        commit_author_name = commit.get("author", {}).get("name", "")
-
-        # Match by username or name (case insensitive)
-        if (commit_author and commit_author.lower() == tracked_developer.lower()) or \
-           (commit_author_name and commit_author_name.lower() == tracked_developer.lower()):
-            tracked_commits.append(commit["id"])  # commit SHA
-            print(f"   [MATCH] Matched commit: {commit['id'][:8]} by {commit_author or commit_author_name}")
+    tracked_commits = push_ingest_service.filter_tracked_commits(commits, tracked_developer)
 
     if not tracked_commits:
         print(f"[INFO]  No commits from tracked developer {tracked_developer}")
         print(f"   Available commits: {[(c.get('author', {}).get('username', 'unknown'), c.get('author', {}).get('name', 'unknown')) for c in commits]}")
+        count("no_tracked_commits")
         return {"message": f"No commits from tracked developer {tracked_developer}"}
 
     print(f"[OK] Found {len(tracked_commits)} commits from {tracked_developer}")
@@ -187,18 +228,23 @@ async def handle_github_webhook(
     installation_id = project["installation_id"]
 
     try:
-        commits_details = await github_service.get_batch_commits(
+        fetch_results = await github_service.fetch_commits(
             installation_id,
             repo_owner,
             repo_name,
             tracked_commits
         )
+        commits_details = [r["commit"] for r in fetch_results if r["error"] is None]
+        fetch_errors = {r["sha"]: r["error"] for r in fetch_results if r["error"] is not None}
 
-        print(f"[FETCHED] Fetched details for {len(commits_details)} commits")
+        print(f"[FETCHED] Fetched details for {len(commits_details)} commits ({len(fetch_errors)} failed)")
+
+        # Diffs live in diff_blobs; the push event keeps diff_ref/diff_length
+        commits_details = await diff_store.offload(commits_details)
 
         # Store push event for processing
-        push_id = f"push_{datetime.utcnow().timestamp()}"
-        await db["push_events"].insert_one({
+        push_id = push_ingest_service.push_id_for(x_github_delivery)
+        push_event = {
             "push_id": push_id,
             "project_id": project["project_id"],
             "repo": repo_full_name,
@@ -207,9 +253,17 @@ async def handle_github_webhook(
             "tracked_developer": tracked_developer,
             "commit_shas": tracked_commits,
             "commits_details": commits_details,
+            "fetch_errors": fetch_errors,
             "status": "pending_analysis",
             "created_at": datetime.utcnow()
-        })
+        }
+        if x_github_delivery:
+            push_event["delivery_id"] = x_github_delivery
+
+        existing_push_id = await push_ingest_service.insert_push_event(push_event)
+        if existing_push_id:
+            count("duplicate")
+            return {"success": True, "duplicate": True, "push_id": existing_push_id, "status": "duplicate"}
 
         print(f"[STORED] Stored push event: {push_id}")
 
@@ -222,6 +276,7 @@ async def handle_github_webhook(
                 {"push_id": push_id},
                 {"$set": {"status": "pending_manual_review"}}
             )
+            count("manual_review")
             return {
                 "success": True,
                 "message": "Push event stored for manual review",
@@ -232,41 +287,24 @@ async def handle_github_webhook(
                 "status": "pending_manual_review"
             }
 
-        # Agentic mode - trigger AI workflow in background
-        print(f"[AGENTIC] Triggering AI analysis workflow in background...")
-
-        import asyncio
-        from app.services.ai_workflow import ai_workflow_service
-
-        project_context = {
-            "freelancer": tracked_developer,
-            "repo": repo_full_name,
-            "wallet_address": project.get("wallet_address", ""),
-            "freelance_alias": project.get("freelance_alias", "")
-        }
-
-        # Run workflow in background so GitHub gets a fast 200 response
-        asyncio.create_task(
-            ai_workflow_service.run_analysis_workflow(
-                push_id=push_id,
-                project_id=project["project_id"],
-                commits_details=commits_details,
-                project_context=project_context
-            )
-        )
+        # Agentic mode - queue AI workflow (durable, runs on the background worker pool)
+        print(f"[AGENTIC] Queueing AI analysis workflow...")
+        await job_queue.enqueue("analysis", push_id, project["project_id"])
 
+        count("queued")
         return {
             "success": True,
-            "message": "Push event received, analysis running in background",
+            "message": "Push event received, analysis queued",
             "push_id": push_id,
             "project_id": project["project_id"],
             "tracked_commits": len(tracked_commits),
             "evaluation_mode": "agentic",
-            "status": "processing"
+            "status": "queued"
         }
 
     except Exception as e:
         print(f"[ERROR] Error processing webhook: {e}")
+        count("error")
         raise HTTPException(status_code=500, detail=f"Error processing webhook: {str(e)}")
 
 
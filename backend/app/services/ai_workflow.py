@@ -5,16 +5,85 @@ Simple multi-step workflow that analyzes commits and determines payout.
 No external dependencies - just Python functions.
 """
 
-from typing import Dict, List
+from typing import Dict, List, Optional
 from datetime import datetime
+from pymongo import ReturnDocument
 from app.database import get_database
-from app.services.llm_service import llm_service
+from app.models.commit import (
+    PUSH_EVENT_DETAIL_PROJECTION,
+    PUSH_EVENT_HISTORY_PROJECTION
+)
+from app.services.llm_service import llm_service, track_usage
+from app.services.metrics import WORKFLOW_SECONDS, observe_stage_timings
+from app.services.tracing import collect_spans, span
 from app.services.blockchain_service import blockchain_service
+from app.services.rate_coalescer import rate_coalescer
+from app.services.commit_analyzer import commit_analyzer_service
+from app.services.diff_store import diff_store
+from app.services.project_stats import project_stats_service
+from app.services.milestone_ledger import milestone_ledger_service
+from app.utils.stage_graph import Stage, StageFailed, StageGraph
 
 
 class AIWorkflowService:
     """Simple AI workflow for analyzing commits"""
 
+    @staticmethod
+    def build_project_context(project: Dict) -> Dict:
+        """Project fields passed through the workflow"""
+        return {
+            "freelancer": project["github_username"],
+            "repo": f"{project['repo_owner']}/{project['repo_name']}",
+            "wallet_address": project.get("wallet_address", ""),
+            "freelance_alias": project.get("freelance_alias", ""),
+            "analysis_mode": project.get("analysis_mode", "two_pass")
+        }
+
+    async def run_analysis_job(self, job: Dict) -> None:
+        """
+        Job queue handler for "analysis" jobs.
+
+        Loads the stored push event and runs the workflow. Events that already
+        left pending_analysis are skipped, and an event whose analysis was
+        stored by an earlier attempt only finishes the remaining bookkeeping
+        steps, so retries never analyze (or pay) twice.
+        Raises on workflow failure so the queue retries with backoff.
+        """
+        db = get_database()
+
+        push_event = await db["push_events"].find_one({"push_id": job["push_id"]}, PUSH_EVENT_DETAIL_PROJECTION)
+        if not push_event or push_event.get("status") != "pending_analysis":
+            print(f"[WORKFLOW] Skipping {job['push_id']} - not pending analysis")
+            return
+
+        stored = await db["commit_analyses"].find_one({"push_id": job["push_id"]}, {"_id": 0})
+        if stored:
+            print(f"[WORKFLOW] Resuming {job['push_id']} - analysis already stored")
+            await self._apply_analysis(stored)
+            await self._update_earnings(stored)
+            await self._complete_push(stored)
+            return
+
+        project = await db["projects"].find_one({"project_id": push_event["project_id"]})
+        if not project:
+            raise ValueError(f"Project {push_event['project_id']} not found")
+
+        if project.get("evaluation_mode", "manual") == "manual":
+            await db["push_events"].update_one(
+                {"push_id": job["push_id"]},
+                {"$set": {"status": "pending_manual_review"}}
+            )
+            return
+
+        result = await self.run_analysis_workflow(
+            push_id=job["push_id"],
+            project_id=project["project_id"],
+            commits_details=await diff_store.hydrate(push_event.get("commits_details", [])),
+            project_context=self.build_project_context(project)
+        )
+        if not result["success"]:
+            raise RuntimeError(result["error"])
+
     async def run_analysis_workflow(
         self,
         push_id: str,
@@ -25,86 +94,175 @@ class AIWorkflowService:
         """
         Run complete AI analysis workflow
 
-        Flow:
+        Stages (run as a DAG - a stage starts once its dependencies finish):
         1. Gaming Detection (Gemini) - Fast spam detection
-        2. Data Enrichment - Fetch milestones, history, budget
-        3. Holistic Analysis (GPT-4o-mini) - Smart amount decision
-        4. Store results
-        5. Update project earnings
-        6. Check threshold
+        2. Data Enrichment - Fetch milestones, history, budget (concurrent with 1)
+        3. Holistic Analysis (GPT-4o-mini) - Smart amount decision (after 1 and 2)
+        4. Store results (once per push), fold them into stats and the ledger
+        5. Update project earnings, check threshold; then mark the push analyzed
+
+        Projects in "single_pass" analysis mode have no separate gaming stage:
+        step 3 is one combined call after enrichment. Per-stage timings are
+        saved on the push event as stage_timings.
         """
+        analysis_mode = project_context.get("analysis_mode", "two_pass")
 
         print(f"\n{'='*60}")
         print(f"[WORKFLOW] Starting AI Analysis Workflow")
         print(f"Push ID: {push_id}")
         print(f"Project: {project_id}")
         print(f"Commits: {len(commits_details)}")
+        print(f"Mode: {analysis_mode}")
         print(f"{'='*60}\n")
 
-        try:
-            # Step 1: Gaming Detection (Gemini - token-efficient)
-            print("[STEP 1] Gaming detection (Gemini)...")
-            gaming_result = await llm_service.detect_gaming(commits_details)
+        with collect_spans() as spans, track_usage() as usage:
+            graph = self._build_stage_graph(push_id, project_id, commits_details, project_context, usage)
+            try:
+                results, timings = await graph.run()
+            except StageFailed as e:
+                print(f"[ERROR] Workflow failed in stage {e.stage}: {e.error}")
+                import traceback
+                traceback.print_exception(type(e.error), e.error, e.error.__traceback__)
+                WORKFLOW_SECONDS.labels(analysis_mode, "failed").observe(e.timings["total_ms"] / 1000)
+                observe_stage_timings(e.timings, analysis_mode)
+                await self._store_stage_timings(push_id, analysis_mode, {**e.timings, "spans": spans, "llm_usage": usage})
+                return {
+                    "success": False,
+                    "error": str(e.error)
+                }
+
+        WORKFLOW_SECONDS.labels(analysis_mode, "ok").observe(timings["total_ms"] / 1000)
+        observe_stage_timings(timings, analysis_mode)
+        timings = {**timings, "spans": spans, "llm_usage": usage}
+        await self._store_stage_timings(push_id, analysis_mode, timings)
+        ai_analysis = results["store"]  # As stored - what the earnings were based on
+        payout_status = results["earnings"]
 
-            if gaming_result.get("is_gaming", False):
-                print(f"  [REJECTED] Gaming detected: {gaming_result.get('reason', '')}")
+        print(f"\n{'='*60}")
+        print(f"[WORKFLOW] Analysis Complete!")
+        print(f"Payout: ${ai_analysis['payout_amount']}")
+        print(f"Quality: {ai_analysis.get('quality_score', 0)}")
+        print(f"Confidence: {ai_analysis['confidence']}")
+        print(f"Gaming: {ai_analysis.get('gaming_detected', False)}")
+        print(f"Trigger Payout: {payout_status['should_trigger_payout']}")
+        print(f"Stage timings: " + ", ".join(
+            f"{name} {t['duration_ms']:.0f}ms" for name, t in timings["stages"].items()
+        ) + f" (total {timings['total_ms']:.0f}ms)")
+        print(f"LLM usage: {usage['calls']} call(s), {usage['total_tokens']} tokens, ~${usage['cost_usd']:.4f}")
+        print(f"{'='*60}\n")
 
-            # Step 2: Data Enrichment
-            print("[STEP 2] Enriching data...")
-            enriched_data = await self._enrich_data(
-                project_id,
-                commits_details,
-                project_context
-            )
+        return {
+            "success": True,
+            "analysis": ai_analysis,
+            "payout_status": payout_status,
+            "stage_timings": timings
+        }
 
-            # Step 3: Holistic Analysis (GPT-4o-mini)
-            print("[STEP 3] Holistic analysis (GPT-4o-mini)...")
-            ai_analysis = await llm_service.holistic_analysis(
-                commits_details=commits_details,
-                milestones=enriched_data["milestones"],
-                historic_commits=enriched_data["historic_commits"],
-                budget_info=enriched_data["budget_info"],
-                gaming_result=gaming_result
-            )
+    def _build_stage_graph(
+        self,
+        push_id: str,
+        project_id: str,
+        commits_details: List[Dict],
+        project_context: Dict,
+        llm_usage: Dict
+    ) -> StageGraph:
+        """Workflow stages and their dependencies for the project's analysis mode"""
+        analysis_mode = project_context.get("analysis_mode", "two_pass")
+
+        async def enrichment(results: Dict) -> Dict:
+            print("[STEP 2] Enriching data...")
+            return await self._enrich_data(project_id, commits_details, project_context)
 
-            # Step 4: Store results
+        async def store(results: Dict) -> Dict:
             print("[STEP 4] Storing analysis results...")
-            await self._store_analysis(
+            return await self._store_analysis(
                 push_id,
                 project_id,
-                ai_analysis
+                results["analysis"],
+                analysis_mode,
+                commits_count=len(commits_details),
+                llm_usage=dict(llm_usage)  # Model calls are all done once the analysis stage finished
             )
 
-            # Step 5: Update earnings
+        async def earnings(results: Dict) -> Dict:
             print("[STEP 5] Updating project earnings...")
-            payout_status = await self._update_earnings(
-                project_id,
-                ai_analysis["payout_amount"]
+            payout_status = await self._update_earnings(results["store"])
+            await self._complete_push(results["store"])
+            return payout_status
+
+        if analysis_mode == "single_pass":
+            analysis = Stage(
+                "analysis",
+                lambda results: self._combined_stage(commits_details, results["enrichment"]),
+                ("enrichment",)
+            )
+            stages = [Stage("enrichment", enrichment), analysis]
+        else:
+            analysis = Stage(
+                "analysis",
+                lambda results: self._holistic_stage(commits_details, results["enrichment"], results["gaming_detection"]),
+                ("gaming_detection", "enrichment")
             )
+            stages = [
+                Stage("gaming_detection", lambda results: self._gaming_stage(commits_details)),
+                Stage("enrichment", enrichment),
+                analysis
+            ]
+
+        return StageGraph(stages + [
+            Stage("store", store, ("analysis",)),
+            Stage("earnings", earnings, ("store",)),
+        ])
+
+    async def _gaming_stage(self, commits_details: List[Dict]) -> Dict:
+        """Step 1: Gaming Detection (Gemini - token-efficient)"""
+        print("[STEP 1] Gaming detection (Gemini)...")
+        gaming_result = await llm_service.detect_gaming(commits_details)
+
+        if gaming_result.get("is_gaming", False):
+            print(f"  [REJECTED] Gaming detected: {gaming_result.get('reason', '')}")
+        return gaming_result
+
+    async def _holistic_stage(self, commits_details: List[Dict], enriched_data: Dict, gaming_result: Dict) -> Dict:
+        """Step 3: Holistic Analysis (GPT-4o-mini)"""
+        print("[STEP 3] Holistic analysis (GPT-4o-mini)...")
+        return await llm_service.holistic_analysis(
+            commits_details=commits_details,
+            milestones=enriched_data["milestones"],
+            historic_commits=enriched_data["historic_commits"],
+            budget_info=enriched_data["budget_info"],
+            gaming_result=gaming_result
+        )
 
-            print(f"\n{'='*60}")
-            print(f"[WORKFLOW] Analysis Complete!")
-            print(f"Payout: ${ai_analysis['payout_amount']}")
-            print(f"Quality: {ai_analysis.get('quality_score', 0)}")
-            print(f"Confidence: {ai_analysis['confidence']}")
-            print(f"Gaming: {ai_analysis.get('gaming_detected', False)}")
-            print(f"Trigger Payout: {payout_status['should_trigger_payout']}")
-            print(f"{'='*60}\n")
-
-            return {
-                "success": True,
-                "analysis": ai_analysis,
-                "payout_status": payout_status
-            }
+    async def _combined_stage(self, commits_details: List[Dict], enriched_data: Dict) -> Dict:
+        """Step 3 in single-pass mode: one combined gaming + payout call"""
+        print("[STEP 3] Combined gaming + holistic analysis (GPT-4o-mini)...")
+        combined = await llm_service.combined_analysis(
+            commits_details=commits_details,
+            milestones=enriched_data["milestones"],
+            historic_commits=enriched_data["historic_commits"],
+            budget_info=enriched_data["budget_info"]
+        )
+
+        gaming_result = combined["gaming_result"]
+        if gaming_result.get("is_gaming", False):
+            print(f"  [REJECTED] Gaming detected: {gaming_result.get('reason', '')}")
 
+        return combined["analysis"]
+
+    async def _store_stage_timings(self, push_id: str, analysis_mode: str, timings: Dict) -> None:
+        """Save per-stage timings on the push event (best effort - never fails the workflow)"""
+        try:
+            await get_database()["push_events"].update_one(
+                {"push_id": push_id},
+                {"$set": {"stage_timings": {
+                    **timings,
+                    "analysis_mode": analysis_mode,
+                    "recorded_at": datetime.utcnow()
+                }}}
+            )
         except Exception as e:
-            print(f"[ERROR] Workflow failed: {e}")
-            import traceback
-            traceback.print_exc()
-            return {
-                "success": False,
-                "error": str(e)
-            }
+            print(f"[WARN] Could not store stage timings for {push_id}: {e}")
 
     async def _enrich_data(
         self,
@@ -141,16 +299,10 @@ class AIWorkflowService:
                     'tasks_count': len(m.get('tasks', []))
                 })
 
-        # Get previous analyses to calculate actual payments made
-        previous_analyses = await db["commit_analyses"].find(
-            {"project_id": project_id, "analysis_status": {"$in": ["approved", "completed"]}}
-        ).to_list(length=100)
-
-        total_paid_from_analyses = sum(a.get("payout_amount", 0) for a in previous_analyses)
-
         # Get last 10 historic commits from push_events
         historic_push_events = await db["push_events"].find(
-            {"project_id": project_id, "status": {"$in": ["approved", "completed"]}}
+            {"project_id": project_id, "status": {"$in": ["approved", "completed"]}},
+            PUSH_EVENT_HISTORY_PROJECTION
         ).sort("created_at", -1).limit(10).to_list(length=10)
 
         historic_commits = []
@@ -171,14 +323,8 @@ class AIWorkflowService:
         # Remaining budget = Total budget - (paid + pending)
         remaining_budget = total_budget - earned_pending - total_paid
 
-        # Calculate how much of each milestone has been spent
-        milestone_spending = {}
-        for analysis in previous_analyses:
-            # Try to match analysis to milestone (if we stored it)
-            milestone_id = analysis.get("milestone_id", "unknown")
-            if milestone_id not in milestone_spending:
-                milestone_spending[milestone_id] = 0
-            milestone_spending[milestone_id] += analysis.get("payout_amount", 0)
+        # Spend per milestone from the ledger (one indexed read, kept up to date as analyses are stored)
+        milestone_spending = await milestone_ledger_service.get_spending(project_id)
 
         budget_info = {
             "total_budget": total_budget,
@@ -213,10 +359,16 @@ class AIWorkflowService:
         self,
         push_id: str,
         project_id: str,
-        analysis: Dict
-    ) -> None:
+        analysis: Dict,
+        analysis_mode: str = "two_pass",
+        commits_count: int = 0,
+        llm_usage: Optional[Dict] = None
+    ) -> Dict:
         """
-        Step 3: Store analysis results in database
+        Step 4: Store analysis results in database
+
+        commit_analyses is unique on push_id and written with $setOnInsert, so
+        a retry keeps (and returns) the analysis stored by the first attempt.
         """
         db = get_database()
 
@@ -230,51 +382,100 @@ class AIWorkflowService:
             "commits_summary": analysis["commits_summary"],
             "quality_score": analysis["quality_score"],
             "task_alignment": analysis["task_alignment"],
+            "milestone_id": analysis.get("milestone_id"),
             "gaming_detected": analysis["gaming_detected"],
+            "gaming_rule": analysis.get("gaming_rule"),  # Pre-filter rule behind a rejection or review hold
+            "gaming_evidence": analysis.get("gaming_evidence"),
             "analysis_status": analysis["analysis_status"],
+            "analysis_mode": analysis_mode,
+            "commits_count": commits_count,
+            "llm_usage": llm_usage,
             "created_at": datetime.utcnow(),
-            "analyzed_by": "ai_workflow_v1"
+            "analyzed_by": "ai_workflow_v1",
+            "applied_steps": []  # Bookkeeping done for this analysis (see _mark_applied)
         }
 
-        await db["commit_analyses"].insert_one(analysis_doc)
+        with span("mongo.insert_analysis"):
+            stored = await db["commit_analyses"].find_one_and_update(
+                {"push_id": push_id},
+                {"$setOnInsert": analysis_doc},
+                upsert=True,
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+        print(f"  - Stored in commit_analyses collection")
 
-        # Update push event status
-        await db["push_events"].update_one(
-            {"push_id": push_id},
-            {"$set": {
-                "status": analysis["analysis_status"],
-                "analyzed_at": datetime.utcnow()
-            }}
-        )
+        await self._apply_analysis(stored)
+        return stored
 
-        print(f"  - Stored in commit_analyses collection")
-        print(f"  - Updated push_events status: {analysis['analysis_status']}")
+    async def _apply_analysis(self, analysis_doc: Dict) -> None:
+        """
+        Fold a stored analysis into project stats and the milestone ledger.
 
-    async def _update_earnings(
-        self,
-        project_id: str,
-        payout_amount: float
-    ) -> Dict:
+        Each step is marked in the analysis' applied_steps once it succeeded and
+        skipped on later attempts, so a retry after a partial failure neither
+        misses nor double-counts it.
         """
-        Step 5: Update project earnings, check threshold, and call changeRate on-chain
+        steps = [
+            ("project_stats", project_stats_service.record_analysis),
+            ("milestone_ledger", milestone_ledger_service.record_analysis),
+        ]
+        for step, record in steps:
+            if step in analysis_doc.get("applied_steps", []):
+                continue
+            with span(f"mongo.{step}"):
+                await record(analysis_doc)
+            await self._mark_applied(analysis_doc, step)
+
+        print(f"  - Updated project stats")
+        print(f"  - Booked to milestone ledger: {analysis_doc.get('milestone_id') or 'unknown'}")
+
+    @staticmethod
+    async def _mark_applied(analysis_doc: Dict, step: str) -> None:
+        """Record that a bookkeeping step for this analysis is done"""
+        await get_database()["commit_analyses"].update_one(
+            {"push_id": analysis_doc["push_id"]},
+            {"$addToSet": {"applied_steps": step}}
+        )
+        analysis_doc.setdefault("applied_steps", []).append(step)
+
+    async def _complete_push(self, analysis_doc: Dict) -> None:
+        """Move the push event out of pending_analysis - last, so retries redo anything unfinished"""
+        with span("mongo.push_event_status"):
+            await get_database()["push_events"].update_one(
+                {"push_id": analysis_doc["push_id"]},
+                {"$set": {
+                    "status": analysis_doc["analysis_status"],
+                    "analyzed_at": datetime.utcnow()
+                }}
+            )
+        print(f"  - Updated push_events status: {analysis_doc['analysis_status']}")
+
+    async def _update_earnings(self, analysis_doc: Dict) -> Dict:
         """
-        db = get_database()
+        Step 5: Update project earnings, check threshold, and queue changeRate on-chain
 
-        # Get current project
-        project = await db["projects"].find_one({"project_id": project_id})
+        The payout is credited once per analysis ("earnings" in applied_steps);
+        the rate update is absolute, so re-queueing it on a retry is harmless.
+        """
+        push_id = analysis_doc["push_id"]
+        project_id = analysis_doc["project_id"]
+        payout_amount = analysis_doc["payout_amount"]
+
+        if "earnings" in analysis_doc.get("applied_steps", []):
+            project = await get_database()["projects"].find_one({"project_id": project_id})
+            if not project:
+                raise ValueError(f"Project {project_id} not found")
+            print(f"  - Earnings already credited by an earlier attempt")
+        else:
+            # Atomic $inc - threshold is checked against the post-update document
+            with span("mongo.apply_earnings"):
+                project = await commit_analyzer_service.apply_earnings(project_id, payout_amount)
+            await self._mark_applied(analysis_doc, "earnings")
 
-        current_pending = project.get("earned_pending", 0.0)
+        new_pending = project.get("earned_pending", 0.0)
+        current_pending = new_pending - payout_amount
         threshold = project.get("payout_threshold", 100.0)
-        new_pending = current_pending + payout_amount
-
-        # Update project
-        await db["projects"].update_one(
-            {"project_id": project_id},
-            {
-                "$inc": {"earned_pending": payout_amount},
-                "$set": {"updated_at": datetime.utcnow()}
-            }
-        )
 
         should_trigger_payout = new_pending >= threshold
 
@@ -306,21 +507,19 @@ class AIWorkflowService:
                     new_rate = int(0.0001 * (10 ** 18))  # 100000000000000
                     print(f"  [BLOCKCHAIN] Gaming detected - setting penalty low rate")
 
-                print(f"  [BLOCKCHAIN] Calling changeRate...")
+                print(f"  [BLOCKCHAIN] Queueing changeRate (coalesced per stream)...")
                 print(f"  [BLOCKCHAIN] Treasury: {treasury_address}")
                 print(f"  [BLOCKCHAIN] Stream ID: {stream_id}")
                 print(f"  [BLOCKCHAIN] New rate: {new_rate}")
 
-                blockchain_result = await blockchain_service.change_rate(
-                    treasury_address=treasury_address,
-                    stream_id=int(stream_id),
-                    new_rate=new_rate,
-                )
-
-                if blockchain_result.get("success"):
-                    print(f"  [BLOCKCHAIN] changeRate SUCCESS - tx: {blockchain_result['tx_hash']}")
-                else:
-                    print(f"  [BLOCKCHAIN] changeRate FAILED - {blockchain_result.get('error')}")
+                # Sent as one transaction with any other rate changes for this stream in the window
+                with span("chain.queue_change_rate", stream_id=int(stream_id)):
+                    blockchain_result = await rate_coalescer.submit(
+                        treasury_address=treasury_address,
+                        stream_id=int(stream_id),
+                        new_rate=new_rate,
+                        push_id=push_id,
+                    )
 
             except Exception as e:
                 print(f"  [BLOCKCHAIN ERROR] {e}")
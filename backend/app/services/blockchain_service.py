@@ -2,8 +2,16 @@
 Blockchain Service for interacting with StreamingTreasury contract on ARC Testnet
 """
 
-from web3 import Web3
+import asyncio
+import time
+from typing import Dict, List, Tuple
+from aiohttp import ClientTimeout
+from web3 import AsyncWeb3
+from web3.exceptions import TimeExhausted
 from app.config import get_settings
+from app.services.metrics import CHAIN_CALL_SECONDS, timed
+from app.services.nonce_manager import NonceManager, is_nonce_error
+from app.utils.lru import LRUCache
 
 # StreamingTreasury ABI - only the functions we need
 STREAMING_TREASURY_ABI = [
@@ -34,16 +42,29 @@ STREAMING_TREASURY_ABI = [
 
 
 class BlockchainService:
-    """Service to interact with StreamingTreasury smart contract on ARC Testnet"""
+    """
+    Service to interact with StreamingTreasury smart contract on ARC Testnet
+
+    Uses AsyncWeb3 so RPC calls and receipt polling never block the event loop.
+    """
 
     def __init__(self):
         self._w3 = None
         self._account = None
+        self.nonce_manager = NonceManager()
+        self._gas_price = None  # (price, fetched_at)
+        settings = get_settings()
+        # (block_number, treasury, stream_id) -> stream info
+        self._stream_cache = LRUCache(max_size=10000, ttl_seconds=settings.stream_cache_ttl_seconds)
+        self._block_number = None  # (number, fetched_at)
 
-    def _get_web3(self) -> Web3:
+    def _get_web3(self) -> AsyncWeb3:
         if self._w3 is None:
             settings = get_settings()
-            self._w3 = Web3(Web3.HTTPProvider(settings.rpc_url))
+            self._w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(
+                settings.rpc_url,
+                request_kwargs={"timeout": ClientTimeout(total=settings.rpc_timeout)}
+            ))
             if settings.private_key:
                 self._account = self._w3.eth.account.from_key(settings.private_key)
         return self._w3
@@ -51,10 +72,27 @@ class BlockchainService:
     def _get_contract(self, treasury_address: str):
         w3 = self._get_web3()
         return w3.eth.contract(
-            address=Web3.to_checksum_address(treasury_address),
+            address=AsyncWeb3.to_checksum_address(treasury_address),
             abi=STREAMING_TREASURY_ABI,
         )
 
+    async def close(self) -> None:
+        """Close the RPC provider's HTTP session (called from app lifespan)"""
+        if self._w3 is not None and hasattr(self._w3.provider, "disconnect"):
+            await self._w3.provider.disconnect()
+        self._w3 = None
+
+    async def _get_gas_price(self) -> int:
+        """Gas price, cached briefly so pipelined transactions don't each fetch it"""
+        settings = get_settings()
+        if self._gas_price and time.monotonic() - self._gas_price[1] < settings.gas_price_ttl_seconds:
+            return self._gas_price[0]
+
+        with timed(CHAIN_CALL_SECONDS, method="gasPrice"):
+            price = await self._get_web3().eth.gas_price
+        self._gas_price = (price, time.monotonic())
+        return price
+
     def calculate_rate(self, payout_amount: float, remaining_days: float) -> int:
         """
         Calculate streaming rate from payout amount and remaining days.
@@ -76,6 +114,42 @@ class BlockchainService:
         rate_in_token_units = rate_per_second * (10 ** 18)
         return int(rate_in_token_units)
 
+    async def send_change_rate(self, treasury_address: str, stream_id: int, new_rate: int) -> tuple:
+        """
+        Sign and broadcast changeRate with a locally allocated nonce (no receipt wait).
+
+        Only signing and sending hold the nonce lock, so many calls can be in
+        flight at once. A nonce error triggers a resync and one retry.
+
+        Returns:
+            (tx_hash, nonce)
+        """
+        w3 = self._get_web3()
+        contract = self._get_contract(treasury_address)
+        address = self._account.address
+
+        for attempt in range(2):
+            try:
+                async with self.nonce_manager.reserve(w3, address) as nonce:
+                    tx = await contract.functions.changeRate(
+                        stream_id, new_rate
+                    ).build_transaction({
+                        "from": address,
+                        "nonce": nonce,
+                        "gasPrice": await self._get_gas_price(),
+                    })
+
+                    signed_tx = w3.eth.account.sign_transaction(tx, self._account.key)
+                    tx_hash = await w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+                    self.nonce_manager.track(nonce, tx_hash.hex())
+                return tx_hash, nonce
+            except Exception as e:
+                if attempt == 0 and is_nonce_error(e):
+                    print(f"  [NONCE] Nonce rejected ({e}), resyncing")
+                    await self.nonce_manager.resync(w3, address)
+                    continue
+                raise
+
     async def change_rate(self, treasury_address: str, stream_id: int, new_rate: int) -> dict:
         """
         Call changeRate on the StreamingTreasury contract.
@@ -88,38 +162,53 @@ class BlockchainService:
         Returns:
             Dict with tx_hash and status
         """
+        settings = get_settings()
         w3 = self._get_web3()
-        contract = self._get_contract(treasury_address)
+        started = time.perf_counter()
+        outcome = "error"
 
         try:
-            # Build transaction
-            tx = contract.functions.changeRate(
-                stream_id, new_rate
-            ).build_transaction({
-                "from": self._account.address,
-                "nonce": w3.eth.get_transaction_count(self._account.address),
-                "gasPrice": w3.eth.gas_price,
-            })
-
-            # Sign and send
-            signed_tx = w3.eth.account.sign_transaction(tx, self._account.key)
-            tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-
-            # Wait for receipt
-            receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
+            tx_hash, nonce = await self.send_change_rate(treasury_address, stream_id, new_rate)
+            print(f"  [BLOCKCHAIN] changeRate tx: {tx_hash.hex()} (nonce {nonce})")
+
+            # Wait for receipt (async polling - other requests keep running meanwhile)
+            try:
+                receipt = await w3.eth.wait_for_transaction_receipt(
+                    tx_hash,
+                    timeout=settings.tx_receipt_timeout,
+                    poll_latency=settings.tx_receipt_poll_interval,
+                )
+            except TimeExhausted:
+                outcome = await self.nonce_manager.check_unconfirmed(w3, self._account.address, nonce)
+                errors = {
+                    "dropped": "Transaction dropped",
+                    "pending": "Receipt timeout (transaction still pending - do not resend)",
+                    "mined": "Receipt timeout (nonce used by another transaction)",
+                }
+                return {
+                    "success": False,
+                    "pending": outcome == "pending",
+                    "error": errors[outcome],
+                    "tx_hash": tx_hash.hex(),
+                    "nonce": nonce,
+                    "stream_id": stream_id,
+                    "new_rate": new_rate,
+                }
+            self.nonce_manager.confirm(nonce)
 
             result = {
                 "success": receipt.status == 1,
                 "tx_hash": tx_hash.hex(),
+                "nonce": nonce,
                 "block_number": receipt.blockNumber,
                 "gas_used": receipt.gasUsed,
                 "stream_id": stream_id,
                 "new_rate": new_rate,
             }
 
-            print(f"  [BLOCKCHAIN] changeRate tx: {tx_hash.hex()}")
             print(f"  [BLOCKCHAIN] Status: {'Success' if receipt.status == 1 else 'Failed'}")
 
+            outcome = "ok" if receipt.status == 1 else "reverted"
             return result
 
         except Exception as e:
@@ -130,22 +219,116 @@ class BlockchainService:
                 "stream_id": stream_id,
                 "new_rate": new_rate,
             }
+        finally:
+            CHAIN_CALL_SECONDS.labels("changeRate", outcome).observe(time.perf_counter() - started)
+
+    def pending_transactions(self) -> dict:
+        """Transactions sent but not yet confirmed, by nonce"""
+        return dict(self.nonce_manager.pending)
+
+    @staticmethod
+    def _format_stream(result) -> dict:
+        return {
+            "recipient": result[0],
+            "ratePerSecond": result[1],
+            "lastTimestamp": result[2],
+            "accrued": result[3],
+            "paused": result[4],
+        }
 
     async def get_stream_info(self, treasury_address: str, stream_id: int) -> dict:
         """Get current stream info (for debugging/testing)"""
         contract = self._get_contract(treasury_address)
         try:
-            result = contract.functions.streams(stream_id).call()
-            return {
-                "recipient": result[0],
-                "ratePerSecond": result[1],
-                "lastTimestamp": result[2],
-                "accrued": result[3],
-                "paused": result[4],
-            }
+            with timed(CHAIN_CALL_SECONDS, method="streams"):
+                result = await contract.functions.streams(stream_id).call()
+            return self._format_stream(result)
         except Exception as e:
             return {"error": str(e)}
 
+    async def _get_block_number(self) -> int:
+        """Latest block number, cached for stream_cache_ttl_seconds"""
+        settings = get_settings()
+        if self._block_number and time.monotonic() - self._block_number[1] < settings.stream_cache_ttl_seconds:
+            return self._block_number[0]
+
+        with timed(CHAIN_CALL_SECONDS, method="blockNumber"):
+            number = await self._get_web3().eth.block_number
+        self._block_number = (number, time.monotonic())
+        return number
+
+    async def _read_streams(self, keys: List[Tuple[str, int]]) -> List:
+        """
+        Read streams(id) for many (treasury, stream_id) pairs.
+
+        Uses one JSON-RPC batch per rpc_batch_size calls; falls back to
+        concurrent single calls if the RPC endpoint rejects batches. A key
+        that fails (malformed address, reverted call) gets its exception in
+        place of a result.
+        """
+        settings = get_settings()
+        w3 = self._get_web3()
+
+        results: List = [None] * len(keys)
+        calls = []  # (index, contract function) for keys with a valid address
+        for index, (treasury, stream_id) in enumerate(keys):
+            try:
+                calls.append((index, self._get_contract(treasury).functions.streams(stream_id)))
+            except Exception as e:
+                results[index] = e
+
+        for start in range(0, len(calls), settings.rpc_batch_size):
+            chunk = calls[start:start + settings.rpc_batch_size]
+            try:
+                with timed(CHAIN_CALL_SECONDS, method="streams_batch"):
+                    async with w3.batch_requests() as batch:
+                        for _, fn in chunk:
+                            batch.add(fn)
+                        chunk_results = await batch.async_execute()
+            except Exception as e:
+                print(f"  [BLOCKCHAIN] Batch read failed ({e}), falling back to single calls")
+                chunk_results = await asyncio.gather(
+                    *(fn.call() for _, fn in chunk),
+                    return_exceptions=True
+                )
+            for (index, _), result in zip(chunk, chunk_results):
+                results[index] = result
+        return results
+
+    async def get_streams_batch(self, streams: List[Tuple[str, int]]) -> Dict:
+        """
+        Get info for many streams across treasuries in as few RPC round-trips as possible.
+
+        Results are cached per block number, so repeated dashboard loads within
+        the same block cost one eth_blockNumber call.
+
+        Returns:
+            {"block_number", "results": [...]} with results in request order
+        """
+        block_number = await self._get_block_number()
+        keys = [(t.lower(), int(sid)) for t, sid in streams]
+
+        infos = {}
+        for key in keys:
+            cached = self._stream_cache.get((block_number, *key))
+            if cached is not None:
+                infos[key] = cached
+
+        missing = sorted(set(keys) - set(infos))
+        if missing:
+            for key, result in zip(missing, await self._read_streams(missing)):
+                if isinstance(result, Exception):
+                    infos[key] = {"error": str(result)}  # Errors are returned but never cached
+                else:
+                    infos[key] = self._format_stream(result)
+                    self._stream_cache.set((block_number, *key), infos[key])
+
+        results = [
+            {"treasury_address": treasury, "stream_id": key[1], **infos[key]}
+            for (treasury, _), key in zip(streams, keys)
+        ]
+        return {"block_number": block_number, "results": results}
+
 
 # Singleton
 blockchain_service = BlockchainService()
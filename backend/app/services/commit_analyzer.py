@@ -1,6 +1,9 @@
 from typing import List, Dict
 from datetime import datetime
+from pymongo import ReturnDocument
 from app.database import get_database
+from app.services.project_stats import project_stats_service
+from app.services.milestone_ledger import milestone_ledger_service
 
 
 class CommitAnalyzerService:
@@ -15,29 +18,34 @@ class CommitAnalyzerService:
         result = await collection.insert_one(analysis_data)
         return str(result.inserted_id)
 
-    async def update_project_earnings(self, project_id: str, amount: float) -> Dict:
-        """Update project's pending earnings and check threshold"""
+    async def apply_earnings(self, project_id: str, amount: float) -> Dict:
+        """
+        Atomically add amount to the project's pending earnings.
+
+        Single find_one_and_update ($inc), so concurrent payouts never read stale
+        totals. Returns the project document as it is after the update.
+        """
         db = get_database()
-        projects = db["projects"]
 
-        # Get current project
-        project = await projects.find_one({"project_id": project_id})
+        project = await db["projects"].find_one_and_update(
+            {"project_id": project_id},
+            {
+                "$inc": {"earned_pending": amount},
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            return_document=ReturnDocument.AFTER
+        )
         if not project:
             raise ValueError(f"Project {project_id} not found")
 
-        # Update earnings
-        new_pending = project.get("earned_pending", 0.0) + amount
-        threshold = project.get("payout_threshold", 100.0)
+        return project
 
-        update_data = {
-            "earned_pending": new_pending,
-            "updated_at": datetime.utcnow()
-        }
+    async def update_project_earnings(self, project_id: str, amount: float) -> Dict:
+        """Update project's pending earnings and check threshold"""
+        project = await self.apply_earnings(project_id, amount)
 
-        await projects.update_one(
-            {"project_id": project_id},
-            {"$set": update_data}
-        )
+        new_pending = project.get("earned_pending", 0.0)
+        threshold = project.get("payout_threshold", 100.0)
 
         # Check if threshold met
         should_trigger_payout = new_pending >= threshold
@@ -47,7 +55,7 @@ class CommitAnalyzerService:
             "earned_pending": new_pending,
             "payout_threshold": threshold,
             "should_trigger_payout": should_trigger_payout,
-            "freelancer_wallet": project["freelancer_wallet_address"]
+            "freelancer_wallet": project.get("employee_wallet_address")
         }
 
     async def prepare_for_ai_analysis(self, commits_data: List[Dict], project_context: Dict) -> Dict:
@@ -83,7 +91,7 @@ class CommitAnalyzerService:
         }
 
     async def get_project_analytics(self, project_id: str) -> Dict:
-        """Get analytics for a project"""
+        """Get analytics for a project (from its running stats and milestone ledger)"""
         db = get_database()
 
         # Get project
@@ -91,20 +99,19 @@ class CommitAnalyzerService:
         if not project:
             return None
 
-        # Get all analyses
-        analyses = await db["commit_analyses"].find({"project_id": project_id}).to_list(length=None)
-
-        total_analyses = len(analyses)
-        total_commits_analyzed = sum(a.get("total_commits", 0) for a in analyses)
-        total_earned = sum(a.get("total_payout_amount", 0) for a in analyses)
+        stats = project_stats_service.get(project)
 
         return {
             "project_id": project_id,
             "earned_pending": project.get("earned_pending", 0.0),
             "total_paid": project.get("total_paid", 0.0),
-            "total_analyses": total_analyses,
-            "total_commits_analyzed": total_commits_analyzed,
-            "total_earned": total_earned,
+            "total_analyses": stats["analyses_count"],
+            "total_commits_analyzed": stats["commits_analyzed"],
+            "total_earned": stats["total_payout"],
+            "approved_payout": stats["paid_payout"],
+            "gaming_detected_count": stats["gaming_detected_count"],
+            "status_counts": stats["status_counts"],
+            "milestone_spending": await milestone_ledger_service.get_spending(project_id),
             "status": project.get("status", "active")
         }
 
@@ -0,0 +1,88 @@
+"""
+Out-of-line Diff Storage
+
+Commit diffs are stored zlib-compressed in the diff_blobs collection, keyed
+by commit SHA, instead of being embedded in push_events. Push events keep
+only diff_ref (the SHA) and diff_length, so listing and history queries stay
+small; the diff is loaded only where it is needed (detail endpoint, analysis).
+Stored diffs are already capped per commit (DIFF_MAX_COMMIT_BYTES), so each
+fits comfortably in a single document.
+"""
+
+import zlib
+from datetime import datetime
+from typing import Dict, List
+
+from bson import Binary
+from pymongo.errors import DuplicateKeyError
+
+from app.database import get_database
+
+COMPRESSION_LEVEL = 6
+
+
+class DiffStore:
+    """Compressed, content-addressed (by commit SHA) diff storage"""
+
+    @property
+    def collection(self):
+        return get_database()["diff_blobs"]
+
+    async def put(self, sha: str, diff: str) -> None:
+        """Store a diff (idempotent - a SHA's diff never changes)"""
+        raw = diff.encode("utf-8")
+        data = zlib.compress(raw, COMPRESSION_LEVEL)
+        try:
+            await self.collection.update_one(
+                {"sha": sha},
+                {"$setOnInsert": {
+                    "sha": sha,
+                    "data": Binary(data),
+                    "encoding": "zlib",
+                    "size": len(raw),
+                    "compressed_size": len(data),
+                    "created_at": datetime.utcnow()
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # Stored concurrently by another push containing the same commit
+
+    async def get_many(self, shas: List[str]) -> Dict[str, str]:
+        """Load diffs by SHA (missing SHAs are left out)"""
+        if not shas:
+            return {}
+        docs = await self.collection.find({"sha": {"$in": list(set(shas))}}).to_list(length=None)
+        return {doc["sha"]: zlib.decompress(doc["data"]).decode("utf-8") for doc in docs}
+
+    async def offload(self, commits_details: List[Dict]) -> List[Dict]:
+        """Move each commit's diff into the store; returns commits with diff_ref/diff_length instead of diff"""
+        offloaded = []
+        for commit in commits_details:
+            if "diff" not in commit:
+                offloaded.append(commit)
+                continue
+
+            commit = dict(commit)
+            diff = commit.pop("diff") or ""
+            await self.put(commit["sha"], diff)
+            commit["diff_ref"] = commit["sha"]
+            commit["diff_length"] = len(diff)
+            offloaded.append(commit)
+        return offloaded
+
+    async def hydrate(self, commits_details: List[Dict]) -> List[Dict]:
+        """Fill in diff for commits stored with a diff_ref (embedded diffs from older events are kept)"""
+        refs = [c["diff_ref"] for c in commits_details if c.get("diff_ref") and "diff" not in c]
+        diffs = await self.get_many(refs)
+
+        hydrated = []
+        for commit in commits_details:
+            if commit.get("diff_ref") and "diff" not in commit:
+                commit = {**commit, "diff": diffs.get(commit["diff_ref"], "")}
+            hydrated.append(commit)
+        return hydrated
+
+
+# Singleton instance
+diff_store = DiffStore()
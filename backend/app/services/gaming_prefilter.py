@@ -0,0 +1,182 @@
+"""
+Deterministic Gaming Pre-filter
+
+Cheap diff rules that catch obvious gaming (empty pushes, whitespace-only
+edits, changes reverted within the same push, duplicated hunks) before any
+model call. Only clear cases are rejected here. Suspicious but plausible
+pushes (lockfile or generated-file churn) get a "review" verdict: the payout
+is still analyzed, but the result is held for a human. Anything else
+returns None and goes to the LLM.
+"""
+
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from app.config import get_settings
+from app.utils.diff_parser import FileDiff, is_generated_path, parse_diff
+
+settings = get_settings()
+
+# Duplicate detection: repeated lines must make up this share of the added lines
+DUPLICATE_RATIO = 0.8
+DUPLICATE_MIN_LINES = 20  # Below this a push is too small to call repetitive
+DUPLICATE_MIN_HUNK_LINES = 3  # Smaller identical hunks (imports, braces) are normal
+
+# Leading whitespace is meaningful in these files, so only trailing/blank-line edits count as formatting
+INDENT_SENSITIVE_SUFFIXES = (".py", ".pyx", ".yaml", ".yml", "Makefile", ".mk", ".coffee", ".pug", ".haml")
+
+
+def _squash(lines: List[str], indent_sensitive: bool) -> str:
+    """Hunk text with formatting-only differences removed (token boundaries kept)"""
+    if indent_sensitive:
+        return "\n".join(line.rstrip() for line in lines if line.strip())
+    return " ".join("\n".join(lines).split())
+
+
+def _diff_covers_files(commits: List[Dict], parsed: List[List[FileDiff]]) -> bool:
+    """Content rules only apply when every changed file is fully present in the stored diff"""
+    return all(
+        len(files) >= len(commit.get("files_changed") or [])
+        and not (commit.get("diff_stats") or {}).get("truncated_files")
+        for commit, files in zip(commits, parsed)
+    )
+
+
+class GamingPrefilter:
+    """Rule-based classifier run before LLM gaming detection"""
+
+    def __init__(self):
+        # Evaluated in order; the first rule that fires decides ("reject" or "review")
+        self.rules = [
+            ("empty_commits", 0.99, self._empty_commits, "reject"),
+            ("add_then_revert", 0.95, self._add_then_revert, "reject"),
+            ("whitespace_only", 0.95, self._whitespace_only, "reject"),
+            ("duplicate_hunks", 0.9, self._duplicate_hunks, "reject"),
+            ("generated_files_only", 0.9, self._generated_files_only, "review"),
+        ]
+
+    def classify(self, commits_details: List[Dict]) -> Optional[Dict]:
+        """
+        Returns a gaming result (same shape as LLMService.detect_gaming, plus
+        "rule", "evidence" and "needs_review") when a rule fires, otherwise None.
+
+        Rejections have is_gaming True. Review verdicts have is_gaming False
+        and needs_review True - the caller analyzes the payout as usual and
+        holds the result for a human.
+        """
+        if not settings.gaming_prefilter_enabled or not commits_details:
+            return None
+
+        parsed = [parse_diff(c.get("diff") or "") for c in commits_details]
+
+        for rule, confidence, check, verdict in self.rules:
+            reason = check(commits_details, parsed)
+            if reason:
+                print(f"[PREFILTER] Rule fired: {rule} ({verdict}) - {reason}")
+                return {
+                    "is_gaming": verdict == "reject",
+                    "needs_review": verdict == "review",
+                    "confidence": confidence,
+                    "reason": reason,
+                    "flags": ["heuristic_prefilter", rule],
+                    "rule": rule,
+                    "evidence": reason  # What matched, kept on the stored analysis for tuning
+                }
+        return None
+
+    @staticmethod
+    def _empty_commits(commits: List[Dict], parsed: List[List[FileDiff]]) -> Optional[str]:
+        for commit, files in zip(commits, parsed):
+            if files or commit.get("files_changed") or commit.get("additions", 0) or commit.get("deletions", 0):
+                return None
+        return f"{len(commits)} commit(s) with no file changes"
+
+    @staticmethod
+    def _add_then_revert(commits: List[Dict], parsed: List[List[FileDiff]]) -> Optional[str]:
+        """
+        Every hunk is undone by an inverse hunk (same file, added and removed
+        lines swapped) in another commit of the push. Code moved within one
+        commit, or net-zero pushes that reorder code, do not match.
+        """
+        if len(commits) < 2 or not _diff_covers_files(commits, parsed):
+            return None
+
+        # (path, added, removed) -> commit indexes of hunks still waiting for their inverse
+        unmatched: Dict[Tuple, List[int]] = {}
+        changed = 0
+        for index, files in enumerate(parsed):
+            for f in files:
+                if f.binary:
+                    return None
+                path = f.path or f.old_path or ""
+                for hunk in f.hunks:
+                    added, removed = tuple(hunk.added), tuple(hunk.removed)
+                    changed += len(added) + len(removed)
+                    inverse = unmatched.get((path, removed, added), [])
+                    partner = next((i for i in inverse if i != index), None)
+                    if partner is not None:
+                        inverse.remove(partner)
+                    else:
+                        unmatched.setdefault((path, added, removed), []).append(index)
+
+        if changed == 0 or any(unmatched.values()):
+            return None
+        return f"{changed} changed lines across {len(commits)} commits are reverted hunk by hunk (net diff is empty)"
+
+    @staticmethod
+    def _whitespace_only(commits: List[Dict], parsed: List[List[FileDiff]]) -> Optional[str]:
+        files = [f for commit_files in parsed for f in commit_files]
+        if not any(f.hunks for f in files) or any(f.binary for f in files):
+            return None
+        if not _diff_covers_files(commits, parsed):
+            return None
+
+        changed = 0
+        for f in files:
+            indent_sensitive = f.path.endswith(INDENT_SENSITIVE_SUFFIXES)
+            for hunk in f.hunks:
+                if _squash(hunk.added, indent_sensitive) != _squash(hunk.removed, indent_sensitive):
+                    return None
+                changed += len(hunk.added) + len(hunk.removed)
+
+        return f"{changed} changed lines differ only in whitespace/formatting"
+
+    @staticmethod
+    def _duplicate_hunks(commits: List[Dict], parsed: List[List[FileDiff]]) -> Optional[str]:
+        blocks: Counter = Counter()
+        lines: List[str] = []
+        for files in parsed:
+            for f in files:
+                for hunk in f.hunks:
+                    block = tuple(line.strip() for line in hunk.added if line.strip())
+                    lines.extend(block)
+                    if len(block) >= DUPLICATE_MIN_HUNK_LINES:
+                        blocks[block] += 1
+
+        if len(lines) < DUPLICATE_MIN_LINES:
+            return None
+
+        repeated_block_lines = sum(len(block) * (count - 1) for block, count in blocks.items() if count > 1)
+        if repeated_block_lines >= DUPLICATE_RATIO * len(lines):
+            return f"{repeated_block_lines} of {len(lines)} added lines are copies of identical hunks"
+
+        repeated_lines = len(lines) - len(set(lines))
+        if repeated_lines >= DUPLICATE_RATIO * len(lines):
+            return f"{repeated_lines} of {len(lines)} added lines are repeats"
+        return None
+
+    @staticmethod
+    def _generated_files_only(commits: List[Dict], parsed: List[List[FileDiff]]) -> Optional[str]:
+        paths = set()
+        for commit, files in zip(commits, parsed):
+            for f in commit.get("files_changed") or []:
+                paths.add(f["filename"] if isinstance(f, dict) else str(f))
+            paths.update(f.path or f.old_path for f in files if f.path or f.old_path)
+
+        if not paths or not all(is_generated_path(p) for p in paths):
+            return None
+        return f"Only lockfiles/generated files changed: {', '.join(sorted(paths)[:5])}"
+
+
+# Singleton instance
+gaming_prefilter = GamingPrefilter()
@@ -1,13 +1,31 @@
 import jwt
 import time
+import asyncio
 import httpx
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from pathlib import Path
 from app.config import get_settings
+from app.services.metrics import GITHUB_RATE_LIMIT_REMAINING, GITHUB_REQUEST_SECONDS, timed
+from app.services.tracing import span
+from app.utils.diff_parser import DiffParser
 
 settings = get_settings()
 
+# GitHub returns at most this many files per commit response (the rest are paginated)
+GITHUB_COMMIT_FILES_LIMIT = 300
+
+# Per-file fields kept on stored commits (patches are already in the diff)
+FILE_SUMMARY_FIELDS = ("filename", "previous_filename", "status", "additions", "deletions", "changes")
+
+
+class BatchFetchError(Exception):
+    """Raised by get_batch_commits(partial=False) when any commit fails to fetch"""
+
+    def __init__(self, errors: Dict[str, str]):
+        self.errors = errors
+        super().__init__(f"Failed to fetch {len(errors)} commit(s): {', '.join(sha[:8] for sha in errors)}")
+
 
 class GitHubService:
     def __init__(self):
@@ -15,6 +33,65 @@ class GitHubService:
         self.private_key_path = settings.github_private_key_path
         self.private_key = self._load_private_key()
         self.token_cache: Dict[str, Dict] = {}  # Cache tokens by installation_id
+        self.fetch_semaphores: Dict[str, asyncio.Semaphore] = {}  # Concurrency limit by installation_id
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self) -> None:
+        """Open the shared HTTP/2 connection pool (called from app lifespan)"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=settings.github_http2,
+                limits=httpx.Limits(
+                    max_connections=settings.github_max_connections,
+                    max_keepalive_connections=settings.github_max_keepalive_connections,
+                    keepalive_expiry=settings.github_keepalive_expiry
+                ),
+                timeout=httpx.Timeout(
+                    settings.github_timeout,
+                    connect=settings.github_connect_timeout
+                ),
+                event_hooks={"response": [self._record_rate_limit]}
+            )
+            print(f"[OK] GitHub HTTP client pool opened (http2={settings.github_http2})")
+
+    async def close(self) -> None:
+        """Close the shared connection pool (called from app lifespan)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            print("[CLOSED] GitHub HTTP client pool")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared client for all GitHub API traffic (opened lazily outside the app lifespan)"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=settings.github_http2,
+                event_hooks={"response": [self._record_rate_limit]}
+            )
+        return self._client
+
+    async def _record_rate_limit(self, response: httpx.Response) -> None:
+        """Export X-RateLimit-Remaining per installation (each installation token has its own budget)"""
+        remaining = response.headers.get("x-ratelimit-remaining")
+        if remaining is None:
+            return
+        auth = response.request.headers.get("authorization", "")
+        installation = next(
+            (iid for iid, cached in self.token_cache.items() if auth == f"token {cached['token']}"),
+            "app"  # JWT-authenticated app endpoints (installation token requests)
+        )
+        resource = response.headers.get("x-ratelimit-resource", "core")
+        GITHUB_RATE_LIMIT_REMAINING.labels(installation, resource).set(int(remaining))
+
+    @staticmethod
+    def api_headers(token: str, accept: str = "application/vnd.github+json") -> Dict[str, str]:
+        """Standard headers for installation-token authenticated GitHub API calls"""
+        return {
+            "Authorization": f"token {token}",
+            "Accept": accept,
+            "X-GitHub-Api-Version": "2022-11-28"
+        }
 
     def _load_private_key(self) -> str:
         """Load GitHub App private key from file"""
@@ -45,8 +122,8 @@ class GitHubService:
         jwt_token = self._generate_jwt()
         url = f"https://api.github.com/app/installations/{installation_id}/access_tokens"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
+        with timed(GITHUB_REQUEST_SECONDS, operation="installation_token"):
+            response = await self.client.post(
                 url,
                 headers={
                     "Authorization": f"Bearer {jwt_token}",
@@ -55,114 +132,199 @@ class GitHubService:
                 }
             )
             response.raise_for_status()
-            data = response.json()
+        data = response.json()
 
-            # Cache token
-            self.token_cache[installation_id] = {
-                "token": data["token"],
-                "expires_at": datetime.utcnow() + timedelta(minutes=50)  # Refresh before 1hr expiry
-            }
+        # Cache token
+        self.token_cache[installation_id] = {
+            "token": data["token"],
+            "expires_at": datetime.utcnow() + timedelta(minutes=50)  # Refresh before 1hr expiry
+        }
 
-            return data["token"]
+        return data["token"]
 
     async def list_installation_repositories(self, installation_id: str) -> List[Dict]:
         """List all repositories accessible by the installation"""
         token = await self.get_installation_token(installation_id)
         url = "https://api.github.com/installation/repositories"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                url,
-                headers={
-                    "Authorization": f"token {token}",
-                    "Accept": "application/vnd.github+json",
-                    "X-GitHub-Api-Version": "2022-11-28"
-                }
-            )
-            response.raise_for_status()
-            return response.json()["repositories"]
+        response = await self.client.get(url, headers=self.api_headers(token))
+        response.raise_for_status()
+        return response.json()["repositories"]
+
+    @staticmethod
+    def _diff_from_files(files: List[Dict]) -> Optional[str]:
+        """
+        Rebuild a unified diff from the JSON files[].patch entries.
+
+        Returns None when the JSON is not enough to reproduce the diff
+        (binary files, patches GitHub omitted for size, or a truncated file list).
+        """
+        if len(files) >= GITHUB_COMMIT_FILES_LIMIT:
+            return None
+
+        parts = []
+        for f in files:
+            filename = f["filename"]
+            old_name = f.get("previous_filename", filename)
+            status = f.get("status", "modified")
+            patch = f.get("patch")
+
+            if patch is None and not (status == "renamed" and f.get("changes", 0) == 0):
+                return None
+
+            header = [f"diff --git a/{old_name} b/{filename}"]
+            if status == "renamed":
+                header += [f"rename from {old_name}", f"rename to {filename}"]
+            if patch is not None:
+                header.append("--- /dev/null" if status == "added" else f"--- a/{old_name}")
+                header.append("+++ /dev/null" if status == "removed" else f"+++ b/{filename}")
+                header.append(patch)
+            parts.append("\n".join(header))
+
+        return "\n".join(parts) + "\n" if parts else ""
 
     async def get_commit_details(self, installation_id: str, owner: str, repo: str, sha: str) -> Dict:
-        """Get detailed information about a specific commit including diff"""
+        """
+        Get detailed information about a specific commit including diff
+
+        In "json" fetch mode the diff is rebuilt from the JSON response, so only
+        commits with binary or truncated patches cost a second (raw diff) request.
+        Recorded as a "github.commit" span.
+        """
+        with span("github.commit", sha=sha[:8]) as attributes:
+            commit = await self._fetch_commit_details(installation_id, owner, repo, sha)
+            attributes.update(
+                diff_bytes=commit["diff_stats"]["bytes_read"],
+                truncated_files=len(commit["diff_stats"]["truncated_files"])
+            )
+            return commit
+
+    async def _fetch_commit_details(self, installation_id: str, owner: str, repo: str, sha: str) -> Dict:
         token = await self.get_installation_token(installation_id)
         url = f"https://api.github.com/repos/{owner}/{repo}/commits/{sha}"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                url,
-                headers={
-                    "Authorization": f"token {token}",
-                    "Accept": "application/vnd.github.diff",  # Get diff format
-                    "X-GitHub-Api-Version": "2022-11-28"
-                }
-            )
+        with timed(GITHUB_REQUEST_SECONDS, operation="commit"):
+            response = await self.client.get(url, headers=self.api_headers(token))
             response.raise_for_status()
-            diff = response.text
+        commit_data = response.json()
 
-            # Also get JSON data
-            response = await client.get(
-                url,
-                headers={
-                    "Authorization": f"token {token}",
-                    "Accept": "application/vnd.github+json",
-                    "X-GitHub-Api-Version": "2022-11-28"
-                }
-            )
-            response.raise_for_status()
-            commit_data = response.json()
-
-            return {
-                "sha": commit_data["sha"],
-                "author": commit_data["commit"]["author"]["name"],
-                "author_github": commit_data["author"]["login"] if commit_data.get("author") else None,
-                "message": commit_data["commit"]["message"],
-                "timestamp": commit_data["commit"]["author"]["date"],
-                "additions": commit_data["stats"]["additions"],
-                "deletions": commit_data["stats"]["deletions"],
-                "changed_files": len(commit_data["files"]),
-                "diff": diff,
-                "files_changed": commit_data["files"]
-            }
+        # Stored diff is bounded by DIFF_MAX_FILE_BYTES / DIFF_MAX_COMMIT_BYTES; stats cover the whole diff
+        parser = DiffParser(settings.diff_max_file_bytes, settings.diff_max_commit_bytes)
+        parts = None
+        if settings.github_commit_fetch_mode == "json" and "next" not in response.links:
+            diff = self._diff_from_files(commit_data["files"])
+            if diff is not None:
+                parts = [f.render() for f in parser.parse_lines(diff.splitlines())]
+
+        if parts is None:
+            parts = await self._stream_diff(url, token, parser)
+
+        diff = "\n".join(parts) + "\n" if parts else ""
+        if parser.stats.truncated_files:
+            print(f"  [DIFF] {sha[:8]}: truncated {len(parser.stats.truncated_files)} file(s) "
+                  f"({parser.stats.bytes_read} bytes read{', commit cap hit' if parser.stats.truncated else ''})")
+
+        return {
+            "sha": commit_data["sha"],
+            "author": commit_data["commit"]["author"]["name"],
+            "author_github": commit_data["author"]["login"] if commit_data.get("author") else None,
+            "message": commit_data["commit"]["message"],
+            "timestamp": commit_data["commit"]["author"]["date"],
+            "additions": commit_data["stats"]["additions"],
+            "deletions": commit_data["stats"]["deletions"],
+            "changed_files": len(commit_data["files"]),
+            "diff": diff,
+            "diff_stats": parser.stats.as_dict(),
+            "files_changed": [
+                {key: f[key] for key in FILE_SUMMARY_FIELDS if key in f}
+                for f in commit_data["files"]
+            ]
+        }
+
+    async def _stream_diff(self, url: str, token: str, parser: DiffParser) -> List[str]:
+        """
+        Fetch the raw diff as a stream and parse it file by file.
 
-    async def get_batch_commits(self, installation_id: str, owner: str, repo: str, commit_shas: List[str]) -> List[Dict]:
-        """Get details for multiple commits"""
-        commits_details = []
-        for sha in commit_shas:
-            try:
-                commit = await self.get_commit_details(installation_id, owner, repo, sha)
-                commits_details.append(commit)
-            except Exception as e:
-                print(f"Error fetching commit {sha}: {e}")
-                continue
-        return commits_details
+        Only the capped, rendered files are kept; the response is closed as
+        soon as the per-commit cap is reached.
+        """
+        parts = []
+        with timed(GITHUB_REQUEST_SECONDS, operation="commit_diff"):
+            async with self.client.stream("GET", url, headers=self.api_headers(token, "application/vnd.github.diff")) as response:
+                response.raise_for_status()
+                async for file_diff in parser.stream(response.aiter_lines()):
+                    parts.append(file_diff.render())
+        return parts
+
+    def _get_fetch_semaphore(self, installation_id: str) -> asyncio.Semaphore:
+        """Get the semaphore bounding concurrent commit fetches for an installation"""
+        if installation_id not in self.fetch_semaphores:
+            self.fetch_semaphores[installation_id] = asyncio.Semaphore(settings.github_fetch_concurrency)
+        return self.fetch_semaphores[installation_id]
+
+    async def fetch_commits(self, installation_id: str, owner: str, repo: str, commit_shas: List[str]) -> List[Dict]:
+        """
+        Fetch multiple commits concurrently (bounded per installation).
+
+        Returns one {"sha", "commit", "error"} entry per SHA, in the same order as commit_shas.
+        """
+        semaphore = self._get_fetch_semaphore(installation_id)
+
+        async def fetch_one(sha: str) -> Dict:
+            async with semaphore:
+                try:
+                    commit = await self.get_commit_details(installation_id, owner, repo, sha)
+                    return {"sha": sha, "commit": commit, "error": None}
+                except Exception as e:
+                    print(f"Error fetching commit {sha}: {e}")
+                    return {"sha": sha, "commit": None, "error": str(e)}
+
+        return await asyncio.gather(*(fetch_one(sha) for sha in commit_shas))
+
+    async def get_batch_commits(
+        self,
+        installation_id: str,
+        owner: str,
+        repo: str,
+        commit_shas: List[str],
+        partial: bool = True
+    ) -> List[Dict]:
+        """
+        Get details for multiple commits, preserving order.
+
+        With partial=True (default) commits that fail to fetch are skipped;
+        with partial=False a BatchFetchError is raised listing every failed SHA.
+        """
+        results = await self.fetch_commits(installation_id, owner, repo, commit_shas)
+
+        errors = {r["sha"]: r["error"] for r in results if r["error"] is not None}
+        if errors and not partial:
+            raise BatchFetchError(errors)
+
+        return [r["commit"] for r in results if r["error"] is None]
 
     async def create_webhook(self, installation_id: str, owner: str, repo: str, webhook_url: str) -> Dict:
         """Create a webhook for push events on the repository"""
         token = await self.get_installation_token(installation_id)
         url = f"https://api.github.com/repos/{owner}/{repo}/hooks"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url,
-                headers={
-                    "Authorization": f"token {token}",
-                    "Accept": "application/vnd.github+json",
-                    "X-GitHub-Api-Version": "2022-11-28"
-                },
-                json={
-                    "name": "web",
-                    "active": True,
-                    "events": ["push"],
-                    "config": {
-                        "url": webhook_url,
-                        "content_type": "json",
-                        "secret": settings.github_webhook_secret,
-                        "insecure_ssl": "0"
-                    }
+        response = await self.client.post(
+            url,
+            headers=self.api_headers(token),
+            json={
+                "name": "web",
+                "active": True,
+                "events": ["push"],
+                "config": {
+                    "url": webhook_url,
+                    "content_type": "json",
+                    "secret": settings.github_webhook_secret,
+                    "insecure_ssl": "0"
                 }
-            )
-            response.raise_for_status()
-            return response.json()
+            }
+        )
+        response.raise_for_status()
+        return response.json()
 
 
 # Singleton instance
@@ -0,0 +1,424 @@
+"""
+Durable Background Job Queue
+
+Jobs live in the analysis_jobs collection so they survive restarts. Each
+process runs a small pool of asyncio workers that claim jobs with a lease,
+renew the lease while running, and retry failures with exponential backoff.
+Expired leases (crashed workers) are reclaimed automatically.
+
+The per-project concurrency cap is enforced with slot documents in
+job_slots ("{project_id}:{n}" for n < job_queue_per_project): a claimed job
+only runs once it holds a slot, taken with a conditional upsert, so workers
+racing for the same project cannot both get one.
+"""
+
+import asyncio
+import os
+import random
+import secrets
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config import get_settings
+from app.database import get_database
+from app.models.job import Job
+from app.services.metrics import JOB_QUEUE_DEPTH, JOB_SECONDS
+
+settings = get_settings()
+
+JobHandler = Callable[[Dict], Awaitable[None]]
+
+# Job statuses reported as queue depth (completed jobs are history, not backlog)
+DEPTH_STATUSES = ("queued", "running", "failed")
+
+# push_events status -> job kind that advances it
+RECOVERABLE_STATUSES = {
+    "received": "enrich",
+    "enrichment_failed": "enrich",  # Gave up after max_attempts; retried once per restart
+    "pending_analysis": "analysis",
+}
+
+# job kind -> (push_events status, status it is moved to) when the job gives up
+# without its handler recording a result (lease expired on the last attempt)
+EXHAUSTED_STATUSES = {
+    "enrich": ("received", "enrichment_failed"),
+}
+
+
+class JobQueue:
+    """Mongo-backed job queue with an in-process worker pool"""
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self.handlers: Dict[str, JobHandler] = {}
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    @property
+    def collection(self):
+        return get_database()["analysis_jobs"]
+
+    @property
+    def slots(self):
+        return get_database()["job_slots"]
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        """Register the coroutine that processes jobs of a given kind"""
+        self.handlers[kind] = handler
+
+    async def enqueue(self, kind: str, push_id: str, project_id: Optional[str] = None) -> str:
+        """
+        Enqueue a job (idempotent: one job per kind and push).
+
+        Returns the job_id.
+        """
+        job = Job(
+            job_id=f"{kind}_{push_id}",
+            kind=kind,
+            push_id=push_id,
+            project_id=project_id,
+            max_attempts=settings.job_max_attempts
+        )
+        await self.collection.update_one(
+            {"job_id": job.job_id},
+            {"$setOnInsert": job.model_dump()},
+            upsert=True
+        )
+        if self._wakeup:
+            self._wakeup.set()
+        return job.job_id
+
+    async def start(self) -> None:
+        """Run the recovery sweep and start the worker pool"""
+        await self.recover()
+
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker_loop())
+            for _ in range(settings.job_queue_concurrency)
+        ]
+        print(f"[OK] Job queue started: {settings.job_queue_concurrency} workers ({self.worker_id})")
+
+    async def stop(self) -> None:
+        """Stop claiming jobs and give running ones a grace period to finish"""
+        self._stopping = True
+        if self._wakeup:
+            self._wakeup.set()
+        if self._workers:
+            _, pending = await asyncio.wait(self._workers, timeout=settings.job_shutdown_grace_seconds)
+            for task in pending:
+                task.cancel()  # Lease expires and another worker picks it up
+        self._workers = []
+        print("[CLOSED] Job queue")
+
+    async def recover(self) -> None:
+        """
+        Re-enqueue work for push events left mid-pipeline (RECOVERABLE_STATUSES).
+
+        A job that already finished (failed permanently, or completed without
+        advancing the event) is reset to queued with a fresh attempt budget -
+        enqueue() alone would leave it untouched and the event stuck.
+        """
+        db = get_database()
+        stuck = await db["push_events"].find(
+            {"status": {"$in": list(RECOVERABLE_STATUSES)}},
+            {"push_id": 1, "project_id": 1, "status": 1}
+        ).to_list(length=None)
+
+        now = datetime.utcnow()
+        for event in stuck:
+            job_id = await self.enqueue(RECOVERABLE_STATUSES[event["status"]], event["push_id"], event.get("project_id"))
+            await self.collection.update_one(
+                {"job_id": job_id, "status": {"$in": ["failed", "completed"]}},
+                {"$set": {
+                    "status": "queued",
+                    "attempts": 0,
+                    "run_after": now,
+                    "completed_at": None,
+                    "updated_at": now
+                }}
+            )
+
+        if stuck:
+            print(f"[RECOVERY] Re-enqueued {len(stuck)} unfinished push events")
+
+    async def depth(self) -> Dict[str, Dict[str, int]]:
+        """Job counts by kind and status (DEPTH_STATUSES only)"""
+        pipeline = [
+            {"$match": {"status": {"$in": list(DEPTH_STATUSES)}}},
+            {"$group": {"_id": {"kind": "$kind", "status": "$status"}, "count": {"$sum": 1}}}
+        ]
+        counts = {kind: dict.fromkeys(DEPTH_STATUSES, 0) for kind in self.handlers}
+        async for doc in self.collection.aggregate(pipeline):
+            counts.setdefault(doc["_id"]["kind"], dict.fromkeys(DEPTH_STATUSES, 0))[doc["_id"]["status"]] = doc["count"]
+        return counts
+
+    async def refresh_depth_metrics(self) -> None:
+        """Update the job_queue_depth gauge (called when metrics are scraped)"""
+        for kind, statuses in (await self.depth()).items():
+            for status, count in statuses.items():
+                JOB_QUEUE_DEPTH.labels(kind, status).set(count)
+
+    async def _saturated_projects(self) -> List[str]:
+        """
+        Projects already running the maximum number of concurrent jobs.
+
+        Only narrows what _claim() looks at - the cap itself is enforced by
+        _acquire_slot(), since this read can be stale by the time we claim.
+        """
+        pipeline = [
+            {"$match": {
+                "status": "running",
+                "project_id": {"$ne": None},
+                "lease_expires_at": {"$gt": datetime.utcnow()}
+            }},
+            {"$group": {"_id": "$project_id", "running": {"$sum": 1}}},
+            {"$match": {"running": {"$gte": settings.job_queue_per_project}}}
+        ]
+        return [doc["_id"] async for doc in self.collection.aggregate(pipeline)]
+
+    async def _claim(self) -> Optional[Dict]:
+        """Atomically lease the next runnable job and its project slot"""
+        now = datetime.utcnow()
+        job = await self.collection.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "queued", "run_after": {"$lte": now}},
+                    {
+                        "status": "running",
+                        "lease_expires_at": {"$lt": now},
+                        # Out of attempts: the worker died or hung on every one - see _fail_exhausted()
+                        "$expr": {"$lt": ["$attempts", "$max_attempts"]}
+                    }
+                ],
+                "kind": {"$in": list(self.handlers)},
+                "project_id": {"$nin": await self._saturated_projects()}
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "lease_owner": self.worker_id,
+                    "lease_expires_at": now + timedelta(seconds=settings.job_lease_seconds),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_after", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None or job.get("project_id") is None:
+            return job
+
+        if not await self._acquire_slot(job, now):
+            # Another worker won the project's last slot - hand the job back untouched
+            await self.collection.update_one(
+                {"job_id": job["job_id"], "lease_owner": self.worker_id},
+                {
+                    "$set": {"status": "queued", "lease_owner": None, "lease_expires_at": None},
+                    "$inc": {"attempts": -1}
+                }
+            )
+            return None
+        return job
+
+    async def _acquire_slot(self, job: Dict, now: datetime) -> bool:
+        """
+        Take one of the project's job_queue_per_project slots for the job.
+
+        A slot is free if it has no holder or its lease expired (crashed
+        worker). The conditional upsert either takes a free slot or, if the
+        slot document exists and is held, fails on the unique slot_id - so
+        two workers can never hold the same slot.
+        """
+        for n in range(settings.job_queue_per_project):
+            try:
+                await self.slots.update_one(
+                    {
+                        "slot_id": f"{job['project_id']}:{n}",
+                        "$or": [
+                            {"job_id": None},
+                            {"job_id": job["job_id"]},
+                            {"lease_expires_at": {"$lt": now}}
+                        ]
+                    },
+                    {"$set": {
+                        "project_id": job["project_id"],
+                        "job_id": job["job_id"],
+                        "lease_owner": self.worker_id,
+                        "lease_expires_at": job["lease_expires_at"]
+                    }},
+                    upsert=True
+                )
+                return True
+            except DuplicateKeyError:
+                continue  # Slot held by another running job
+        return False
+
+    async def _release_slot(self, job: Dict) -> None:
+        if job.get("project_id") is None:
+            return
+        await self.slots.update_one(
+            {"project_id": job["project_id"], "job_id": job["job_id"], "lease_owner": self.worker_id},
+            {"$set": {"job_id": None, "lease_owner": None, "lease_expires_at": None}}
+        )
+
+    async def _fail_exhausted(self) -> None:
+        """
+        Mark jobs whose lease expired on their last attempt as failed.
+
+        _claim() never re-leases them, so a job that crashes or hangs its
+        worker every time stops after max_attempts instead of being retried
+        forever.
+        """
+        now = datetime.utcnow()
+        exhausted = await self.collection.find(
+            {
+                "status": "running",
+                "lease_expires_at": {"$lt": now},
+                "$expr": {"$gte": ["$attempts", "$max_attempts"]}
+            },
+            {"job_id": 1, "kind": 1, "push_id": 1, "attempts": 1, "lease_expires_at": 1}
+        ).to_list(length=None)
+
+        for job in exhausted:
+            result = await self.collection.update_one(
+                {"job_id": job["job_id"], "status": "running", "lease_expires_at": job["lease_expires_at"]},
+                {"$set": {
+                    "status": "failed",
+                    "lease_owner": None,
+                    "lease_expires_at": None,
+                    "last_error": f"Lease expired on attempt {job['attempts']} (worker crashed or hung)",
+                    "updated_at": now
+                }}
+            )
+            if not result.modified_count:
+                continue  # Another worker got there first
+
+            if job["kind"] in EXHAUSTED_STATUSES:
+                current, failed = EXHAUSTED_STATUSES[job["kind"]]
+                await get_database()["push_events"].update_one(
+                    {"push_id": job["push_id"], "status": current},
+                    {"$set": {"status": failed}}
+                )
+            print(f"[JOBS] {job['job_id']} failed permanently: lease expired on attempt {job['attempts']}")
+
+    async def _worker_loop(self) -> None:
+        while not self._stopping:
+            try:
+                job = await self._claim()
+                if job is not None:
+                    await self._run(job)
+                    continue
+                await self._fail_exhausted()  # Only when idle - nothing else is claimable right now
+            except Exception as e:
+                # Mongo hiccup while claiming or recording a result - keep the worker alive;
+                # an unfinished job's lease expires and it is retried
+                print(f"[JOBS] Worker error: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.job_poll_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _heartbeat(self, job: Dict) -> None:
+        """Keep extending the job's (and its slot's) lease; returns once the lease is lost"""
+        while True:
+            await asyncio.sleep(settings.job_lease_seconds / 3)
+            expires = datetime.utcnow() + timedelta(seconds=settings.job_lease_seconds)
+            try:
+                result = await self.collection.update_one(
+                    {"job_id": job["job_id"], "lease_owner": self.worker_id, "status": "running"},
+                    {"$set": {"lease_expires_at": expires}}
+                )
+                if result.matched_count and job.get("project_id") is not None:
+                    result = await self.slots.update_one(
+                        {"project_id": job["project_id"], "job_id": job["job_id"], "lease_owner": self.worker_id},
+                        {"$set": {"lease_expires_at": expires}}
+                    )
+            except Exception as e:
+                print(f"[JOBS] Heartbeat for {job['job_id']} failed: {e}")
+                continue  # Transient - the lease is still valid until it expires
+
+            if result.matched_count == 0:
+                print(f"[JOBS] Lost the lease on {job['job_id']}, stopping it")
+                return
+
+    async def _run(self, job: Dict) -> None:
+        job_id = job["job_id"]
+        print(f"[JOBS] Running {job_id} (attempt {job['attempts']}/{job['max_attempts']})")
+
+        handler = asyncio.create_task(self.handlers[job["kind"]](job))
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        started = time.perf_counter()
+        try:
+            await asyncio.wait({handler, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+            if not handler.done():
+                # Lease lost: another worker may be running the job now
+                JOB_SECONDS.labels(job["kind"], "lease_lost").observe(time.perf_counter() - started)
+                return
+
+            error = handler.exception()
+            if error is not None:
+                JOB_SECONDS.labels(job["kind"], "error").observe(time.perf_counter() - started)
+                await self._fail(job, error)
+                return
+
+            JOB_SECONDS.labels(job["kind"], "ok").observe(time.perf_counter() - started)
+            now = datetime.utcnow()
+            await self.collection.update_one(
+                {"job_id": job_id, "lease_owner": self.worker_id},
+                {"$set": {
+                    "status": "completed",
+                    "lease_owner": None,
+                    "lease_expires_at": None,
+                    "completed_at": now,
+                    "updated_at": now
+                }}
+            )
+            print(f"[JOBS] Completed {job_id}")
+        finally:
+            heartbeat.cancel()
+            if not handler.done():
+                handler.cancel()
+                await asyncio.gather(handler, return_exceptions=True)
+            await self._release_slot(job)
+
+    async def _fail(self, job: Dict, error: Exception) -> None:
+        """Schedule a retry with exponential backoff, or give up after max_attempts"""
+        now = datetime.utcnow()
+        update = {
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "last_error": str(error),
+            "updated_at": now
+        }
+
+        if job["attempts"] >= job["max_attempts"]:
+            update["status"] = "failed"
+            print(f"[JOBS] {job['job_id']} failed permanently: {error}")
+        else:
+            backoff = min(
+                settings.job_retry_base_seconds * (2 ** (job["attempts"] - 1)),
+                settings.job_retry_max_seconds
+            )
+            backoff *= random.uniform(0.8, 1.2)  # Jitter so retries don't line up
+            update["status"] = "queued"
+            update["run_after"] = now + timedelta(seconds=backoff)
+            print(f"[JOBS] {job['job_id']} failed ({error}), retrying in {backoff:.0f}s")
+
+        await self.collection.update_one(
+            {"job_id": job["job_id"], "lease_owner": self.worker_id},
+            {"$set": update}
+        )
+
+
+# Singleton instance
+job_queue = JobQueue()
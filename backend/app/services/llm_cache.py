@@ -0,0 +1,148 @@
+"""
+Content-addressed LLM Response Cache
+
+Responses are keyed by a SHA-256 of the model name, the prompt template
+version and the normalized inputs, so reprocessing, redeliveries and job
+retries reuse an earlier answer instead of paying for another model call.
+An in-memory LRU sits in front of the llm_cache collection (TTL indexed,
+and pruned oldest-first past llm_cache_max_documents).
+Hits and misses per prompt are exported as llm_cache_hits_total /
+llm_cache_misses_total.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from app.config import get_settings
+from app.database import get_database
+from app.services.metrics import LLM_CACHE_HITS, LLM_CACHE_MISSES
+from app.utils.lru import LRUCache
+
+settings = get_settings()
+
+
+def _normalize(value: Any) -> Any:
+    """Canonical form of prompt inputs (line endings, surrounding whitespace, float noise)"""
+    if isinstance(value, str):
+        return value.replace("\r\n", "\n").strip()
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+class LLMResponseCache:
+    """Two-level (memory LRU + MongoDB) cache for parsed LLM responses"""
+
+    def __init__(self):
+        self._memory = LRUCache(
+            max_size=settings.llm_cache_memory_size,
+            ttl_seconds=settings.llm_cache_ttl_seconds
+        )
+        self.stats = {"memory_hits": 0, "store_hits": 0, "misses": 0, "writes": 0}
+
+    @property
+    def collection(self):
+        return get_database()["llm_cache"]
+
+    @staticmethod
+    def make_key(model: str, template_version: str, inputs: Any) -> str:
+        canonical = json.dumps(
+            {"model": model, "template": template_version, "inputs": _normalize(inputs)},
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    async def get(self, key: str, prompt: str) -> Optional[Dict]:
+        """Cached response for key; prompt (e.g. "gaming_detection") labels the hit/miss metrics"""
+        if not settings.llm_cache_enabled:
+            return None
+
+        cached = self._memory.get(key)
+        if cached is not None:
+            self.stats["memory_hits"] += 1
+            LLM_CACHE_HITS.labels(prompt).inc()
+            return cached
+
+        try:
+            doc = await self.collection.find_one(
+                {"key": key, "expires_at": {"$gt": datetime.utcnow()}},
+                {"response": 1}
+            )
+        except Exception as e:
+            print(f"  [LLM CACHE] Lookup failed: {e}")
+            doc = None
+
+        if doc is None:
+            self.stats["misses"] += 1
+            LLM_CACHE_MISSES.labels(prompt).inc()
+            return None
+
+        self.stats["store_hits"] += 1
+        LLM_CACHE_HITS.labels(prompt).inc()
+        self._memory.set(key, doc["response"])
+        return doc["response"]
+
+    async def set(self, key: str, response: Dict, model: str, template_version: str) -> None:
+        if not settings.llm_cache_enabled:
+            return
+
+        self._memory.set(key, response)
+        now = datetime.utcnow()
+        try:
+            result = await self.collection.update_one(
+                {"key": key},
+                {"$set": {
+                    "key": key,
+                    "model": model,
+                    "template_version": template_version,
+                    "response": response,
+                    "created_at": now,
+                    "expires_at": now + timedelta(seconds=settings.llm_cache_ttl_seconds)
+                }},
+                upsert=True
+            )
+            self.stats["writes"] += 1
+            if result.upserted_id is not None:
+                await self._prune()
+        except Exception as e:
+            print(f"  [LLM CACHE] Store failed: {e}")
+
+    async def _prune(self) -> None:
+        """
+        Keep the collection under llm_cache_max_documents between TTL sweeps.
+
+        Deletes down to 90% of the cap (oldest expires_at first, same order as
+        created_at) so a full cache doesn't prune on every insert.
+        """
+        limit = settings.llm_cache_max_documents
+        if limit <= 0:
+            return
+        count = await self.collection.estimated_document_count()
+        if count <= limit:
+            return
+
+        excess = count - limit + limit // 10
+        oldest = await self.collection.find({}, {"_id": 1}).sort("expires_at", 1).limit(excess).to_list(length=excess)
+        result = await self.collection.delete_many({"_id": {"$in": [doc["_id"] for doc in oldest]}})
+        print(f"  [LLM CACHE] Pruned {result.deleted_count} oldest entries (cap {limit})")
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats["memory_hits"] + self.stats["store_hits"] + self.stats["misses"]
+        hits = lookups - self.stats["misses"]
+        return {
+            **self.stats,
+            "memory_entries": len(self._memory),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0
+        }
+
+
+# Singleton instance
+llm_cache = LLMResponseCache()
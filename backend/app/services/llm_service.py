@@ -4,14 +4,88 @@ LLM Service for Multi-Provider Support
 Supports Claude (Anthropic), OpenAI, and Google Gemini via LangChain
 """
 
-from typing import Dict, Optional
-import asyncio
-import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
 from langchain_anthropic import ChatAnthropic
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from app.config import get_settings
+from app.services.gaming_prefilter import gaming_prefilter
+from app.services.llm_cache import llm_cache
+from app.services.milestone_ledger import resolve_milestone
+from app.services.metrics import LLM_COST_USD, LLM_REQUEST_SECONDS, LLM_TOKENS
+from app.services.rate_limiter import get_rate_limiter, retry_after_seconds
+from app.services.tracing import span
+from app.utils.diff_condenser import condense_commits
+from app.utils.tokens import estimate_cost, estimate_tokens
+
+# Model used for gaming detection and holistic analysis
+ANALYSIS_MODEL = "gpt-4o-mini"
+
+# Bump when a prompt template changes so cached responses are not reused
+GAMING_PROMPT_VERSION = "gaming-v1"
+HOLISTIC_PROMPT_VERSION = "holistic-v2"
+COMBINED_PROMPT_VERSION = "combined-v2"
+
+# Project analysis modes: two sequential calls, or one combined call
+ANALYSIS_MODES = ("two_pass", "single_pass")
+
+# System prompts (the single-pass call combines both)
+GAMING_SYSTEM_PROMPT = """You are a spam/gaming detector for a freelancer payment platform.
+
+Your ONLY job is to detect if commits are:
+1. **Legitimate work** - Real code changes with meaningful purpose
+2. **Gaming/Spam** - Fake commits to inflate payment (whitespace changes, meaningless edits, spam)
+
+Common gaming patterns:
+- Empty commits with no real changes
+- Only whitespace or formatting changes
+- Adding/removing same lines repeatedly
+- Trivial README edits with no substance
+- Gibberish or auto-generated content
+- Excessive changes that look copy-pasted
+
+Be strict but fair. Real work should pass."""
+
+PAYMENT_ANALYST_PROMPT = """You are an AI payment analyst for StarCPay, evaluating freelancer work to determine fair payment.
+
+Your job:
+1. Identify which milestone this work belongs to
+2. Calculate payment as a PROPORTION of the milestone's budget
+3. Consider total project budget and remaining balance
+4. Be strict - budget must last for ALL milestones
+
+Payment strategy:
+- Match work to specific milestone tasks
+- Pay proportionally: If milestone has $20 budget and 4 tasks, completing 1-2 tasks = $5-10
+- NEVER exceed the milestone's budget for that milestone's work
+- Consider remaining budget - must be enough for future milestones
+- Empty commits = $0
+- Trivial work = $1-3 (even if milestone budget is higher)
+
+Critical rules:
+1. Total project budget is FIXED - once it's gone, no more payments
+2. Each milestone has a budget allocation - respect it
+3. If remaining budget is low, reduce payouts to ensure project completion
+4. Quality and task completion matter more than lines of code"""
+
+
+# Token usage accumulator for the current task (see track_usage)
+_usage: ContextVar[Optional[Dict]] = ContextVar("llm_usage", default=None)
+
+
+@contextmanager
+def track_usage() -> Iterator[Dict]:
+    """Accumulate model calls and token usage made inside the block (per asyncio task)"""
+    usage = {"calls": 0, "input_tokens": 0, "output_tokens": 0, "total_tokens": 0, "cost_usd": 0.0}
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
 
 
 class LLMService:
@@ -48,50 +122,116 @@ class LLMService:
             raise ValueError("OPENAI_API_KEY not set in environment")
 
         self._openai = ChatOpenAI(
-            model="gpt-4o-mini",  # Use 4o-mini as specified
+            model=ANALYSIS_MODEL,  # Use 4o-mini as specified
             openai_api_key=self.settings.openai_api_key,
             temperature=0.3,
             max_tokens=2048
         )
-        print(f"[LLM] Initialized OpenAI: gpt-4o-mini")
+        print(f"[LLM] Initialized OpenAI: {ANALYSIS_MODEL}")
         return self._openai
 
+    @staticmethod
+    def _model_name(llm) -> str:
+        name = getattr(llm, "model_name", None) or getattr(llm, "model", None) or "unknown"
+        return name.split("/", 1)[-1]  # Gemini reports "models/<name>"
+
+    async def _invoke(self, llm, messages: list, provider: str, operation: str = "chat"):
+        """
+        Call the model through the provider's shared rate limiter.
+
+        Only waits when the request/token buckets are empty; a 429 pauses the
+        provider for its retry-after and the call is retried. Latency, tokens
+        and estimated cost are exported as metrics and recorded as an
+        "llm.call" span.
+        """
+        limiter = get_rate_limiter(provider)
+        estimated = sum(estimate_tokens(m.content) for m in messages) + self.settings.llm_expected_output_tokens
+        model = self._model_name(llm)
+
+        started = time.perf_counter()
+        outcome = "error"
+        with span("llm.call", provider=provider, model=model, operation=operation) as attributes:
+            try:
+                for attempt in range(self.settings.llm_max_rate_limit_retries + 1):
+                    waited = await limiter.acquire(estimated)
+                    if waited > 0:
+                        print(f"  - Rate limiter: waited {waited:.2f}s for {provider} capacity")
+                        attributes["rate_limit_wait_ms"] = attributes.get("rate_limit_wait_ms", 0) + round(waited * 1000, 1)
+
+                    try:
+                        response = await llm.ainvoke(messages)
+                    except Exception as e:
+                        retry_after = retry_after_seconds(e)
+                        if retry_after is None or attempt == self.settings.llm_max_rate_limit_retries:
+                            raise
+                        print(f"  - {provider} rate limited (429), backing off {retry_after:.1f}s")
+                        limiter.penalize(retry_after)
+                        attributes["retries"] = attempt + 1
+                        continue
+
+                    outcome = "ok"
+                    break
+            finally:
+                LLM_REQUEST_SECONDS.labels(provider, model, operation, outcome).observe(time.perf_counter() - started)
+
+            usage = getattr(response, "usage_metadata", None) or {}
+            if usage:
+                limiter.record_usage(estimated, usage.get("total_tokens", estimated))
+
+            input_tokens = usage.get("input_tokens", 0)
+            output_tokens = usage.get("output_tokens", 0)
+            cost = estimate_cost(model, input_tokens, output_tokens)
+            LLM_TOKENS.labels(provider, model, "input").inc(input_tokens)
+            LLM_TOKENS.labels(provider, model, "output").inc(output_tokens)
+            if cost is not None:
+                LLM_COST_USD.labels(provider, model).inc(cost)
+            attributes.update(input_tokens=input_tokens, output_tokens=output_tokens, cost_usd=cost)
+
+        tracked = _usage.get()
+        if tracked is not None:
+            tracked["calls"] += 1
+            for field in ("input_tokens", "output_tokens", "total_tokens"):
+                tracked[field] += usage.get(field, 0)
+            tracked["cost_usd"] = round(tracked["cost_usd"] + (cost or 0.0), 6)
+        return response
+
     async def detect_gaming(self, commits_details: list) -> Dict:
         """
         Step 1: Gaming/Spam Detection using OpenAI GPT-4o-mini (fast and reliable)
 
-        Input: Only commit metadata + first 500 chars of diff
+        Input: Only commit metadata + condensed diff (gaming_diff_token_budget tokens in total)
         Output: legitimate/spam classification with confidence
+
+        Obvious cases are decided by the rule-based pre-filter without a model call
+        (including "needs_review" verdicts - a human looks at those anyway).
         """
+        heuristic = gaming_prefilter.classify(commits_details)
+        if heuristic is not None:
+            return heuristic
+
         openai = self._get_openai()
 
         # Prepare minimal data for gaming detection
+        previews = condense_commits(
+            [commit.get("diff", "") for commit in commits_details],
+            self.settings.gaming_diff_token_budget
+        )
         commit_summaries = []
-        for commit in commits_details:
+        for commit, preview in zip(commits_details, previews):
             summary = {
                 "message": commit.get("message", ""),
                 "additions": commit.get("additions", 0),
                 "deletions": commit.get("deletions", 0),
                 "files_changed": len(commit.get("files_changed", [])),
-                "diff_preview": commit.get("diff", "")[:500]  # Only first 500 chars
+                "diff_preview": preview  # Highest-signal hunks only
             }
             commit_summaries.append(summary)
 
-        system_prompt = """You are a spam/gaming detector for a freelancer payment platform.
-
-Your ONLY job is to detect if commits are:
-1. **Legitimate work** - Real code changes with meaningful purpose
-2. **Gaming/Spam** - Fake commits to inflate payment (whitespace changes, meaningless edits, spam)
-
-Common gaming patterns:
-- Empty commits with no real changes
-- Only whitespace or formatting changes
-- Adding/removing same lines repeatedly
-- Trivial README edits with no substance
-- Gibberish or auto-generated content
-- Excessive changes that look copy-pasted
-
-Be strict but fair. Real work should pass."""
+        cache_key = llm_cache.make_key(ANALYSIS_MODEL, GAMING_PROMPT_VERSION, commit_summaries)
+        cached = await llm_cache.get(cache_key, "gaming_detection")
+        if cached is not None:
+            print(f"[LLM CACHE] Gaming detection hit: {cache_key[:12]}")
+            return cached
 
         commits_text = "\n\n".join([
             f"Commit {i+1}:\n"
@@ -114,34 +254,20 @@ Respond with JSON only:
 }}"""
 
         try:
-            # Random delay to avoid rate limits (0.5-2 seconds)
-            delay = random.uniform(0.5, 2.0)
-            print(f"  - Rate limit protection: waiting {delay:.2f}s")
-            await asyncio.sleep(delay)
-
             messages = [
-                SystemMessage(content=system_prompt),
+                SystemMessage(content=GAMING_SYSTEM_PROMPT),
                 HumanMessage(content=user_prompt)
             ]
 
-            response = await openai.ainvoke(messages)
-            response_text = response.content
-
-            # Parse JSON
-            import json
-            import re
-
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                result = json.loads(json_match.group(0))
-            else:
-                result = json.loads(response_text)
+            response = await self._invoke(openai, messages, provider="openai", operation="gaming_detection")
+            result = self._parse_json(response.content)
 
             print(f"[GPT-4o-mini] Gaming detection:")
             print(f"  - Is gaming: {result.get('is_gaming', False)}")
             print(f"  - Confidence: {result.get('confidence', 0)}")
             print(f"  - Reason: {result.get('reason', '')[:100]}")
 
+            await llm_cache.set(cache_key, result, ANALYSIS_MODEL, GAMING_PROMPT_VERSION)
             return result
 
         except Exception as e:
@@ -171,61 +297,245 @@ Respond with JSON only:
 
         # If gaming detected, return $0 immediately
         if gaming_result.get("is_gaming", False):
+            return self._gaming_rejection(gaming_result)
+
+        commits_text = self._format_commits(commits_details, self.settings.analysis_diff_token_budget)
+
+        cache_key = llm_cache.make_key(ANALYSIS_MODEL, HOLISTIC_PROMPT_VERSION, {
+            "commits": commits_text,
+            "milestones": milestones,
+            "historic_commits": historic_commits[:10],
+            "budget_info": budget_info
+        })
+        cached = await llm_cache.get(cache_key, "holistic_analysis")
+        if cached is not None:
+            print(f"[LLM CACHE] Holistic analysis hit: {cache_key[:12]}")
+            return self._hold_for_review(cached, gaming_result)
+
+        context = self._format_context(commits_text, milestones, historic_commits, budget_info)
+
+        user_prompt = f"""Analyze this push and determine fair payment:
+
+{context}
+
+**Gaming Check:**
+- Legitimate work confirmed by pre-screening
+
+Respond with JSON only:
+{{
+    "payout_amount": 0-50,
+    "reasoning": "detailed explanation (3-5 sentences)",
+    "confidence": 0.0-1.0,
+    "quality_score": 0.0-1.0,
+    "task_alignment": "aligned/partially_aligned/not_aligned",
+    "milestone_id": "id of the milestone this work belongs to (as listed above), or null",
+    "flags": ["flag1", "flag2"],
+    "commits_summary": "one sentence summary"
+}}"""
+
+        try:
+            messages = [
+                SystemMessage(content=PAYMENT_ANALYST_PROMPT),
+                HumanMessage(content=user_prompt)
+            ]
+
+            response = await self._invoke(openai, messages, provider="openai", operation="holistic_analysis")
+            result = self._finalize_payout(self._parse_json(response.content), budget_info)
+
+            print(f"[GPT-4o-mini] Holistic analysis:")
+            print(f"  - Payout: ${result['payout_amount']}")
+            print(f"  - Quality: {result['quality_score']}")
+            print(f"  - Confidence: {result['confidence']}")
+            print(f"  - Alignment: {result.get('task_alignment', 'unknown')}")
+
+            await llm_cache.set(cache_key, result, ANALYSIS_MODEL, HOLISTIC_PROMPT_VERSION)
+            return self._hold_for_review(result, gaming_result)
+
+        except Exception as e:
+            print(f"[ERROR] Holistic analysis failed: {e}")
+            import traceback
+            traceback.print_exc()
+
+            # Fallback
+            return self._fallback_analysis(commits_details, budget_info)
+
+    @staticmethod
+    def _hold_for_review(analysis: Dict, gaming_result: Optional[Dict]) -> Dict:
+        """Copy of the analysis held for a human when the pre-filter returned a review verdict"""
+        if not gaming_result or not gaming_result.get("needs_review") or analysis.get("gaming_detected"):
+            return analysis
+        return {
+            **analysis,
+            "analysis_status": "needs_human_review",
+            "flags": list(analysis.get("flags") or []) + gaming_result.get("flags", []),
+            "gaming_rule": gaming_result.get("rule"),
+            "gaming_evidence": gaming_result.get("evidence")
+        }
+
+    async def combined_analysis(
+        self,
+        commits_details: list,
+        milestones: Dict,
+        historic_commits: list,
+        budget_info: Dict
+    ) -> Dict:
+        """
+        Single-pass mode: gaming verdict and payout decision in one GPT-4o-mini call
+
+        Returns {"gaming_result": ..., "analysis": ...} shaped like the outputs
+        of detect_gaming and holistic_analysis.
+        """
+        heuristic = gaming_prefilter.classify(commits_details)
+        if heuristic is not None and heuristic["is_gaming"]:
+            return {"gaming_result": heuristic, "analysis": self._gaming_rejection(heuristic)}
+
+        combined = await self._combined_call(commits_details, milestones, historic_commits, budget_info)
+        return {
+            "gaming_result": combined["gaming_result"],
+            "analysis": self._hold_for_review(combined["analysis"], heuristic)
+        }
+
+    async def _combined_call(
+        self,
+        commits_details: list,
+        milestones: Dict,
+        historic_commits: list,
+        budget_info: Dict
+    ) -> Dict:
+        """The (cached) combined model call behind combined_analysis"""
+        openai = self._get_openai()
+
+        commits_text = self._format_commits(commits_details, self.settings.analysis_diff_token_budget)
+
+        cache_key = llm_cache.make_key(ANALYSIS_MODEL, COMBINED_PROMPT_VERSION, {
+            "commits": commits_text,
+            "milestones": milestones,
+            "historic_commits": historic_commits[:10],
+            "budget_info": budget_info
+        })
+        cached = await llm_cache.get(cache_key, "combined_analysis")
+        if cached is not None:
+            print(f"[LLM CACHE] Combined analysis hit: {cache_key[:12]}")
+            return cached
+
+        context = self._format_context(commits_text, milestones, historic_commits, budget_info)
+
+        user_prompt = f"""First check these commits for gaming/spam, then determine fair payment:
+
+{context}
+
+**Gaming Check:**
+- Not pre-screened: decide is_gaming yourself
+- If is_gaming is true, payout_amount must be 0
+
+Respond with JSON only:
+{{
+    "is_gaming": true/false,
+    "gaming_confidence": 0.0-1.0,
+    "gaming_reason": "brief explanation",
+    "gaming_flags": ["flag1", "flag2"],
+    "payout_amount": 0-50,
+    "reasoning": "detailed explanation (3-5 sentences)",
+    "confidence": 0.0-1.0,
+    "quality_score": 0.0-1.0,
+    "task_alignment": "aligned/partially_aligned/not_aligned",
+    "milestone_id": "id of the milestone this work belongs to (as listed above), or null",
+    "flags": ["flag1", "flag2"],
+    "commits_summary": "one sentence summary"
+}}"""
+
+        try:
+            messages = [
+                SystemMessage(content=f"{PAYMENT_ANALYST_PROMPT}\n\nBefore deciding payment, screen the work.\n\n{GAMING_SYSTEM_PROMPT}"),
+                HumanMessage(content=user_prompt)
+            ]
+
+            response = await self._invoke(openai, messages, provider="openai", operation="combined_analysis")
+            result = self._parse_json(response.content)
+        except Exception as e:
+            print(f"[ERROR] Combined analysis failed: {e}")
+            import traceback
+            traceback.print_exc()
+
+            # Same fallbacks as the two-call pipeline: assume legitimate, rule-based payout
             return {
-                "payout_amount": 0.0,
-                "reasoning": f"Gaming/spam detected: {gaming_result.get('reason', 'Illegitimate commits')}",
-                "confidence": gaming_result.get("confidence", 0.9),
-                "quality_score": 0.0,
-                "gaming_detected": True,
-                "task_alignment": "not_aligned",
-                "flags": ["gaming_detected"] + gaming_result.get("flags", []),
-                "commits_summary": "Spam/gaming commits rejected",
-                "analysis_status": "rejected"
+                "gaming_result": {
+                    "is_gaming": False,
+                    "confidence": 0.3,
+                    "reason": "Gaming detection failed, assuming legitimate",
+                    "flags": ["detection_failed"]
+                },
+                "analysis": self._fallback_analysis(commits_details, budget_info)
             }
 
-        # Prepare commit data (truncate diffs to 1000 tokens if needed)
-        commits_text = []
-        for commit in commits_details:
-            diff = commit.get("diff", "")
-            # Simple truncation - first 1000 chars for POC
-            if len(diff) > 1000:
-                diff = diff[:1000] + "\n... (truncated)"
+        gaming_result = {
+            "is_gaming": bool(result.pop("is_gaming", False)),
+            "confidence": result.pop("gaming_confidence", 0.5),
+            "reason": result.pop("gaming_reason", ""),
+            "flags": result.pop("gaming_flags", [])
+        }
+
+        if gaming_result["is_gaming"]:
+            analysis = self._gaming_rejection(gaming_result)
+        else:
+            analysis = self._finalize_payout(result, budget_info)
+
+        print(f"[GPT-4o-mini] Combined analysis:")
+        print(f"  - Is gaming: {gaming_result['is_gaming']}")
+        print(f"  - Payout: ${analysis['payout_amount']}")
+        print(f"  - Confidence: {analysis['confidence']}")
 
+        combined = {"gaming_result": gaming_result, "analysis": analysis}
+        await llm_cache.set(cache_key, combined, ANALYSIS_MODEL, COMBINED_PROMPT_VERSION)
+        return combined
+
+    @staticmethod
+    def _gaming_rejection(gaming_result: Dict) -> Dict:
+        """$0 analysis for pushes flagged as gaming"""
+        return {
+            "payout_amount": 0.0,
+            "reasoning": f"Gaming/spam detected: {gaming_result.get('reason', 'Illegitimate commits')}",
+            "confidence": gaming_result.get("confidence", 0.9),
+            "quality_score": 0.0,
+            "gaming_detected": True,
+            "task_alignment": "not_aligned",
+            "flags": ["gaming_detected"] + gaming_result.get("flags", []),
+            "commits_summary": "Spam/gaming commits rejected",
+            "analysis_status": "rejected",
+            "milestone_id": None,
+            "gaming_rule": gaming_result.get("rule"),  # Set when the pre-filter decided
+            "gaming_evidence": gaming_result.get("evidence")
+        }
+
+    @staticmethod
+    def _format_commits(commits_details: list, diff_token_budget: int) -> List[str]:
+        """Commit blocks for the payment prompts (diffs condensed into a shared token budget)"""
+        diffs = condense_commits([commit.get("diff", "") for commit in commits_details], diff_token_budget)
+
+        commits_text = []
+        for commit, diff in zip(commits_details, diffs):
             commits_text.append(
                 f"Commit: {commit.get('message', '')}\n"
                 f"Changes: +{commit.get('additions', 0)} -{commit.get('deletions', 0)} lines\n"
                 f"Files: {len(commit.get('files_changed', []))}\n"
                 f"Diff:\n{diff}\n"
             )
+        return commits_text
 
+    @staticmethod
+    def _format_context(
+        commits_text: List[str],
+        milestones: Dict,
+        historic_commits: list,
+        budget_info: Dict
+    ) -> str:
+        """Commits, milestones, history and budget section shared by the payment prompts"""
         # Prepare historic context
         historic_text = "\n".join([
             f"  - {h.get('message', '')} (+{h.get('additions', 0)} -{h.get('deletions', 0)})"
             for h in historic_commits[:10]
         ])
 
-        system_prompt = """You are an AI payment analyst for StarCPay, evaluating freelancer work to determine fair payment.
-
-Your job:
-1. Identify which milestone this work belongs to
-2. Calculate payment as a PROPORTION of the milestone's budget
-3. Consider total project budget and remaining balance
-4. Be strict - budget must last for ALL milestones
-
-Payment strategy:
-- Match work to specific milestone tasks
-- Pay proportionally: If milestone has $20 budget and 4 tasks, completing 1-2 tasks = $5-10
-- NEVER exceed the milestone's budget for that milestone's work
-- Consider remaining budget - must be enough for future milestones
-- Empty commits = $0
-- Trivial work = $1-3 (even if milestone budget is higher)
-
-Critical rules:
-1. Total project budget is FIXED - once it's gone, no more payments
-2. Each milestone has a budget allocation - respect it
-3. If remaining budget is low, reduce payouts to ensure project completion
-4. Quality and task completion matter more than lines of code"""
-
         # Format milestones clearly
         milestone_text = ""
         if isinstance(milestones, dict) and 'milestones' in milestones:
@@ -247,9 +557,7 @@ Critical rules:
                 spent = budget_info.get('milestone_spending', {}).get(str(m['id']), 0)
                 milestone_summary_text += f"\n  {m['id']}. {m['title']}: ${m['budget']} budget, {m['tasks_count']} tasks, ${spent} spent, ${m['budget']-spent} remaining"
 
-        user_prompt = f"""Analyze this push and determine fair payment:
-
-**Current Commits ({len(commits_details)} total):**
+        return f"""**Current Commits ({len(commits_text)} total):**
 {chr(10).join(commits_text)}
 
 **Project Milestones & Task Breakdown:**
@@ -280,77 +588,46 @@ Total allocated: ${total_milestone_budget}
 - NEVER pay more than what's left in the milestone budget
 - NEVER pay more than remaining project budget
 - Consider future milestones - budget must last!
-- Quality matters: great work = higher multiplier, poor work = lower
-
-**Gaming Check:**
-- Legitimate work confirmed by pre-screening
-
-Respond with JSON only:
-{{
-    "payout_amount": 0-50,
-    "reasoning": "detailed explanation (3-5 sentences)",
-    "confidence": 0.0-1.0,
-    "quality_score": 0.0-1.0,
-    "task_alignment": "aligned/partially_aligned/not_aligned",
-    "flags": ["flag1", "flag2"],
-    "commits_summary": "one sentence summary"
-}}"""
-
-        try:
-            # Random delay to avoid rate limits (1-3 seconds for holistic analysis)
-            delay = random.uniform(1.0, 3.0)
-            print(f"  - Rate limit protection: waiting {delay:.2f}s")
-            await asyncio.sleep(delay)
-
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-            ]
-
-            response = await openai.ainvoke(messages)
-            response_text = response.content
-
-            # Parse JSON
-            import json
-            import re
-
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                result = json.loads(json_match.group(0))
-            else:
-                result = json.loads(response_text)
-
-            # Validate and cap payout
-            payout_amount = float(result.get("payout_amount", 0))
-            payout_amount = min(payout_amount, 50.0)
-            payout_amount = min(payout_amount, budget_info.get("remaining_budget", 0))
-
-            result["payout_amount"] = round(payout_amount, 2)
-            result["confidence"] = round(float(result.get("confidence", 0.5)), 2)
-            result["quality_score"] = round(float(result.get("quality_score", 0.5)), 2)
-            result["gaming_detected"] = False
-
-            # Add analysis status
-            if result["confidence"] < 0.7:
-                result["analysis_status"] = "needs_human_review"
-            else:
-                result["analysis_status"] = "approved"
-
-            print(f"[GPT-4o-mini] Holistic analysis:")
-            print(f"  - Payout: ${result['payout_amount']}")
-            print(f"  - Quality: {result['quality_score']}")
-            print(f"  - Confidence: {result['confidence']}")
-            print(f"  - Alignment: {result.get('task_alignment', 'unknown')}")
-
-            return result
-
-        except Exception as e:
-            print(f"[ERROR] Holistic analysis failed: {e}")
-            import traceback
-            traceback.print_exc()
+- Quality matters: great work = higher multiplier, poor work = lower"""
+
+    @staticmethod
+    def _parse_json(response_text: str) -> Dict:
+        import json
+        import re
+
+        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+        if json_match:
+            return json.loads(json_match.group(0))
+        return json.loads(response_text)
+
+    @staticmethod
+    def _finalize_payout(result: Dict, budget_info: Dict) -> Dict:
+        """Validate and cap the model's payout decision"""
+        payout_amount = float(result.get("payout_amount", 0))
+        payout_amount = min(payout_amount, 50.0)
+        payout_amount = min(payout_amount, budget_info.get("remaining_budget", 0))
 
-            # Fallback
-            return self._fallback_analysis(commits_details, budget_info)
+        # Attribute to a known milestone and keep the payout within what is left of it
+        result["milestone_id"] = resolve_milestone(result.get("milestone_id"), budget_info.get("milestone_summary", []))
+        if result["milestone_id"] is not None:
+            milestone = next(m for m in budget_info["milestone_summary"] if str(m.get("id")) == result["milestone_id"])
+            committed = budget_info.get("milestone_spending", {}).get(result["milestone_id"], 0)  # Approved + in review
+            milestone_remaining = max(float(milestone.get("budget", 0)) - committed, 0.0)
+            if payout_amount > milestone_remaining:
+                payout_amount = milestone_remaining
+                result["flags"] = list(result.get("flags") or []) + ["milestone_budget_cap"]
+
+        result["payout_amount"] = round(payout_amount, 2)
+        result["confidence"] = round(float(result.get("confidence", 0.5)), 2)
+        result["quality_score"] = round(float(result.get("quality_score", 0.5)), 2)
+        result["gaming_detected"] = False
+
+        # Add analysis status (capped payouts get a human look - the work outran its milestone budget)
+        if result["confidence"] < 0.7 or "milestone_budget_cap" in result.get("flags", []):
+            result["analysis_status"] = "needs_human_review"
+        else:
+            result["analysis_status"] = "approved"
+        return result
 
     def _fallback_analysis(self, commits_details: list, budget_info: Dict) -> Dict:
         """Fallback rule-based analysis if LLM fails"""
@@ -377,7 +654,8 @@ Respond with JSON only:
             "task_alignment": "unknown",
             "flags": ["fallback_analysis"],
             "commits_summary": f"{len(commits_details)} commits",
-            "analysis_status": "needs_human_review"
+            "analysis_status": "needs_human_review",
+            "milestone_id": None
         }
 
 
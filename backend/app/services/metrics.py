@@ -0,0 +1,175 @@
+"""
+Prometheus Metrics
+
+All metric objects live here (default prometheus_client registry) so every
+service records into the same names. Durations are in seconds.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from prometheus_client import Counter, Gauge, Histogram
+from pymongo import monitoring
+
+# Buckets for model and RPC calls - these take seconds, not milliseconds
+SLOW_CALL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+# Buckets for API requests and database commands
+FAST_CALL_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# HTTP API
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds",
+    "Latency of API requests by route template",
+    ["method", "route", "status"],
+    buckets=FAST_CALL_BUCKETS
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "API requests currently being handled",
+    ["method"]
+)
+WEBHOOK_EVENTS = Counter(
+    "webhook_events_total",
+    "GitHub webhook deliveries by event type and outcome",
+    ["event", "outcome"]
+)
+PUSH_ENRICH_OUTCOMES = Counter(
+    "push_enrich_total",
+    "Push events processed by the enrich job, by resulting status",
+    ["outcome"]
+)
+
+# Background jobs
+JOB_QUEUE_DEPTH = Gauge(
+    "job_queue_depth",
+    "Jobs in analysis_jobs by kind and status (refreshed on scrape)",
+    ["kind", "status"]
+)
+JOB_SECONDS = Histogram(
+    "job_seconds",
+    "Duration of background job runs",
+    ["kind", "outcome"],
+    buckets=SLOW_CALL_BUCKETS
+)
+
+# MongoDB
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongo_command_seconds",
+    "Duration of MongoDB commands as reported by the driver",
+    ["command", "collection", "outcome"],
+    buckets=FAST_CALL_BUCKETS
+)
+
+# AI workflow
+WORKFLOW_STAGE_SECONDS = Histogram(
+    "workflow_stage_seconds",
+    "Duration of AI workflow stages",
+    ["stage", "analysis_mode", "status"],
+    buckets=SLOW_CALL_BUCKETS
+)
+WORKFLOW_SECONDS = Histogram(
+    "workflow_seconds",
+    "Wall time of a complete AI workflow run",
+    ["analysis_mode", "outcome"],
+    buckets=SLOW_CALL_BUCKETS
+)
+SPAN_SECONDS = Histogram(
+    "span_seconds",
+    "Duration of traced operations (GitHub fetches, Mongo writes, model calls, chain calls)",
+    ["span", "status"],
+    buckets=SLOW_CALL_BUCKETS
+)
+
+# LLM calls
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_seconds",
+    "Latency of model calls (including rate-limit retries)",
+    ["provider", "model", "operation", "outcome"],
+    buckets=SLOW_CALL_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens reported by the provider",
+    ["provider", "model", "direction"]
+)
+LLM_COST_USD = Counter(
+    "llm_cost_usd_total",
+    "Estimated model spend in USD (from MODEL_PRICES_PER_MTOK)",
+    ["provider", "model"]
+)
+LLM_CACHE_HITS = Counter(
+    "llm_cache_hits_total",
+    "LLM response cache hits (memory or llm_cache collection) by prompt",
+    ["prompt"]
+)
+LLM_CACHE_MISSES = Counter(
+    "llm_cache_misses_total",
+    "LLM response cache misses (a model call follows) by prompt",
+    ["prompt"]
+)
+
+# External calls
+GITHUB_REQUEST_SECONDS = Histogram(
+    "github_request_seconds",
+    "Latency of GitHub API calls",
+    ["operation", "outcome"],
+    buckets=SLOW_CALL_BUCKETS
+)
+GITHUB_RATE_LIMIT_REMAINING = Gauge(
+    "github_rate_limit_remaining",
+    "Requests left in the current GitHub rate-limit window (from the last response)",
+    ["installation", "resource"]
+)
+CHAIN_CALL_SECONDS = Histogram(
+    "chain_call_seconds",
+    "Latency of StreamingTreasury calls (changeRate: send + receipt wait) and RPC reads",
+    ["method", "outcome"],
+    buckets=SLOW_CALL_BUCKETS
+)
+
+
+def observe_stage_timings(timings: Dict, analysis_mode: str) -> None:
+    """Export a StageGraph timings record (see app/utils/stage_graph.py)"""
+    for stage, timing in timings.get("stages", {}).items():
+        WORKFLOW_STAGE_SECONDS.labels(stage, analysis_mode, timing["status"]).observe(timing["duration_ms"] / 1000)
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels) -> Iterator[None]:
+    """Observe the block's duration on histogram with outcome="ok" or "error" (if it raises)"""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        histogram.labels(**labels, outcome=outcome).observe(time.perf_counter() - started)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Exports every driver command's duration (registered on the client in app/database.py)"""
+
+    # Handshake, auth and session bookkeeping - not application queries
+    IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "saslStart", "saslContinue", "ping", "endSessions", "buildInfo"}
+
+    def __init__(self):
+        self._collections: Dict[int, str] = {}  # request_id -> collection, between started and succeeded/failed
+
+    def started(self, event) -> None:
+        if event.command_name in self.IGNORED_COMMANDS:
+            return
+        target = event.command.get("collection") if event.command_name == "getMore" else event.command.get(event.command_name)
+        self._collections[event.request_id] = target if isinstance(target, str) else ""
+
+    def succeeded(self, event) -> None:
+        self._observe(event, "ok")
+
+    def failed(self, event) -> None:
+        self._observe(event, "error")
+
+    def _observe(self, event, outcome: str) -> None:
+        collection = self._collections.pop(event.request_id, None)
+        if collection is None:
+            return  # Ignored command
+        MONGO_COMMAND_SECONDS.labels(event.command_name, collection, outcome).observe(event.duration_micros / 1_000_000)
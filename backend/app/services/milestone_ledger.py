@@ -0,0 +1,114 @@
+"""
+Milestone Spend Ledger
+
+One document per (project_id, milestone_id) in the milestone_ledger
+collection, incremented atomically whenever an analysis attributed to that
+milestone is stored. Enrichment reads a project's spend per milestone with a
+single indexed query. Analyses without a (valid) attribution are booked
+under "unknown".
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from app.database import get_database
+from app.services.project_stats import PAID_STATUSES
+
+UNATTRIBUTED = "unknown"
+
+# Fields rebuild() needs from each stored analysis
+ANALYSIS_LEDGER_PROJECTION = {"_id": 0, "push_id": 1, "payout_amount": 1, "analysis_status": 1, "milestone_id": 1}
+
+
+def milestone_key(milestone_id) -> str:
+    """Ledger key for a milestone id (ids are ints or strings in milestone specs)"""
+    return UNATTRIBUTED if milestone_id in (None, "") else str(milestone_id)
+
+
+def build_entry_increment(analysis_doc: Dict) -> Dict:
+    """$inc document for one stored analysis"""
+    payout = analysis_doc.get("payout_amount") or 0.0
+    paid = analysis_doc.get("analysis_status") in PAID_STATUSES
+    return {
+        "analyses_count": 1,
+        "paid_count": 1 if paid else 0,
+        "spent": payout if paid else 0.0,
+        "pending_review_amount": payout if analysis_doc.get("analysis_status") == "needs_human_review" else 0.0,
+    }
+
+
+class MilestoneLedgerService:
+    """Running spend per project milestone"""
+
+    @property
+    def collection(self):
+        return get_database()["milestone_ledger"]
+
+    async def record_analysis(self, analysis_doc: Dict) -> None:
+        """Book one stored analysis against its milestone (single atomic upsert)"""
+        update = {
+            "$inc": build_entry_increment(analysis_doc),
+            "$set": {"last_push_id": analysis_doc.get("push_id"), "updated_at": datetime.utcnow()}
+        }
+        entry = {"project_id": analysis_doc["project_id"], "milestone_id": milestone_key(analysis_doc.get("milestone_id"))}
+        try:
+            await self.collection.update_one(entry, update, upsert=True)
+        except DuplicateKeyError:
+            # Another analysis created the entry concurrently - it exists now, so this is a plain update
+            await self.collection.update_one(entry, update)
+
+    async def get_entries(self, project_id: str) -> List[Dict]:
+        """All ledger entries of a project"""
+        return await self.collection.find({"project_id": project_id}, {"_id": 0}).to_list(length=None)
+
+    async def get_spending(self, project_id: str) -> Dict[str, float]:
+        """
+        Amount committed per milestone id: approved spend plus payouts awaiting
+        human review. Both are credited to earned_pending when stored, so both
+        count against what is left of the milestone.
+        """
+        return {
+            entry["milestone_id"]: entry.get("spent", 0.0) + entry.get("pending_review_amount", 0.0)
+            for entry in await self.get_entries(project_id)
+        }
+
+    async def rebuild(self, project_id: str) -> List[Dict]:
+        """Recompute a project's ledger from all of its analyses (backfill / repair)"""
+        entries: Dict[str, Dict] = {}
+        cursor = get_database()["commit_analyses"].find(
+            {"project_id": project_id}, ANALYSIS_LEDGER_PROJECTION
+        ).sort("created_at", 1)
+        async for analysis in cursor:
+            key = milestone_key(analysis.get("milestone_id"))
+            entry = entries.setdefault(key, {
+                "project_id": project_id, "milestone_id": key,
+                "analyses_count": 0, "paid_count": 0, "spent": 0.0, "pending_review_amount": 0.0
+            })
+            for field, value in build_entry_increment(analysis).items():
+                entry[field] += value
+            entry["last_push_id"] = analysis.get("push_id")
+
+        await self.collection.delete_many({"project_id": project_id})
+        now = datetime.utcnow()
+        for entry in entries.values():
+            entry["updated_at"] = now
+        if entries:
+            await self.collection.insert_many(list(entries.values()))
+        return list(entries.values())
+
+
+def resolve_milestone(milestone_id, milestone_summary: List[Dict]) -> Optional[str]:
+    """Milestone id from a model response as a known milestone key, or None if it matches none"""
+    if milestone_id in (None, ""):
+        return None
+    known = {str(m.get("id")) for m in milestone_summary if m.get("id") is not None}
+    candidate = str(milestone_id).strip()
+    if candidate.lower().startswith("milestone"):
+        candidate = candidate[len("milestone"):].strip(" :#")
+    return candidate if candidate in known else None
+
+
+# Singleton instance
+milestone_ledger_service = MilestoneLedgerService()
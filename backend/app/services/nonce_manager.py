@@ -0,0 +1,91 @@
+"""
+Local nonce allocation for the backend's signing account.
+
+Nonces are handed out from a local counter so several changeRate transactions
+can be in the mempool at once instead of each one waiting for the previous
+receipt. The counter is resynced from the chain on first use, after nonce
+errors and when a tracked transaction is dropped.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from web3 import AsyncWeb3
+
+# RPC error fragments that mean our local nonce view is out of date
+NONCE_ERRORS = (
+    "nonce too low",
+    "nonce too high",
+    "already known",
+    "replacement transaction underpriced",
+    "invalid nonce",
+)
+
+
+def is_nonce_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(fragment in message for fragment in NONCE_ERRORS)
+
+
+class NonceManager:
+    """Allocates nonces for one sender address and tracks its pending transactions"""
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self._next_nonce: Optional[int] = None
+        self.pending: Dict[int, Dict] = {}  # nonce -> {"tx_hash", "sent_at"}
+
+    @asynccontextmanager
+    async def reserve(self, w3: AsyncWeb3, address: str) -> AsyncIterator[int]:
+        """
+        Reserve the next nonce while a transaction is signed and sent.
+
+        The nonce is only consumed if the block exits without an exception,
+        so a failed send never leaves a gap.
+        """
+        async with self._lock:
+            if self._next_nonce is None:
+                await self._sync(w3, address)
+            nonce = self._next_nonce
+            yield nonce
+            self._next_nonce = nonce + 1
+
+    def track(self, nonce: int, tx_hash: str) -> None:
+        self.pending[nonce] = {"tx_hash": tx_hash, "sent_at": time.time()}
+
+    def confirm(self, nonce: int) -> None:
+        self.pending.pop(nonce, None)
+
+    async def resync(self, w3: AsyncWeb3, address: str) -> None:
+        """Reset the local counter from the chain (after drops, replacements or nonce errors)"""
+        async with self._lock:
+            await self._sync(w3, address)
+
+    async def check_unconfirmed(self, w3: AsyncWeb3, address: str, nonce: int) -> str:
+        """
+        Called when a receipt never arrived. Returns "mined" (nonce used on
+        chain, possibly by a replacement), "pending" (still in the mempool -
+        kept in pending, must not be resent) or "dropped" (nonce unused in
+        both counts; the counter is resynced so it is reused).
+        """
+        mined_count = await w3.eth.get_transaction_count(address, "latest")
+        if mined_count > nonce:
+            self.confirm(nonce)
+            return "mined"
+
+        pending_count = await w3.eth.get_transaction_count(address, "pending")
+        if pending_count > nonce:
+            return "pending"
+
+        self.confirm(nonce)
+        await self.resync(w3, address)
+        return "dropped"
+
+    async def _sync(self, w3: AsyncWeb3, address: str) -> None:
+        chain_nonce = await w3.eth.get_transaction_count(address, "pending")
+        mined_count = await w3.eth.get_transaction_count(address, "latest")
+        self.pending = {n: tx for n, tx in self.pending.items() if n >= mined_count}
+        self._next_nonce = chain_nonce
+        print(f"  [NONCE] Synced from chain: next nonce {chain_nonce} ({len(self.pending)} pending)")
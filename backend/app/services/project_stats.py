@@ -0,0 +1,103 @@
+"""
+Per-project Running Aggregates
+
+Analysis totals (counts, payouts, per-status counts) are kept
+in the project document under "stats" and bumped with a single atomic $inc
+each time an analysis is stored. Analytics and enrichment read them from the
+project instead of scanning commit_analyses, so their cost does not grow
+with project history. rebuild() recomputes them from commit_analyses.
+Spend per milestone is kept separately in the milestone ledger.
+"""
+
+from datetime import datetime
+from typing import Dict
+
+from app.database import get_database
+
+# Analyses whose payout counts as spent against the budget / a milestone
+PAID_STATUSES = ("approved", "completed")
+
+EMPTY_STATS = {
+    "analyses_count": 0,
+    "commits_analyzed": 0,
+    "total_payout": 0.0,
+    "paid_payout": 0.0,
+    "gaming_detected_count": 0,
+    "status_counts": {},
+}
+
+# Fields rebuild() needs from each stored analysis
+ANALYSIS_STATS_PROJECTION = {
+    "_id": 0, "payout_amount": 1, "analysis_status": 1, "gaming_detected": 1, "commits_count": 1
+}
+
+
+def _field_key(value) -> str:
+    """Status as a document field name (no dots, no leading $)"""
+    return str(value if value is not None else "unknown").replace(".", "_").lstrip("$") or "unknown"
+
+
+class ProjectStatsService:
+    """Maintains projects.stats"""
+
+    @staticmethod
+    def build_increment(analysis_doc: Dict) -> Dict:
+        """$inc document (relative to stats) for one stored analysis"""
+        payout = analysis_doc.get("payout_amount") or 0.0
+        status = analysis_doc.get("analysis_status", "unknown")
+
+        inc = {
+            "analyses_count": 1,
+            "commits_analyzed": analysis_doc.get("commits_count") or 0,
+            "total_payout": payout,
+            f"status_counts.{_field_key(status)}": 1,
+        }
+        if analysis_doc.get("gaming_detected"):
+            inc["gaming_detected_count"] = 1
+        if status in PAID_STATUSES:
+            inc["paid_payout"] = payout
+        return inc
+
+    async def record_analysis(self, analysis_doc: Dict) -> None:
+        """Fold one stored analysis into its project's stats (single atomic update)"""
+        db = get_database()
+        inc = self.build_increment(analysis_doc)
+        await db["projects"].update_one(
+            {"project_id": analysis_doc["project_id"]},
+            {
+                "$inc": {f"stats.{key}": value for key, value in inc.items()},
+                "$set": {"stats.updated_at": datetime.utcnow()}
+            }
+        )
+
+    @staticmethod
+    def get(project: Dict) -> Dict:
+        """Stats of a loaded project document, with defaults for projects without any analyses"""
+        stats = project.get("stats") or {}
+        return {
+            **EMPTY_STATS,
+            **stats,
+            "status_counts": dict(stats.get("status_counts") or {}),
+        }
+
+    async def rebuild(self, project_id: str) -> Dict:
+        """Recompute a project's stats from all of its analyses (backfill / repair)"""
+        db = get_database()
+        stats = {**EMPTY_STATS, "status_counts": {}}
+
+        cursor = db["commit_analyses"].find({"project_id": project_id}, ANALYSIS_STATS_PROJECTION)
+        async for analysis in cursor:
+            for key, value in self.build_increment(analysis).items():
+                if "." in key:
+                    group, name = key.split(".", 1)
+                    stats[group][name] = stats[group].get(name, 0) + value
+                else:
+                    stats[key] += value
+
+        stats["updated_at"] = datetime.utcnow()
+        await db["projects"].update_one({"project_id": project_id}, {"$set": {"stats": stats}})
+        return stats
+
+
+# Singleton instance
+project_stats_service = ProjectStatsService()
@@ -0,0 +1,225 @@
+"""
+Push Ingestion Pipeline
+
+Ingest-first webhook handling: the webhook only persists the raw push payload
+(status "received") and returns. The "enrich" job then matches the project,
+filters commits by the tracked developer, fetches commit details and diffs
+(stored out-of-line in diff_blobs), and advances the push event to pending_analysis / pending_manual_review.
+"""
+
+import time
+from typing import Dict, List, Optional
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+
+from app.config import get_settings
+from app.database import get_database
+from app.services.diff_store import diff_store
+from app.services.github_service import github_service
+from app.services.job_queue import job_queue
+from app.services.metrics import PUSH_ENRICH_OUTCOMES
+from app.services.tracing import collect_spans, span
+from app.utils.lru import LRUCache
+
+settings = get_settings()
+
+
+class PushIngestService:
+    """Persists raw push events and enriches them in the background"""
+
+    def __init__(self):
+        # delivery_id -> push_id for recently seen deliveries (per process; Mongo index is authoritative)
+        self.recent_deliveries = LRUCache(max_size=settings.webhook_delivery_cache_size)
+
+    @staticmethod
+    def push_id_for(delivery_id: Optional[str]) -> str:
+        """Deterministic push ID for a delivery (timestamp-based when the header is missing)"""
+        if delivery_id:
+            return f"push_{delivery_id}"
+        return f"push_{datetime.utcnow().timestamp()}"
+
+    def seen_delivery(self, delivery_id: Optional[str]) -> Optional[str]:
+        """push_id of a recently ingested delivery, answered from memory without a DB round-trip"""
+        if not delivery_id:
+            return None
+        return self.recent_deliveries.get(delivery_id)
+
+    async def insert_push_event(self, event: Dict) -> Optional[str]:
+        """
+        Insert a push event, deduplicating on delivery_id.
+
+        Returns None on success, or the push_id of the already stored event for a redelivery.
+        """
+        delivery_id = event.get("delivery_id")
+        try:
+            await get_database()["push_events"].insert_one(event)
+        except DuplicateKeyError:
+            existing = await get_database()["push_events"].find_one({"delivery_id": delivery_id}, {"push_id": 1})
+            existing_push_id = existing["push_id"] if existing else event["push_id"]
+            print(f"[DUPLICATE] Delivery {delivery_id} already ingested as {existing_push_id}")
+            if delivery_id:
+                self.recent_deliveries.set(delivery_id, existing_push_id)
+            return existing_push_id
+
+        if delivery_id:
+            self.recent_deliveries.set(delivery_id, event["push_id"])
+        return None
+
+    @staticmethod
+    def filter_tracked_commits(commits: List[Dict], tracked_developer: str) -> List[str]:
+        """Return SHAs of commits authored by the tracked developer (username or name, case insensitive)"""
+        tracked_commits = []
+        for commit in commits:
+            commit_author = commit.get("author", {}).get("username", "")
+            commit_author_name = commit.get("author", {}).get("name", "")
+
+            if (commit_author and commit_author.lower() == tracked_developer.lower()) or \
+               (commit_author_name and commit_author_name.lower() == tracked_developer.lower()):
+                tracked_commits.append(commit["id"])  # commit SHA
+                print(f"   [MATCH] Matched commit: {commit['id'][:8]} by {commit_author or commit_author_name}")
+        return tracked_commits
+
+    async def ingest(self, payload: Dict, delivery_id: Optional[str]) -> Dict:
+        """
+        Persist a raw push payload and queue enrichment.
+
+        Redeliveries of an already stored delivery are reported as duplicates
+        (push_id is derived from the delivery ID and delivery_id is uniquely indexed).
+        """
+        push_id = self.push_id_for(delivery_id)
+        event = {
+            "push_id": push_id,
+            "repo": payload["repository"]["full_name"],
+            "ref": payload.get("ref"),
+            "pusher": payload.get("pusher", {}).get("name"),
+            "project_id": None,
+            "tracked_developer": None,
+            "commit_shas": [],
+            "commits_details": [],
+            "raw_payload": payload,
+            "status": "received",
+            "created_at": datetime.utcnow()
+        }
+        if delivery_id:
+            event["delivery_id"] = delivery_id
+
+        existing_push_id = await self.insert_push_event(event)
+        if existing_push_id:
+            return {"success": True, "duplicate": True, "push_id": existing_push_id, "status": "duplicate"}
+
+        await job_queue.enqueue("enrich", push_id)
+
+        print(f"[STORED] Ingested push event: {push_id} ({len(payload.get('commits', []))} commits)")
+        return {"success": True, "duplicate": False, "push_id": push_id, "status": "received"}
+
+    async def run_enrichment_job(self, job: Dict) -> None:
+        """
+        Job queue handler for "enrich" jobs.
+
+        Raises when no commit could be fetched so the queue retries. After the
+        last attempt the event is marked enrichment_failed (the startup
+        recovery sweep retries those).
+        """
+        db = get_database()
+        push_id = job["push_id"]
+
+        event = await db["push_events"].find_one({"push_id": push_id})
+        if not event or event.get("status") not in ("received", "enrichment_failed"):
+            print(f"[ENRICH] Skipping {push_id} - not in received state")
+            return
+
+        payload = event["raw_payload"]
+        repo_owner, repo_name = payload["repository"]["full_name"].split("/")
+
+        project = await db["projects"].find_one({
+            "repo_owner": repo_owner,
+            "repo_name": repo_name,
+            "status": "active"
+        })
+        if not project:
+            await self._ignore(push_id, "No active project found for this repository")
+            PUSH_ENRICH_OUTCOMES.labels("ignored_no_project").inc()
+            return
+
+        tracked_developer = project["github_username"]
+        tracked_commits = self.filter_tracked_commits(payload.get("commits", []), tracked_developer)
+        if not tracked_commits:
+            await self._ignore(push_id, f"No commits from tracked developer {tracked_developer}")
+            PUSH_ENRICH_OUTCOMES.labels("ignored_no_tracked_commits").inc()
+            return
+
+        started = time.perf_counter()
+        with collect_spans() as spans:
+            with span("github.fetch_commits", commits=len(tracked_commits)):
+                fetch_results = await github_service.fetch_commits(
+                    project["installation_id"],
+                    repo_owner,
+                    repo_name,
+                    tracked_commits
+                )
+            commits_details = [r["commit"] for r in fetch_results if r["error"] is None]
+            fetch_errors = {r["sha"]: r["error"] for r in fetch_results if r["error"] is not None}
+
+            if not commits_details:
+                if job["attempts"] >= job["max_attempts"]:
+                    await self._mark_enrichment_failed(push_id, project["project_id"], fetch_errors)
+                raise RuntimeError(f"Failed to fetch all {len(fetch_errors)} commits")
+
+            # Diffs live in diff_blobs; the push event keeps diff_ref/diff_length
+            with span("mongo.diff_offload", commits=len(commits_details)):
+                commits_details = await diff_store.offload(commits_details)
+        ingest_timings = {"total_ms": round((time.perf_counter() - started) * 1000, 1), "spans": spans}
+
+        evaluation_mode = project.get("evaluation_mode", "manual")
+        status = "pending_manual_review" if evaluation_mode == "manual" else "pending_analysis"
+
+        await db["push_events"].update_one(
+            {"push_id": push_id},
+            {
+                "$set": {
+                    "project_id": project["project_id"],
+                    "tracked_developer": tracked_developer,
+                    "commit_shas": tracked_commits,
+                    "commits_details": commits_details,
+                    "fetch_errors": fetch_errors,
+                    "status": status,
+                    "ingest_timings": ingest_timings,
+                    "enriched_at": datetime.utcnow()
+                },
+                "$unset": {"raw_payload": ""}
+            }
+        )
+        print(f"[ENRICH] {push_id}: {len(commits_details)} commits fetched ({len(fetch_errors)} failed) -> {status}")
+        PUSH_ENRICH_OUTCOMES.labels(status).inc()
+
+        if status == "pending_analysis":
+            await job_queue.enqueue("analysis", push_id, project["project_id"])
+
+    async def _mark_enrichment_failed(self, push_id: str, project_id: str, fetch_errors: Dict[str, str]) -> None:
+        """Give up on a push whose commits could not be fetched (raw payload kept for a later retry)"""
+        await get_database()["push_events"].update_one(
+            {"push_id": push_id},
+            {"$set": {
+                "status": "enrichment_failed",
+                "project_id": project_id,
+                "fetch_errors": fetch_errors,
+                "enriched_at": datetime.utcnow()
+            }}
+        )
+        PUSH_ENRICH_OUTCOMES.labels("enrichment_failed").inc()
+        print(f"[ENRICH] {push_id} failed: none of {len(fetch_errors)} commits could be fetched")
+
+    async def _ignore(self, push_id: str, reason: str) -> None:
+        """Mark a push event as not relevant to any tracked project (kept out of project listings)"""
+        await get_database()["push_events"].update_one(
+            {"push_id": push_id},
+            {
+                "$set": {"status": "ignored", "ignore_reason": reason, "enriched_at": datetime.utcnow()},
+                "$unset": {"raw_payload": ""}
+            }
+        )
+        print(f"[ENRICH] {push_id} ignored: {reason}")
+
+
+# Singleton instance
+push_ingest_service = PushIngestService()
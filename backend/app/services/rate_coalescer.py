@@ -0,0 +1,202 @@
+"""
+Coalesced changeRate Updates
+
+Every analyzed push asks for a new stream rate, but only the latest rate per
+stream matters. Requests are merged into one pending rate_updates document
+per (treasury_address, stream_id); when the window closes, a single changeRate
+transaction is sent with the latest rate and the document records every push
+it covered. Pending documents survive restarts and are flushed on startup;
+documents stuck in "sending" (the process died mid-send) are resent, which
+is safe because the rate is absolute.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Set, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config import get_settings
+from app.database import get_database
+from app.models.rate_update import RateUpdate
+from app.services.blockchain_service import blockchain_service
+
+settings = get_settings()
+
+StreamKey = Tuple[str, int]
+
+
+class RateUpdateCoalescer:
+    """Debounces changeRate calls per stream within a configurable window"""
+
+    def __init__(self):
+        self._timers: Dict[StreamKey, asyncio.Task] = {}
+        self._resends: Set[asyncio.Task] = set()
+
+    @property
+    def collection(self):
+        return get_database()["rate_updates"]
+
+    async def submit(self, treasury_address: str, stream_id: int, new_rate: int, push_id: str) -> Dict:
+        """
+        Request a rate change; merged with any pending request for the same stream.
+
+        Returns a summary of the pending update (the transaction is sent when the window closes).
+        """
+        key = (treasury_address.lower(), int(stream_id))
+        now = datetime.utcnow()
+        window = settings.rate_coalesce_window_seconds
+
+        pending = RateUpdate(
+            treasury_address=key[0],
+            stream_id=key[1],
+            new_rate=new_rate,
+            flush_after=now + timedelta(seconds=window)
+        ).model_dump(exclude={"new_rate", "push_ids", "updated_at"})
+
+        for attempt in range(2):
+            try:
+                update = await self.collection.find_one_and_update(
+                    {"treasury_address": key[0], "stream_id": key[1], "status": "pending"},
+                    {
+                        "$set": {"new_rate": new_rate, "updated_at": now},
+                        "$addToSet": {"push_ids": push_id},  # A retried analysis job submits again
+                        "$setOnInsert": pending
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                break
+            except DuplicateKeyError:
+                if attempt:
+                    raise  # Concurrent upsert created the pending doc - retry merges into it
+
+        print(f"  [COALESCE] Stream {key[1]}: rate {new_rate} queued ({len(update['push_ids'])} push(es) in window)")
+
+        delay = max((update["flush_after"] - now).total_seconds(), 0)
+        self._schedule(key, delay)
+
+        return {
+            "success": True,
+            "coalesced": True,
+            "rate_update_id": str(update["_id"]),
+            "flush_after": update["flush_after"].isoformat(),
+            "covered_push_ids": update["push_ids"],
+            "stream_id": key[1],
+            "new_rate": new_rate,
+        }
+
+    def _schedule(self, key: StreamKey, delay: float) -> None:
+        timer = self._timers.get(key)
+        if timer is None or timer.done():
+            self._timers[key] = asyncio.create_task(self._flush_after(key, delay))
+
+    async def _flush_after(self, key: StreamKey, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._timers.pop(key, None)
+        await self.flush(key)
+
+    async def flush(self, key: StreamKey) -> None:
+        """Send the pending update for a stream (no-op if another worker already claimed it)"""
+        update = await self.collection.find_one_and_update(
+            {"treasury_address": key[0], "stream_id": key[1], "status": "pending"},
+            {"$set": {"status": "sending", "sent_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if update:
+            await self._send(update)
+
+    async def resend(self, update_id) -> None:
+        """
+        Resend an update left in "sending" by a process that died mid-send.
+
+        Only claimed once the original send must have timed out; skipped if a
+        newer update for the stream exists (its rate supersedes this one).
+        """
+        now = datetime.utcnow()
+        update = await self.collection.find_one_and_update(
+            {"_id": update_id, "status": "sending", "sent_at": {"$lt": self._stale_before(now)}},
+            {"$set": {"sent_at": now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not update:
+            return
+
+        newer = await self.collection.find_one({
+            "treasury_address": update["treasury_address"],
+            "stream_id": update["stream_id"],
+            "created_at": {"$gt": update["created_at"]}
+        }, {"_id": 1})
+        if newer:
+            await self.collection.update_one(
+                {"_id": update["_id"]},
+                {"$set": {"status": "superseded", "updated_at": now}}
+            )
+            print(f"  [COALESCE] Stream {update['stream_id']}: stuck update superseded by a newer one")
+            return
+
+        await self._send(update)
+
+    @staticmethod
+    def _stale_before(now: datetime) -> datetime:
+        """A "sending" update last claimed before this has outlived any send + receipt wait"""
+        return now - timedelta(seconds=settings.rpc_timeout + settings.tx_receipt_timeout)
+
+    async def _send(self, update: Dict) -> None:
+        key = (update["treasury_address"], update["stream_id"])
+        print(f"  [COALESCE] Stream {key[1]}: sending rate {update['new_rate']} for {len(update['push_ids'])} push(es)")
+        result = await blockchain_service.change_rate(
+            treasury_address=key[0],
+            stream_id=key[1],
+            new_rate=update["new_rate"],
+        )
+
+        await self.collection.update_one(
+            {"_id": update["_id"]},
+            {"$set": {
+                # submitted: broadcast but unconfirmed at the receipt timeout - still in the mempool
+                "status": "sent" if result.get("success") else "submitted" if result.get("pending") else "failed",
+                "tx_hash": result.get("tx_hash"),
+                "error": result.get("error"),
+                "updated_at": datetime.utcnow()
+            }}
+        )
+
+    async def recover(self) -> None:
+        """Schedule flushes for pending updates, and resends for stuck ones, left by a previous process"""
+        now = datetime.utcnow()
+        pending = await self.collection.find(
+            {"status": "pending"},
+            {"treasury_address": 1, "stream_id": 1, "flush_after": 1}
+        ).to_list(length=None)
+
+        for update in pending:
+            delay = max((update["flush_after"] - now).total_seconds(), 0)
+            self._schedule((update["treasury_address"], update["stream_id"]), delay)
+
+        stuck = await self.collection.find(
+            {"status": "sending", "sent_at": {"$lt": self._stale_before(now)}},
+            {"_id": 1}
+        ).sort("created_at", 1).to_list(length=None)
+
+        for update in stuck:
+            task = asyncio.create_task(self.resend(update["_id"]))
+            self._resends.add(task)
+            task.add_done_callback(self._resends.discard)
+
+        if pending:
+            print(f"[RECOVERY] Scheduled {len(pending)} pending rate updates")
+        if stuck:
+            print(f"[RECOVERY] Resending {len(stuck)} rate updates interrupted mid-send")
+
+    async def flush_all(self) -> None:
+        """Send every pending update now (called on shutdown)"""
+        keys = list(self._timers)
+        for key in keys:
+            self._timers.pop(key).cancel()
+        await asyncio.gather(*(self.flush(key) for key in keys), return_exceptions=True)
+
+
+# Singleton instance
+rate_coalescer = RateUpdateCoalescer()
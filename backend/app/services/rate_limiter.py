@@ -0,0 +1,120 @@
+"""
+Adaptive LLM Rate Limiter
+
+Token buckets for requests-per-minute and tokens-per-minute per provider.
+Callers only wait when a bucket is actually empty, and a 429 response pauses
+the provider for the server-supplied retry-after.
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional
+
+from app.config import get_settings
+
+
+class TokenBucket:
+    """Continuously refilling bucket: capacity units per 60 seconds"""
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.refill_per_second = capacity / 60.0
+        self.available = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until amount units are available (0 if available now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.refill_per_second
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.available -= amount
+
+    def refund(self, amount: float) -> None:
+        """Return (or, if negative, charge) units once the real cost is known"""
+        self._refill()
+        self.available = min(self.capacity, self.available + amount)
+
+
+class ProviderRateLimiter:
+    """Request and token buckets for one LLM provider"""
+
+    def __init__(self, provider: str, requests_per_minute: int, tokens_per_minute: int):
+        self.provider = provider
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, estimated_tokens: int) -> float:
+        """
+        Wait until one request and estimated_tokens are available, then take them.
+
+        Returns the number of seconds spent waiting.
+        """
+        waited = 0.0
+        async with self._lock:  # FIFO among waiting callers
+            while True:
+                delay = max(
+                    self._blocked_until - time.monotonic(),
+                    self.requests.delay_for(1),
+                    self.tokens.delay_for(estimated_tokens)
+                )
+                if delay <= 0:
+                    self.requests.consume(1)
+                    self.tokens.consume(estimated_tokens)
+                    return waited
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Correct the token bucket with the usage reported by the provider"""
+        self.tokens.refund(estimated_tokens - actual_tokens)
+
+    def penalize(self, retry_after: float) -> None:
+        """Pause all calls to this provider after a 429"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+
+_limiters: Dict[str, ProviderRateLimiter] = {}
+
+
+def get_rate_limiter(provider: str) -> ProviderRateLimiter:
+    """Shared limiter for a provider ("openai", "claude" or "gemini")"""
+    if provider not in _limiters:
+        settings = get_settings()
+        rpm = getattr(settings, f"{provider}_rpm_limit")
+        tpm = getattr(settings, f"{provider}_tpm_limit")
+        _limiters[provider] = ProviderRateLimiter(provider, rpm, tpm)
+    return _limiters[provider]
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Seconds to back off if error is a provider 429 (None for any other error).
+
+    Uses the retry-after / retry-after-ms headers when the SDK exposes the response.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429:
+        return None
+
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return get_settings().llm_default_backoff_seconds
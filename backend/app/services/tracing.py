@@ -0,0 +1,58 @@
+"""
+Lightweight Spans
+
+span() times an operation, exports it to the span_seconds histogram and, if
+a collect_spans() block is active in the current task (or the task that
+spawned it), appends a structured record that the caller stores alongside
+the push event. No tracing backend is involved.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from app.services.metrics import SPAN_SECONDS
+
+MAX_SPANS = 200  # Bound the stored list (pushes with many commits produce one span per fetch)
+
+_trace: ContextVar[Optional[Dict]] = ContextVar("trace", default=None)
+
+
+@contextmanager
+def collect_spans() -> Iterator[List[Dict]]:
+    """Collect spans recorded inside the block; offsets are relative to its start"""
+    trace = {"started": time.perf_counter(), "spans": []}
+    token = _trace.set(trace)
+    try:
+        yield trace["spans"]
+    finally:
+        _trace.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Dict]:
+    """
+    Time the block as span `name`.
+
+    Yields the attributes dict so the block can add results (token counts,
+    sizes) to the record. Status is "error" if the block raises.
+    """
+    started = time.perf_counter()
+    status = "error"
+    try:
+        yield attributes
+        status = "ok"
+    finally:
+        duration = time.perf_counter() - started
+        SPAN_SECONDS.labels(name, status).observe(duration)
+
+        trace = _trace.get()
+        if trace is not None and len(trace["spans"]) < MAX_SPANS:
+            trace["spans"].append({
+                "name": name,
+                "offset_ms": round((started - trace["started"]) * 1000, 1),
+                "duration_ms": round(duration * 1000, 1),
+                "status": status,
+                "attributes": attributes
+            })
@@ -0,0 +1,162 @@
+"""
+Token-budgeted diff condensation for LLM prompts.
+
+Instead of keeping the first N characters of a diff (mostly headers and the
+first file), the diff is parsed into hunks, lockfiles and generated files are
+dropped, hunks are ranked by how much real code they change and the best
+ones are packed into a token budget. Output is bounded by the budget.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.diff_parser import FileDiff, Hunk, is_generated_path, parse_diff
+from app.utils.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+# Lines that add little signal on their own
+_TRIVIAL_LINE = re.compile(
+    r"^\s*(#|//|/\*|\*|--|<!--)|^\s*(import|from|using|require|include|package)\b|^\s*[{}()\[\];,]*\s*$"
+)
+_DEFINITION = re.compile(r"^\s*(async\s+)?(def|class|function|fn|func|interface|struct|enum|contract|export)\b")
+
+DOC_SUFFIXES = (".md", ".rst", ".txt", ".adoc")
+MIN_HUNK_TOKENS = 24  # Don't bother packing a partial hunk smaller than this
+
+
+def _is_test_path(path: str) -> bool:
+    lowered = path.lower()
+    return "test" in lowered.rsplit("/", 1)[-1] or "/tests/" in f"/{lowered}" or "__tests__" in lowered
+
+
+def score_hunk(path: str, hunk: Hunk) -> float:
+    """Signal of a hunk: meaningful changed lines, with definitions weighted up and docs/tests down"""
+    score = 0.0
+    for line in hunk.added + hunk.removed:
+        if not line.strip() or _TRIVIAL_LINE.match(line):
+            continue
+        score += 3.0 if _DEFINITION.match(line) else 1.0
+
+    if path.lower().endswith(DOC_SUFFIXES):
+        score *= 0.3
+    elif _is_test_path(path):
+        score *= 0.6
+    return score
+
+
+def _render_hunk(hunk: Hunk, max_tokens: Optional[int] = None) -> Tuple[str, bool]:
+    """Hunk as text (removed then added lines); cut to max_tokens if given. Returns (text, truncated)"""
+    lines = [hunk.header] + [f"-{line}" for line in hunk.removed] + [f"+{line}" for line in hunk.added]
+    text = "\n".join(lines)
+    if max_tokens is None or estimate_tokens(text) <= max_tokens:
+        return text, False
+
+    kept, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line + "\n")
+        if used + cost > max_tokens - 8:  # Leave room for the marker line
+            break
+        kept.append(line)
+        used += cost
+    kept.append(f"... ({len(lines) - len(kept)} more lines)")
+    return "\n".join(kept), True
+
+
+def condense_diff(diff: str, token_budget: int) -> Dict:
+    """
+    Condense one diff into at most token_budget (estimated) tokens.
+
+    Returns {"text", "tokens", "truncated", "omitted_hunks", "skipped_files"}.
+    """
+    files = parse_diff(diff or "")
+    if not any(f.hunks for f in files):
+        # Nothing to rank (empty, binary-only or not a unified diff)
+        text = (diff or "")[:token_budget * CHARS_PER_TOKEN]
+        return {"text": text, "tokens": estimate_tokens(text), "truncated": len(diff or "") > len(text),
+                "omitted_hunks": 0, "skipped_files": []}
+
+    skipped = [f.path for f in files if is_generated_path(f.path) or f.binary]
+    candidates: List[Tuple[float, int, int, FileDiff, Hunk]] = []
+    for file_index, f in enumerate(files):
+        if f.path in skipped:
+            continue
+        for hunk_index, hunk in enumerate(f.hunks):
+            candidates.append((score_hunk(f.path, hunk), file_index, hunk_index, f, hunk))
+
+    # Highest signal first; ties keep diff order
+    candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+
+    footer_reserve = min(48, token_budget // 5)  # Room for the omitted/skipped note
+    remaining = max(token_budget - footer_reserve, 0)
+    selected: Dict[Tuple[int, int], str] = {}
+    truncated = False
+    for score, file_index, hunk_index, f, hunk in candidates:
+        header_cost = 0 if any(key[0] == file_index for key in selected) else estimate_tokens(f"File: {f.path}\n")
+        available = remaining - header_cost
+        if available < MIN_HUNK_TOKENS:
+            truncated = True
+            continue
+
+        text, cut = _render_hunk(hunk, available)
+        cost = estimate_tokens(text + "\n")
+        if cost > available:  # The marker alone can exceed a tiny window
+            truncated = True
+            continue
+        selected[(file_index, hunk_index)] = text
+        remaining -= cost + header_cost
+        truncated = truncated or cut
+
+    # Emit selected hunks in their original order, grouped by file
+    parts = []
+    current_file = None
+    for file_index, hunk_index in sorted(selected):
+        if file_index != current_file:
+            current_file = file_index
+            parts.append(f"File: {files[file_index].path}")
+        parts.append(selected[(file_index, hunk_index)])
+
+    omitted = len(candidates) - len(selected)
+    notes = []
+    if omitted:
+        notes.append(f"{omitted} lower-signal hunk(s) omitted")
+    if skipped:
+        names = [path.rsplit("/", 1)[-1] for path in skipped[:3]]
+        notes.append(f"skipped generated/binary: {', '.join(names)}{' ...' if len(skipped) > 3 else ''}")
+    if notes:
+        parts.append(f"... ({'; '.join(notes)})")
+
+    text = "\n".join(parts)
+    return {"text": text, "tokens": estimate_tokens(text), "truncated": truncated or omitted > 0,
+            "omitted_hunks": omitted, "skipped_files": skipped}
+
+
+def condense_commits(diffs: List[str], token_budget: int) -> List[str]:
+    """
+    Condense several commit diffs into one shared budget.
+
+    Each diff first gets an equal share; budget left over by small diffs is
+    then handed to the ones that were cut. If there are too many diffs for
+    each to get MIN_HUNK_TOKENS, only the first ones are condensed and the
+    entry after them says how many were left out (the rest are empty), so
+    the total still fits the budget. Returns one text per diff.
+    """
+    if not diffs:
+        return []
+
+    if len(diffs) * MIN_HUNK_TOKENS > token_budget:
+        note_budget = estimate_tokens(f"... (diffs of {len(diffs)} more commits omitted)")
+        funded = max((token_budget - note_budget) // MIN_HUNK_TOKENS, 0)
+        omitted = len(diffs) - funded
+        texts = condense_commits(diffs[:funded], token_budget - note_budget)
+        return texts + [f"... (diffs of {omitted} more commits omitted)"] + [""] * (omitted - 1)
+
+    share = max(token_budget // len(diffs), MIN_HUNK_TOKENS)
+    results = [condense_diff(diff, share) for diff in diffs]
+
+    cut = [i for i, r in enumerate(results) if r["truncated"]]
+    leftover = token_budget - share * len(cut) - sum(r["tokens"] for r in results if not r["truncated"])
+    if leftover > 0 and cut:
+        extra = leftover // len(cut)
+        for i in cut:
+            results[i] = condense_diff(diffs[i], share + extra)
+
+    return [r["text"] for r in results]
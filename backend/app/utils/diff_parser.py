@@ -0,0 +1,264 @@
+"""
+Unified diff parser.
+
+Splits a `git diff` / GitHub commit diff into per-file changes and hunks.
+DiffParser consumes the diff line by line and hands back each file as soon
+as it is complete, so large diffs can be parsed straight from an HTTP stream
+with per-file and per-commit size caps and running stats.
+"""
+
+import re
+from dataclasses import asdict, dataclass, field
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+_HUNK_HEADER = re.compile(r"^@@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? @@")
+
+# Dependency lockfiles and build output - changes here are produced by tools, not written
+LOCKFILE_NAMES = {
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "bun.lockb",
+    "poetry.lock", "Pipfile.lock", "uv.lock", "Cargo.lock", "Gemfile.lock", "composer.lock",
+    "go.sum", "flake.lock", "packages.lock.json", "Podfile.lock", "pubspec.lock", "mix.lock",
+}
+GENERATED_SUFFIXES = (
+    ".min.js", ".min.css", ".map", ".pyc", ".pyo", ".class", ".o", ".so", ".dll", ".exe",
+    "_pb2.py", "_pb2_grpc.py", ".pb.go", ".generated.ts", ".g.dart",
+)
+# Tool-owned at any depth
+GENERATED_DIRS = ("node_modules/", "__pycache__/", ".next/", ".venv/")
+# Build output only at the repo root - src/build/ or app/out/ are ordinary source directories
+ROOT_GENERATED_DIRS = ("dist/", "build/", "out/", "vendor/", "coverage/", "target/", "venv/")
+
+
+@dataclass
+class Hunk:
+    header: str
+    lines: List[str] = field(default_factory=list)  # Raw hunk lines ("+", "-", " " or "\\" prefixed)
+
+    @property
+    def added(self) -> List[str]:
+        return [line[1:] for line in self.lines if line.startswith("+")]
+
+    @property
+    def removed(self) -> List[str]:
+        return [line[1:] for line in self.lines if line.startswith("-")]
+
+
+@dataclass
+class FileDiff:
+    path: str
+    old_path: Optional[str] = None
+    status: str = "modified"  # added, removed, modified, renamed
+    binary: bool = False
+    header_lines: List[str] = field(default_factory=list)  # diff --git, index, ---/+++, rename ...
+    hunks: List[Hunk] = field(default_factory=list)
+    truncated: bool = False  # Hit the per-file (or per-commit) size cap - later lines were dropped
+    size: int = 0  # Bytes kept
+
+    @property
+    def added(self) -> List[str]:
+        return [line for hunk in self.hunks for line in hunk.added]
+
+    @property
+    def removed(self) -> List[str]:
+        return [line for hunk in self.hunks for line in hunk.removed]
+
+    def render(self) -> str:
+        """Back to unified diff text (what was kept)"""
+        lines = list(self.header_lines)
+        for hunk in self.hunks:
+            lines.append(hunk.header)
+            lines.extend(hunk.lines)
+        if self.truncated:
+            lines.append("[diff truncated: size limit reached]")
+        return "\n".join(lines)
+
+
+@dataclass
+class DiffStats:
+    """Counts over the whole diff, including lines dropped by the size caps"""
+    files: int = 0
+    hunks: int = 0
+    added_lines: int = 0
+    removed_lines: int = 0
+    binary_files: int = 0
+    bytes_read: int = 0
+    truncated_files: List[str] = field(default_factory=list)
+    truncated: bool = False  # Per-commit cap hit - the rest of the diff was not read
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _strip_prefix(path: str) -> str:
+    return path[2:] if path[:2] in ("a/", "b/") else path
+
+
+class DiffParser:
+    """
+    Incremental unified diff parser.
+
+    Args:
+        max_file_bytes: Keep at most this many bytes of any one file (later lines only counted)
+        max_total_bytes: Stop parsing once this many bytes have been kept in total
+    """
+
+    def __init__(self, max_file_bytes: Optional[int] = None, max_total_bytes: Optional[int] = None):
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.stats = DiffStats()
+        self._current: Optional[FileDiff] = None
+        self._hunk: Optional[Hunk] = None
+        self._old_left = self._new_left = 0  # Lines still expected in the current hunk (from its header)
+        self._kept = 0
+
+    @property
+    def exhausted(self) -> bool:
+        """True once the per-commit cap was hit; further input is ignored"""
+        return self.stats.truncated
+
+    def feed(self, line: str) -> Optional[FileDiff]:
+        """Consume one line (without its newline). Returns the previous file when this line starts a new one."""
+        if self.stats.truncated:
+            return None
+        self.stats.bytes_read += len(line) + 1
+
+        if self._hunk is not None and (
+            line.startswith("\\")  # "\ No newline at end of file" follows the hunk's last line
+            or (self._old_left > 0 or self._new_left > 0) and line[:1] in ("+", "-", " ", "")
+        ):
+            self._hunk_line(line)
+            return None
+
+        finished = None
+        header = _HUNK_HEADER.match(line)
+        if header:
+            if self._current is None:  # Bare patch without file headers
+                self._start_file(FileDiff(path=""))
+            self._hunk = Hunk(header=line)
+            self._old_left = int(header.group(1) or 1)
+            self._new_left = int(header.group(2) or 1)
+            self.stats.hunks += 1
+            if self._keep(line):
+                self._current.hunks.append(self._hunk)
+            return None
+
+        self._hunk = None
+        if line.startswith("diff --git "):
+            parts = line[len("diff --git "):].split(" b/", 1)
+            old_path = _strip_prefix(parts[0])
+            finished = self._start_file(FileDiff(path=parts[1] if len(parts) > 1 else old_path, old_path=old_path))
+        elif line.startswith("--- "):
+            if self._current is None or self._current.hunks:  # Patch without a diff --git header
+                finished = self._start_file(FileDiff(path=""))
+            if line == "--- /dev/null":
+                self._current.status = "added"
+            else:
+                self._current.old_path = _strip_prefix(line[4:])
+        elif self._current is None:
+            return None  # Preamble before the first file
+        elif line.startswith("+++ "):
+            if line == "+++ /dev/null":
+                self._current.status = "removed"
+                self._current.path = self._current.path or self._current.old_path or ""
+            else:
+                self._current.path = _strip_prefix(line[4:])
+        elif line.startswith("rename from "):
+            self._current.status = "renamed"
+        elif line.startswith("Binary files ") or line == "GIT binary patch":
+            if not self._current.binary:
+                self._current.binary = True
+                self.stats.binary_files += 1
+
+        # Anything else after the hunks (e.g. our truncation marker) is not part of the file header
+        if self._current is not None and not self._current.hunks and self._keep(line):
+            self._current.header_lines.append(line)
+        return finished
+
+    def close(self) -> Optional[FileDiff]:
+        """End of input: returns the last file, if any"""
+        return self._finish_file()
+
+    def parse_lines(self, lines: Iterable[str]) -> Iterator[FileDiff]:
+        """Parse an iterable of lines, yielding each file as it completes"""
+        for line in lines:
+            finished = self.feed(line)
+            if finished is not None:
+                yield finished
+            if self.exhausted:
+                break
+        last = self.close()
+        if last is not None:
+            yield last
+
+    async def stream(self, lines: AsyncIterable[str]) -> AsyncIterator[FileDiff]:
+        """Parse an async line stream (e.g. httpx Response.aiter_lines()); stops reading at the per-commit cap"""
+        async for line in lines:
+            finished = self.feed(line)
+            if finished is not None:
+                yield finished
+            if self.exhausted:
+                break
+        last = self.close()
+        if last is not None:
+            yield last
+
+    def _hunk_line(self, line: str) -> None:
+        if line.startswith("+"):
+            self._new_left -= 1
+            self.stats.added_lines += 1
+        elif line.startswith("-"):
+            self._old_left -= 1
+            self.stats.removed_lines += 1
+        elif not line.startswith("\\"):
+            self._old_left -= 1
+            self._new_left -= 1
+
+        if self._keep(line):  # Once a file hits its cap nothing later is kept, so the hunk is always attached
+            self._hunk.lines.append(line)
+
+    def _keep(self, line: str) -> bool:
+        """Account for a line against the size caps; False if it has to be dropped"""
+        current = self._current
+        if current.truncated:
+            return False
+
+        cost = len(line) + 1
+        if self.max_total_bytes is not None and self._kept + cost > self.max_total_bytes:
+            current.truncated = True
+            self.stats.truncated = True
+            return False
+        if self.max_file_bytes is not None and current.size + cost > self.max_file_bytes:
+            current.truncated = True
+            return False
+
+        current.size += cost
+        self._kept += cost
+        return True
+
+    def _start_file(self, file_diff: FileDiff) -> Optional[FileDiff]:
+        finished = self._finish_file()
+        self._current = file_diff
+        self.stats.files += 1
+        return finished
+
+    def _finish_file(self) -> Optional[FileDiff]:
+        finished, self._current, self._hunk = self._current, None, None
+        if finished is not None and finished.truncated:
+            self.stats.truncated_files.append(finished.path or finished.old_path or "")
+        return finished
+
+
+def parse_diff(diff: str) -> List[FileDiff]:
+    """Parse a whole unified diff string into files and hunks (no size caps)"""
+    return list(DiffParser().parse_lines(diff.splitlines()))
+
+
+def is_generated_path(path: str) -> bool:
+    """True for lockfiles, minified/compiled artifacts and build output directories"""
+    normalized = path.replace("\\", "/")
+    name = normalized.rsplit("/", 1)[-1]
+    if name in LOCKFILE_NAMES or normalized.endswith(GENERATED_SUFFIXES):
+        return True
+    if normalized.startswith(ROOT_GENERATED_DIRS):
+        return True
+    return any(normalized.startswith(d) or f"/{d}" in normalized for d in GENERATED_DIRS)
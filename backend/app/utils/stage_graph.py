@@ -0,0 +1,115 @@
+"""
+Small async DAG runner for multi-stage workflows.
+
+Each stage is started as soon as all of its dependencies have finished, so
+independent stages run concurrently. Every stage's start offset, duration
+and outcome is recorded so the caller can see where the wall time goes.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[Dict[str, Any]], Awaitable[Any]]  # Receives the results of finished stages by name
+    depends_on: Tuple[str, ...] = ()
+
+
+class StageFailed(Exception):
+    """A stage raised; carries the timings recorded up to the failure"""
+
+    def __init__(self, stage: str, error: BaseException, timings: Dict):
+        super().__init__(f"Stage {stage} failed: {error}")
+        self.stage = stage
+        self.error = error
+        self.timings = timings
+
+
+class StageGraph:
+    """
+    Validated set of stages (unique names, known dependencies, no cycles).
+
+    run() returns (results, timings) where timings is
+    {"total_ms", "stages": {name: {"offset_ms", "duration_ms", "status"}}}.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage: {stage.name}")
+            self.stages[stage.name] = stage
+
+        for stage in stages:
+            missing = [d for d in stage.depends_on if d not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on unknown stage(s): {', '.join(missing)}")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order, visiting, done = [], set(), set()
+
+        def visit(name: str):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage dependency cycle through {name}")
+            visiting.add(name)
+            for dep in self.stages[name].depends_on:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    async def run(self) -> Tuple[Dict[str, Any], Dict]:
+        results: Dict[str, Any] = {}
+        stage_timings: Dict[str, Dict] = {}
+        started = time.perf_counter()
+
+        def elapsed_ms(since: float) -> float:
+            return round((time.perf_counter() - since) * 1000, 1)
+
+        async def run_stage(stage: Stage):
+            if stage.depends_on:
+                await asyncio.gather(*(tasks[d] for d in stage.depends_on))
+            offset = elapsed_ms(started)
+            stage_started = time.perf_counter()
+            status = "failed"
+            try:
+                results[stage.name] = await stage.run(results)
+                status = "ok"
+            except asyncio.CancelledError:
+                status = "cancelled"
+                raise
+            finally:
+                stage_timings[stage.name] = {
+                    "offset_ms": offset,
+                    "duration_ms": elapsed_ms(stage_started),
+                    "status": status
+                }
+
+        tasks: Dict[str, asyncio.Task] = {}
+        for name in self.order:  # Dependencies first, so every awaited task exists
+            tasks[name] = asyncio.ensure_future(run_stage(self.stages[name]))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except Exception as e:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            failed = next(
+                (name for name, timing in stage_timings.items() if timing["status"] == "failed"),
+                "unknown"
+            )
+            raise StageFailed(failed, e, {"total_ms": elapsed_ms(started), "stages": stage_timings}) from e
+
+        return results, {"total_ms": elapsed_ms(started), "stages": stage_timings}
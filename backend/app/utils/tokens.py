@@ -0,0 +1,40 @@
+"""
+Cheap token estimation for prompt budgeting and rate limiting, and model
+spend estimates from reported token usage.
+"""
+
+import math
+from typing import Optional
+
+# Rough average for English text and code with OpenAI/Anthropic tokenizers
+CHARS_PER_TOKEN = 4
+
+# USD per 1M (input, output) tokens, matched by longest model-name prefix.
+# List prices - update when providers change pricing.
+MODEL_PRICES_PER_MTOK = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-3-haiku": (0.25, 1.25),
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text (about 4 characters per token)"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> Optional[float]:
+    """Estimated USD cost of a call, or None for models without a known price"""
+    matches = [prefix for prefix in MODEL_PRICES_PER_MTOK if model.startswith(prefix)]
+    if not matches:
+        return None
+    input_price, output_price = MODEL_PRICES_PER_MTOK[max(matches, key=len)]
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
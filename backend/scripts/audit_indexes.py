@@ -0,0 +1,49 @@
+"""
+Ensure MongoDB indexes and audit the query plans of every known hot query.
+
+Fails (exit code 1) if any query in app.database.KNOWN_QUERIES is planned as a
+collection scan (COLLSCAN).
+
+Usage (from the backend directory):
+    python scripts/audit_indexes.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database import (  # noqa: E402
+    connect_to_mongo,
+    close_mongo_connection,
+    explain_known_queries
+)
+
+
+async def main() -> int:
+    await connect_to_mongo()
+    try:
+        results = await explain_known_queries()
+    finally:
+        await close_mongo_connection()
+
+    print()
+    print(f"{'COLLECTION':<18} {'QUERY':<32} PLAN")
+    print("-" * 80)
+    for r in results:
+        marker = "[COLLSCAN]" if r["collscan"] else "[OK]"
+        print(f"{r['collection']:<18} {r['name']:<32} {marker} {' <- '.join(r['stages'])}")
+
+    failures = [r for r in results if r["collscan"]]
+    print()
+    if failures:
+        print(f"[FAILED] {len(failures)} of {len(results)} queries use a collection scan")
+        return 1
+
+    print(f"[OK] All {len(results)} queries use an index")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,53 @@
+"""
+Rebuild the running per-project analysis stats (projects.stats) and the
+per-milestone spend ledger (milestone_ledger).
+
+Both are updated incrementally as analyses are stored; this recomputes them
+from commit_analyses for projects created before that, or to repair drift.
+Run while no analysis jobs are being processed - an analysis stored during
+a project's rebuild can be counted twice or not at all.
+
+Usage (from the backend directory):
+    python scripts/backfill_project_stats.py [--project proj_abc123]
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database import connect_to_mongo, close_mongo_connection, get_database  # noqa: E402
+from app.services.project_stats import project_stats_service  # noqa: E402
+from app.services.milestone_ledger import milestone_ledger_service  # noqa: E402
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--project", help="only rebuild this project_id")
+    args = parser.parse_args()
+
+    await connect_to_mongo()
+    try:
+        if args.project:
+            project_ids = [args.project]
+        else:
+            project_ids = await get_database()["projects"].distinct("project_id")
+
+        for project_id in project_ids:
+            stats = await project_stats_service.rebuild(project_id)
+            ledger = await milestone_ledger_service.rebuild(project_id)
+            print(
+                f"[REBUILT] {project_id}: {stats['analyses_count']} analyses, "
+                f"${stats['paid_payout']:.2f} paid across {len(ledger)} milestone(s)"
+            )
+    finally:
+        await close_mongo_connection()
+
+    print(f"[OK] Rebuilt stats for {len(project_ids)} project(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,144 @@
+"""
+Benchmark the two-call and single-pass analysis pipelines.
+
+Runs every recorded push in scripts/fixtures/analysis_pushes.json through
+both pipelines (gaming detection + holistic analysis vs. one combined call)
+and reports wall-clock latency, model calls and token usage per pipeline.
+The enrichment step (milestones, history, budget) is recorded in the fixture
+so no MongoDB connection is needed. The LLM response cache is disabled.
+
+Requires OPENAI_API_KEY. Usage (from the backend directory):
+    python scripts/benchmark_analysis.py [--runs 3] [--fixtures path.json] [--output results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import get_settings  # noqa: E402
+from app.services.llm_service import llm_service, track_usage  # noqa: E402
+
+DEFAULT_FIXTURES = Path(__file__).resolve().parent / "fixtures" / "analysis_pushes.json"
+
+
+async def run_two_pass(case: dict, context: dict) -> dict:
+    gaming_result = await llm_service.detect_gaming(case["commits_details"])
+    analysis = await llm_service.holistic_analysis(
+        commits_details=case["commits_details"],
+        gaming_result=gaming_result,
+        **context
+    )
+    return {"gaming_result": gaming_result, "analysis": analysis}
+
+
+async def run_single_pass(case: dict, context: dict) -> dict:
+    return await llm_service.combined_analysis(commits_details=case["commits_details"], **context)
+
+
+PIPELINES = {"two_pass": run_two_pass, "single_pass": run_single_pass}
+
+
+async def measure(pipeline: str, case: dict, context: dict) -> dict:
+    with track_usage() as usage:
+        started = time.perf_counter()
+        result = await PIPELINES[pipeline](case, context)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "pipeline": pipeline,
+        "case": case["name"],
+        "latency_seconds": round(elapsed, 3),
+        "is_gaming": result["gaming_result"].get("is_gaming", False),
+        "payout_amount": result["analysis"]["payout_amount"],
+        "analysis_status": result["analysis"]["analysis_status"],
+        **usage
+    }
+
+
+def summarize(samples: list) -> dict:
+    latencies = [s["latency_seconds"] for s in samples]
+    return {
+        "samples": len(samples),
+        "latency_mean": round(statistics.mean(latencies), 3),
+        "latency_p50": round(statistics.median(latencies), 3),
+        "latency_max": round(max(latencies), 3),
+        "calls_mean": round(statistics.mean(s["calls"] for s in samples), 2),
+        "input_tokens_mean": round(statistics.mean(s["input_tokens"] for s in samples)),
+        "output_tokens_mean": round(statistics.mean(s["output_tokens"] for s in samples)),
+        "total_tokens_mean": round(statistics.mean(s["total_tokens"] for s in samples)),
+        "cost_usd_mean": round(statistics.mean(s["cost_usd"] for s in samples), 6),
+    }
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="runs per case and pipeline")
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES)
+    parser.add_argument("--output", type=Path, help="write raw samples and summary as JSON")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    if not settings.openai_api_key:
+        print("[ERROR] OPENAI_API_KEY not set in environment")
+        return 1
+    settings.llm_cache_enabled = False  # Every run must hit the model
+
+    fixtures = json.loads(args.fixtures.read_text())
+    context = {
+        "milestones": fixtures["milestones"],
+        "historic_commits": fixtures["historic_commits"],
+        "budget_info": fixtures["budget_info"],
+    }
+
+    samples = []
+    for case in fixtures["cases"]:
+        for run in range(args.runs):
+            # Alternate order so neither pipeline always runs on a warm connection
+            order = list(PIPELINES) if run % 2 == 0 else list(reversed(PIPELINES))
+            for pipeline in order:
+                samples.append(await measure(pipeline, case, context))
+
+    print()
+    print(f"{'CASE':<30} {'PIPELINE':<12} {'LATENCY':>8} {'CALLS':>5} {'TOKENS':>7} {'GAMING':>7} {'PAYOUT':>7} EXPECTED")
+    print("-" * 96)
+    for s in samples:
+        case = next(c for c in fixtures["cases"] if c["name"] == s["case"])
+        print(
+            f"{s['case']:<30} {s['pipeline']:<12} {s['latency_seconds']:>7.2f}s {s['calls']:>5} "
+            f"{s['total_tokens']:>7} {str(s['is_gaming']):>7} {s['payout_amount']:>7.2f} "
+            f"{'gaming' if case.get('expect_gaming') else 'legit'}"
+        )
+
+    summary = {p: summarize([s for s in samples if s["pipeline"] == p]) for p in PIPELINES}
+
+    print()
+    print(f"{'PIPELINE':<12} {'MEAN':>8} {'P50':>8} {'MAX':>8} {'CALLS':>6} {'IN TOK':>7} {'OUT TOK':>8} {'TOTAL':>7} {'COST $':>9}")
+    print("-" * 82)
+    for pipeline, s in summary.items():
+        print(
+            f"{pipeline:<12} {s['latency_mean']:>7.2f}s {s['latency_p50']:>7.2f}s {s['latency_max']:>7.2f}s "
+            f"{s['calls_mean']:>6} {s['input_tokens_mean']:>7} {s['output_tokens_mean']:>8} {s['total_tokens_mean']:>7} "
+            f"{s['cost_usd_mean']:>9.6f}"
+        )
+
+    two, one = summary["two_pass"], summary["single_pass"]
+    if two["latency_mean"] and two["total_tokens_mean"]:
+        print()
+        print(f"single_pass vs two_pass: latency {one['latency_mean'] / two['latency_mean'] - 1:+.0%}, "
+              f"tokens {one['total_tokens_mean'] / two['total_tokens_mean'] - 1:+.0%}")
+
+    if args.output:
+        args.output.write_text(json.dumps({"samples": samples, "summary": summary}, indent=2))
+        print(f"\n[OK] Wrote {args.output}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
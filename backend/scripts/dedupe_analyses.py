@@ -0,0 +1,70 @@
+"""
+Make commit_analyses unique on push_id.
+
+Analyses are upserted per push now, and the index on push_id is unique.
+Databases created before that have a plain push_id index (and may hold a
+second analysis for pushes whose workflow was retried), so the app fails to
+start until this has run. Keeps the earliest analysis of each push, deletes
+the rest, and replaces the index. Rerun scripts/backfill_project_stats.py
+afterwards if anything was deleted. Safe to re-run.
+
+Connects without creating indexes (connect_to_mongo would fail on the old one).
+
+Usage (from the backend directory):
+    python scripts/dedupe_analyses.py [--dry-run]
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from app.config import get_settings  # noqa: E402
+from app.models.commit import COMMIT_ANALYSIS_INDEXES  # noqa: E402
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only report duplicates")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    client = AsyncIOMotorClient(settings.mongodb_url)
+    collection = client[settings.mongodb_db_name]["commit_analyses"]
+    try:
+        pipeline = [
+            {"$sort": {"created_at": 1}},
+            {"$group": {"_id": "$push_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}}
+        ]
+        deleted = 0
+        async for group in collection.aggregate(pipeline, allowDiskUse=True):
+            extra = group["ids"][1:]
+            print(f"[DUPLICATE] {group['_id']}: keeping 1 of {group['count']} analyses")
+            if not args.dry_run:
+                deleted += (await collection.delete_many({"_id": {"$in": extra}})).deleted_count
+
+        if args.dry_run:
+            return 0
+
+        indexes = await collection.index_information()
+        old = indexes.get("push_id_1")
+        if old and not old.get("unique"):
+            await collection.drop_index("push_id_1")
+            print("[DROPPED] Non-unique push_id_1 index")
+        await collection.create_indexes(COMMIT_ANALYSIS_INDEXES)
+    finally:
+        client.close()
+
+    print(f"[OK] Deleted {deleted} duplicate analyses")
+    if deleted:
+        print("[NEXT] Run scripts/backfill_project_stats.py to recompute stats and the milestone ledger")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,48 @@
+"""
+Move diffs embedded in existing push_events into the diff_blobs collection.
+
+Push events stored before diffs were kept out-of-line carry the full diff in
+commits_details[].diff. This replaces each with diff_ref/diff_length. Safe to
+re-run: already migrated events are not matched.
+
+Usage (from the backend directory):
+    python scripts/migrate_diffs.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database import connect_to_mongo, close_mongo_connection, get_database  # noqa: E402
+from app.services.diff_store import diff_store  # noqa: E402
+
+
+async def main() -> int:
+    await connect_to_mongo()
+    try:
+        collection = get_database()["push_events"]
+        cursor = collection.find(
+            {"commits_details.diff": {"$exists": True}},
+            {"push_id": 1, "commits_details": 1}
+        )
+
+        migrated = 0
+        async for event in cursor:
+            commits_details = await diff_store.offload(event["commits_details"])
+            await collection.update_one(
+                {"_id": event["_id"]},
+                {"$set": {"commits_details": commits_details}}
+            )
+            migrated += 1
+            print(f"[MIGRATED] {event['push_id']}: {len(commits_details)} commit diffs")
+    finally:
+        await close_mongo_connection()
+
+    print(f"[OK] Migrated {migrated} push events")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
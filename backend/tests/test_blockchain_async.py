@@ -0,0 +1,250 @@
+"""
+AsyncWeb3 client against a local JSON-RPC stand-in.
+
+The stand-in runs on the same event loop as the client, so a blocking call
+anywhere in the send/receipt path would stall it and time the test out.
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+import rlp
+from aiohttp import web
+from eth_abi import encode
+from eth_account import Account
+from eth_utils import keccak
+
+from app.config import get_settings
+from app.main import app as api
+from app.routes import blockchain as blockchain_routes
+from app.services.blockchain_service import BlockchainService
+
+settings = get_settings()
+
+TREASURY = "0x00000000000000000000000000000000000000aa"
+RECIPIENT = "0x00000000000000000000000000000000000000bb"
+RPC_LATENCY_SECONDS = 0.02
+RECEIPT_AFTER_POLLS = 3  # eth_getTransactionReceipt returns null this many times per tx
+
+
+class StandInRPC:
+    """Minimal in-process Ethereum node: accepts raw transactions and mines them after a few polls"""
+
+    def __init__(self, mined_count: int = 0):
+        self.mined_count = mined_count  # eth_getTransactionCount("latest"/"pending")
+        self.sent = []  # nonces in the order transactions arrived
+        self.mode = "mine"  # "hold": keep transactions in the mempool; "drop": accept and forget them
+        self.receipt_polls = {}  # tx hash -> polls so far
+        self.methods = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        await asyncio.sleep(RPC_LATENCY_SECONDS)
+        if isinstance(body, list):
+            return web.json_response([self.dispatch(call) for call in body])
+        return web.json_response(self.dispatch(body))
+
+    def dispatch(self, call: dict) -> dict:
+        method, params = call["method"], call.get("params", [])
+        self.methods.append(method)
+        try:
+            result = getattr(self, method)(*params)
+        except AttributeError:
+            return {"jsonrpc": "2.0", "id": call["id"], "error": {"code": -32601, "message": f"{method} not supported"}}
+        except ValueError as e:
+            return {"jsonrpc": "2.0", "id": call["id"], "error": {"code": -32000, "message": str(e)}}
+        return {"jsonrpc": "2.0", "id": call["id"], "result": result}
+
+    def eth_chainId(self):
+        return hex(1337)
+
+    def eth_blockNumber(self):
+        return hex(100)
+
+    def eth_gasPrice(self):
+        return hex(10 ** 9)
+
+    def eth_estimateGas(self, tx, *block):
+        return hex(50_000)
+
+    def eth_getTransactionCount(self, address, block):
+        mined = self.mined_count + (len(self.sent) if self.mode == "mine" else 0)
+        return hex(mined + (len(self.sent) if block == "pending" and self.mode == "hold" else 0))
+
+    def eth_sendRawTransaction(self, raw_tx):
+        raw = bytes.fromhex(raw_tx[2:])
+        nonce = int.from_bytes(rlp.decode(raw)[0], "big")
+        expected = self.mined_count + len(self.sent)
+        if nonce < expected:
+            raise ValueError("nonce too low")
+        tx_hash = "0x" + keccak(raw).hex()
+        if self.mode != "drop":
+            self.sent.append(nonce)
+        self.receipt_polls[tx_hash] = 0
+        return tx_hash
+
+    def eth_getTransactionReceipt(self, tx_hash):
+        self.receipt_polls[tx_hash] += 1
+        if self.mode != "mine" or self.receipt_polls[tx_hash] <= RECEIPT_AFTER_POLLS:
+            return None
+        return {
+            "transactionHash": tx_hash,
+            "transactionIndex": "0x0",
+            "blockHash": "0x" + "11" * 32,
+            "blockNumber": hex(101),
+            "from": RECIPIENT,
+            "to": TREASURY,
+            "cumulativeGasUsed": hex(42_000),
+            "gasUsed": hex(42_000),
+            "effectiveGasPrice": hex(10 ** 9),
+            "contractAddress": None,
+            "logs": [],
+            "logsBloom": "0x" + "00" * 256,
+            "status": "0x1",
+            "type": "0x0"
+        }
+
+    def eth_call(self, tx, *block):
+        # streams(id) -> (recipient, ratePerSecond, lastTimestamp, accrued, paused)
+        stream_id = int(tx.get("input", tx.get("data"))[10:], 16)
+        return "0x" + encode(
+            ["address", "uint256", "uint256", "uint256", "bool"],
+            [RECIPIENT, 1000 + stream_id, 1_700_000_000, 0, False]
+        ).hex()
+
+
+@pytest.fixture
+async def rpc(unused_tcp_port, monkeypatch):
+    node = StandInRPC()
+    app = web.Application()
+    app.router.add_post("/", node.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", unused_tcp_port).start()
+
+    monkeypatch.setattr(settings, "rpc_url", f"http://127.0.0.1:{unused_tcp_port}")
+    monkeypatch.setattr(settings, "private_key", Account.create().key.hex())
+    monkeypatch.setattr(settings, "tx_receipt_poll_interval", 0.05)
+    monkeypatch.setattr(settings, "tx_receipt_timeout", 10.0)
+    try:
+        yield node
+    finally:
+        await runner.cleanup()
+
+
+@pytest.fixture
+async def service(rpc):
+    blockchain = BlockchainService()
+    try:
+        yield blockchain
+    finally:
+        await blockchain.close()
+
+
+async def max_loop_gap(task: asyncio.Future, tick: float = 0.01) -> float:
+    """Longest interval between ticks of a sibling coroutine while task runs"""
+    gap, last = 0.0, time.perf_counter()
+    while not task.done():
+        await asyncio.sleep(tick)
+        now = time.perf_counter()
+        gap, last = max(gap, now - last), now
+    return gap
+
+
+async def test_change_rate_waits_for_receipt_without_blocking(rpc, service):
+    task = asyncio.ensure_future(service.change_rate(TREASURY, 7, 123456))
+    gap = await max_loop_gap(task)
+    result = task.result()
+
+    assert result["success"] is True, result
+    assert result["nonce"] == 0
+    assert result["block_number"] == 101
+    assert rpc.methods.count("eth_getTransactionReceipt") == RECEIPT_AFTER_POLLS + 1
+    assert service.pending_transactions() == {}
+    # Receipt polling took several poll intervals; the loop kept ticking throughout
+    assert gap < 0.2
+
+
+async def test_concurrent_sends_pipeline_sequential_nonces(rpc, service):
+    results = await asyncio.gather(*(
+        service.change_rate(TREASURY, stream_id, 1000 + stream_id)
+        for stream_id in range(10)
+    ))
+
+    assert all(result["success"] for result in results), results
+    assert sorted(result["nonce"] for result in results) == list(range(10))
+    assert rpc.sent == list(range(10))
+    # One sync of the local counter, not a getTransactionCount per transaction
+    assert rpc.methods.count("eth_getTransactionCount") == 2
+
+
+async def test_nonce_error_resyncs_and_retries(rpc, service):
+    rpc.mined_count = 5  # Another process used nonces 0-4 behind our back
+    service._get_web3()
+    service.nonce_manager._next_nonce = 2
+
+    result = await service.change_rate(TREASURY, 1, 1)
+
+    assert result["success"] is True, result
+    assert result["nonce"] == 5
+    assert rpc.sent == [5]
+
+
+async def test_receipt_timeout_keeps_mempool_transaction_pending(rpc, service, monkeypatch):
+    monkeypatch.setattr(settings, "tx_receipt_timeout", 0.3)
+    rpc.mode = "hold"
+
+    result = await service.change_rate(TREASURY, 1, 1)
+
+    assert result["success"] is False
+    assert result["pending"] is True
+    assert list(service.pending_transactions()) == [0]
+    # The counter was not resynced back onto the pending nonce
+    assert (await service.send_change_rate(TREASURY, 2, 2))[1] == 1
+
+
+async def test_receipt_timeout_resyncs_after_drop(rpc, service, monkeypatch):
+    monkeypatch.setattr(settings, "tx_receipt_timeout", 0.3)
+    rpc.mode = "drop"
+
+    result = await service.change_rate(TREASURY, 1, 1)
+
+    assert result["success"] is False
+    assert result["pending"] is False
+    assert result["error"] == "Transaction dropped"
+    assert service.pending_transactions() == {}
+    # The unused nonce is handed out again
+    assert (await service.send_change_rate(TREASURY, 2, 2))[1] == 0
+
+
+async def test_stream_reads(rpc, service):
+    info = await service.get_stream_info(TREASURY, 3)
+    assert info["ratePerSecond"] == 1003
+    assert info["paused"] is False
+
+    batch = await service.get_streams_batch([(TREASURY, 1), (TREASURY, 2), (TREASURY, 1)])
+    assert batch["block_number"] == 100
+    assert [r["ratePerSecond"] for r in batch["results"]] == [1001, 1002, 1001]
+
+
+async def test_stream_batch_reports_bad_address_per_entry(rpc, service, monkeypatch):
+    streams = [(TREASURY, 1), ("0xnot-an-address", 2), (TREASURY, 3)]
+
+    batch = await service.get_streams_batch(streams)
+
+    good, bad, other = batch["results"]
+    assert good["ratePerSecond"] == 1001
+    assert other["ratePerSecond"] == 1003
+    assert bad["treasury_address"] == "0xnot-an-address"
+    assert "error" in bad and "ratePerSecond" not in bad
+
+    # The route returns the whole batch instead of a 500
+    monkeypatch.setattr(blockchain_routes, "blockchain_service", service)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://test") as http:
+        response = await http.post("/api/blockchain/stream-info/batch", json={
+            "streams": [{"treasury_address": t, "stream_id": sid} for t, sid in streams]
+        })
+    assert response.status_code == 200, response.text
+    assert "error" in response.json()["results"][1]
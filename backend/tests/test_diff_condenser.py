@@ -0,0 +1,37 @@
+"""
+condense_commits keeps the summed diff text within the shared token budget,
+however many commits share it.
+"""
+
+import pytest
+
+from app.utils.diff_condenser import MIN_HUNK_TOKENS, condense_commits
+from app.utils.tokens import estimate_tokens
+
+
+def commit_diff(index: int, lines: int = 200) -> str:
+    body = "\n".join(f"+    value_{index}_{n} = compute_{n}(x, y) + {n}" for n in range(lines))
+    return (
+        f"diff --git a/src/module_{index}.py b/src/module_{index}.py\n"
+        f"--- a/src/module_{index}.py\n"
+        f"+++ b/src/module_{index}.py\n"
+        f"@@ -0,0 +1,{lines} @@\n{body}"
+    )
+
+
+@pytest.mark.parametrize("commits, budget", [(3, 2000), (16, 400), (50, 400), (100, 400), (200, 20)])
+def test_output_fits_budget(commits, budget):
+    texts = condense_commits([commit_diff(i) for i in range(commits)], budget)
+
+    assert len(texts) == commits
+    assert sum(estimate_tokens(text) for text in texts) <= budget
+
+
+def test_commits_beyond_the_budget_are_noted():
+    budget = 400
+    texts = condense_commits([commit_diff(i) for i in range(50)], budget)
+
+    funded = [text for text in texts if text and "more commits omitted" not in text]
+    assert 0 < len(funded) <= budget // MIN_HUNK_TOKENS
+    assert texts[len(funded)] == f"... (diffs of {50 - len(funded)} more commits omitted)"
+    assert all(text == "" for text in texts[len(funded) + 1:])
@@ -0,0 +1,37 @@
+"""
+Pre-filter verdicts keep the rule that fired (and what it matched) on the
+analysis, for rejections and review holds alike.
+"""
+
+from app.services.gaming_prefilter import gaming_prefilter
+from app.services.llm_service import LLMService
+
+
+def commit(path: str, diff: str = "") -> dict:
+    return {"message": "Update", "files_changed": [{"filename": path}], "diff": diff, "additions": 1}
+
+
+def test_review_hold_records_rule_and_evidence():
+    verdict = gaming_prefilter.classify([commit("package-lock.json")])
+    assert verdict["needs_review"] and not verdict["is_gaming"]
+
+    analysis = {"payout_amount": 5.0, "gaming_detected": False, "analysis_status": "approved", "flags": []}
+    held = LLMService._hold_for_review(analysis, verdict)
+
+    assert held["analysis_status"] == "needs_human_review"
+    assert held["gaming_rule"] == "generated_files_only"
+    assert "package-lock.json" in held["gaming_evidence"]
+    assert "gaming_rule" not in analysis  # The cached analysis is left as it was
+
+
+def test_rejection_records_rule_and_evidence():
+    verdict = gaming_prefilter.classify([
+        {"message": "wip", "files_changed": [], "diff": "", "additions": 0, "deletions": 0}
+    ])
+    assert verdict["is_gaming"]
+
+    rejection = LLMService._gaming_rejection(verdict)
+
+    assert rejection["analysis_status"] == "rejected"
+    assert rejection["gaming_rule"] == "empty_commits"
+    assert rejection["gaming_evidence"] == verdict["reason"]
@@ -0,0 +1,66 @@
+"""
+Lease handling in the durable job queue: a job whose worker dies on every
+attempt must stop after max_attempts instead of being reclaimed forever.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import get_settings
+from app.services.job_queue import JobQueue
+
+settings = get_settings()
+
+
+@pytest.fixture
+async def queue(mongo):
+    jobs = JobQueue()
+
+    async def never_called(job):
+        raise AssertionError("jobs are only claimed in these tests, never run")
+
+    jobs.register("enrich", never_called)
+    jobs.register("analysis", never_called)
+    return jobs
+
+
+async def expire_lease(mongo, job_id: str) -> None:
+    """What a crashed worker leaves behind once its lease runs out"""
+    past = datetime.utcnow() - timedelta(seconds=1)
+    await mongo["analysis_jobs"].update_one({"job_id": job_id}, {"$set": {"lease_expires_at": past}})
+    await mongo["job_slots"].update_many({"job_id": job_id}, {"$set": {"lease_expires_at": past}})
+
+
+async def test_crashing_job_fails_after_max_attempts(mongo, queue):
+    await mongo["push_events"].insert_one({"push_id": "push_poison", "status": "received"})
+    job_id = await queue.enqueue("enrich", "push_poison", "proj_a")
+
+    for attempt in range(1, settings.job_max_attempts + 1):
+        job = await queue._claim()
+        assert job["job_id"] == job_id
+        assert job["attempts"] == attempt
+        await expire_lease(mongo, job_id)
+
+    assert await queue._claim() is None
+    await queue._fail_exhausted()
+
+    job = await mongo["analysis_jobs"].find_one({"job_id": job_id})
+    assert job["status"] == "failed"
+    assert job["attempts"] == settings.job_max_attempts
+    assert "Lease expired" in job["last_error"]
+    assert (await mongo["push_events"].find_one({"push_id": "push_poison"}))["status"] == "enrichment_failed"
+
+
+async def test_expired_lease_with_attempts_left_is_reclaimed(mongo, queue):
+    await mongo["push_events"].insert_one({"push_id": "push_retry", "status": "pending_analysis"})
+    job_id = await queue.enqueue("analysis", "push_retry", "proj_b")
+
+    await queue._claim()
+    await expire_lease(mongo, job_id)
+    await queue._fail_exhausted()
+
+    job = await queue._claim()
+    assert job["job_id"] == job_id
+    assert job["attempts"] == 2
+    assert (await mongo["push_events"].find_one({"push_id": "push_retry"}))["status"] == "pending_analysis"
@@ -0,0 +1,34 @@
+"""
+The llm_cache collection stays under llm_cache_max_documents between TTL sweeps.
+"""
+
+import pytest
+
+from app.config import get_settings
+from app.services.llm_cache import LLMResponseCache
+
+settings = get_settings()
+
+
+@pytest.fixture
+def cache(mongo, monkeypatch):
+    monkeypatch.setattr(settings, "llm_cache_max_documents", 20)
+    return LLMResponseCache()
+
+
+async def test_store_is_pruned_oldest_first(cache, mongo):
+    for n in range(50):
+        await cache.set(f"key_{n:02d}", {"n": n}, "gpt-4o-mini", "v1")
+
+    assert await mongo["llm_cache"].count_documents({}) <= settings.llm_cache_max_documents
+    # The newest entries survive
+    assert await mongo["llm_cache"].find_one({"key": "key_49"}) is not None
+    assert await mongo["llm_cache"].find_one({"key": "key_00"}) is None
+
+
+async def test_rewriting_a_key_does_not_prune(cache, mongo):
+    for n in range(20):
+        await cache.set(f"key_{n:02d}", {"n": n}, "gpt-4o-mini", "v1")
+    await cache.set("key_00", {"n": 0}, "gpt-4o-mini", "v1")
+
+    assert await mongo["llm_cache"].count_documents({}) == 20
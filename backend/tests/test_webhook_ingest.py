@@ -0,0 +1,134 @@
+"""
+Ingest-first webhook mode: the request path only verifies, dedupes and
+persists the raw payload - commit fetching happens in the "enrich" job.
+"""
+
+import hashlib
+import hmac
+import json
+import math
+import time
+
+import httpx
+import pytest
+
+from app.config import get_settings
+from app.main import app
+from app.services.github_service import github_service
+from app.services.push_ingest import push_ingest_service
+from app.utils.lru import LRUCache
+
+settings = get_settings()
+
+DELIVERIES = 200
+COMMITS_PER_PUSH = 50
+P99_BUDGET_SECONDS = 0.25  # GitHub gives up after 10s; diff fetching used to take several
+
+
+def push_payload(index: int) -> dict:
+    return {
+        "ref": "refs/heads/main",
+        "repository": {"full_name": "acme/widgets"},
+        "pusher": {"name": "dev"},
+        "commits": [
+            {
+                "id": f"{index:08x}{n:032x}",
+                "message": f"Commit {n} of push {index}",
+                "author": {"name": "Dev", "username": "dev"},
+                "added": [f"src/module_{n}.py"],
+                "modified": [],
+                "removed": []
+            }
+            for n in range(COMMITS_PER_PUSH)
+        ]
+    }
+
+
+def headers(body: bytes, delivery_id: str, signed: bool = True) -> dict:
+    signature = "sha256=" + hmac.new(settings.github_webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+    return {
+        "Content-Type": "application/json",
+        "X-GitHub-Event": "push",
+        "X-GitHub-Delivery": delivery_id,
+        **({"X-Hub-Signature-256": signature} if signed else {})
+    }
+
+
+def forget_recent_deliveries(monkeypatch) -> None:
+    """Empty the in-process delivery cache, as after a restart or on another worker"""
+    monkeypatch.setattr(push_ingest_service, "recent_deliveries", LRUCache(max_size=settings.webhook_delivery_cache_size))
+
+
+@pytest.fixture
+async def client(mongo, monkeypatch):
+    monkeypatch.setattr(settings, "webhook_ingest_mode", "ingest_first")
+
+    async def no_fetch(*args, **kwargs):
+        raise AssertionError("commits must not be fetched in the webhook request path")
+
+    monkeypatch.setattr(github_service, "fetch_commits", no_fetch)
+    forget_recent_deliveries(monkeypatch)
+
+    # No lifespan: the job queue is not started, so enqueued jobs just wait in the collection
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+        yield http
+
+
+async def test_ingest_first_p99_latency(client, mongo):
+    latencies = []
+    for index in range(DELIVERIES):
+        body = json.dumps(push_payload(index)).encode()
+        started = time.perf_counter()
+        response = await client.post("/api/webhooks/github", content=body, headers=headers(body, f"delivery-{index}"))
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 202, response.text
+
+    latencies.sort()
+    p99 = latencies[math.ceil(0.99 * len(latencies)) - 1]
+    assert p99 < P99_BUDGET_SECONDS, f"p99={p99:.3f}s"
+
+    assert await mongo["push_events"].count_documents({"status": "received"}) == DELIVERIES
+    assert await mongo["analysis_jobs"].count_documents({"kind": "enrich", "status": "queued"}) == DELIVERIES
+
+
+async def test_redelivery_is_reported_as_duplicate(client, mongo):
+    body = json.dumps(push_payload(0)).encode()
+    first = await client.post("/api/webhooks/github", content=body, headers=headers(body, "delivery-dup"))
+    again = await client.post("/api/webhooks/github", content=body, headers=headers(body, "delivery-dup"))
+
+    assert first.status_code == 202
+    assert again.status_code == 200
+    assert again.json()["duplicate"] is True
+    assert await mongo["push_events"].count_documents({}) == 1
+
+
+async def test_redelivery_after_restart_is_caught_by_the_index(client, mongo, monkeypatch):
+    body = json.dumps(push_payload(0)).encode()
+    first = await client.post("/api/webhooks/github", content=body, headers=headers(body, "delivery-restart"))
+    forget_recent_deliveries(monkeypatch)
+    again = await client.post("/api/webhooks/github", content=body, headers=headers(body, "delivery-restart"))
+
+    assert first.status_code == 202
+    assert again.status_code == 200
+    assert again.json()["duplicate"] is True
+    assert again.json()["push_id"] == first.json()["push_id"]
+    assert await mongo["push_events"].count_documents({}) == 1
+    assert await mongo["analysis_jobs"].count_documents({"kind": "enrich"}) == 1
+
+    # The delivery_id index alone rejects it, whatever push_id the event would get
+    forget_recent_deliveries(monkeypatch)
+    existing = await push_ingest_service.insert_push_event(
+        {"push_id": "push_other", "delivery_id": "delivery-restart", "status": "received"}
+    )
+    assert existing == first.json()["push_id"]
+    assert await mongo["push_events"].count_documents({}) == 1
+
+
+@pytest.mark.parametrize("mode", ["ingest_first", "inline"])
+async def test_unsigned_delivery_is_rejected(client, mongo, monkeypatch, mode):
+    monkeypatch.setattr(settings, "webhook_ingest_mode", mode)
+    body = json.dumps(push_payload(0)).encode()
+    response = await client.post("/api/webhooks/github", content=body, headers=headers(body, "delivery-unsigned", signed=False))
+
+    assert response.status_code == 401
+    assert await mongo["push_events"].count_documents({}) == 0
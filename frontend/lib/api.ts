@@ -97,8 +97,10 @@ export interface CommitDetail {
   additions: number
   deletions: number
   changed_files: number
-  diff: string
-  files_changed: Record<string, unknown>[]
+  diff_ref?: string
+  diff_length?: number
+  diff?: string // Only on the delivery detail endpoint
+  files_changed?: Record<string, unknown>[] // Not included in list responses
 }
 
 export interface PushEvent {
@@ -112,6 +114,44 @@ export interface PushEvent {
   commits_details: CommitDetail[]
   status: string
   created_at: string
+  stage_timings?: StageTimings // Set once the analysis workflow has run
+  ingest_timings?: IngestTimings // Set once commits were fetched
+}
+
+export interface StageTiming {
+  offset_ms: number
+  duration_ms: number
+  status: 'ok' | 'failed' | 'cancelled'
+}
+
+export interface Span {
+  name: string // e.g. llm.call, github.commit, mongo.insert_analysis
+  offset_ms: number
+  duration_ms: number
+  status: 'ok' | 'error'
+  attributes: Record<string, unknown>
+}
+
+export interface LLMUsage {
+  calls: number
+  input_tokens: number
+  output_tokens: number
+  total_tokens: number
+  cost_usd: number
+}
+
+export interface StageTimings {
+  total_ms: number
+  analysis_mode: string
+  recorded_at: string
+  stages: Record<string, StageTiming>
+  spans: Span[]
+  llm_usage: LLMUsage
+}
+
+export interface IngestTimings {
+  total_ms: number
+  spans: Span[]
 }
 
 export interface PushEventsResponse {